@@ -5,6 +5,7 @@ Runs locally via CPU or CUDA GPU — no internet required after model download.
 """
 
 import os
+import threading
 from typing import Any, Union
 
 import numpy as np
@@ -57,10 +58,12 @@ class CLIPEmbedder(BaseEmbedder):
                     print(f"[CLIP] PyTorch not found → using base-32 model: {model_id}")
 
         self._model_id = model_id
-        self._model = None
-        self._processor = None
+        self._text_model = None
+        self._vision_model = None
         self._tokenizer = None
-        self._device = "cpu"
+        self._image_processor = None
+        self._device = None
+        self._load_lock = threading.RLock()
 
         # Detect embedding dimension from model name
         if "large" in model_id.lower():
@@ -70,82 +73,157 @@ class CLIPEmbedder(BaseEmbedder):
         else:
             self._embedding_dim = 512  # ViT-B/32
 
+    def _detect_device(self) -> str:
+        if self._device is None:
+            self._device = "cpu"
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    self._device = "cuda"
+                    print(f"[CLIP] Using GPU: {torch.cuda.get_device_name(0)}")
+                else:
+                    print("[CLIP] No GPU detected, using CPU")
+            except ImportError:
+                print("[CLIP] PyTorch not available, using CPU")
+        return self._device
+
     def load_model(self) -> None:
-        """Load CLIP model and processor."""
-        from transformers import CLIPModel, CLIPProcessor
+        """Load both CLIP towers (text for queries, vision for indexing)."""
+        self.load_text_model()
+        self.load_vision_model()
 
-        print(f"[CLIP] Loading model: {self._model_id}")
+    def load_text_model(self) -> None:
+        """
+        Load only the tokenizer and text encoder + projection — all a
+        search-only process needs. The vision tower loads on first image use.
+        """
+        with self._load_lock:
+            if self._tokenizer is not None:
+                return
+            from transformers import CLIPTextModelWithProjection, CLIPTokenizerFast
 
-        # Detect device
-        try:
-            import torch
-            if torch.cuda.is_available():
-                self._device = "cuda"
-                print(f"[CLIP] Using GPU: {torch.cuda.get_device_name(0)}")
-            else:
-                print("[CLIP] No GPU detected, using CPU")
-        except ImportError:
-            print("[CLIP] PyTorch not available, using CPU")
+            print(f"[CLIP] Loading text tower: {self._model_id}")
+            device = self._detect_device()
+            model = CLIPTextModelWithProjection.from_pretrained(self._model_id).to(device)
+            model.eval()
+            self._text_model = model
+            self._embedding_dim = model.config.projection_dim
+            self._tokenizer = CLIPTokenizerFast.from_pretrained(self._model_id)
+            print(f"[CLIP] Text tower loaded. Embedding dim: {self._embedding_dim}")
 
-        self._model = CLIPModel.from_pretrained(self._model_id)
-        self._processor = CLIPProcessor.from_pretrained(self._model_id)
+    def load_vision_model(self) -> None:
+        """Load the image processor and vision encoder + projection."""
+        with self._load_lock:
+            if self._image_processor is not None:
+                return
+            from transformers import CLIPImageProcessor, CLIPVisionModelWithProjection
 
-        # Move model to device
-        self._model = self._model.to(self._device)
-        self._model.eval()
+            print(f"[CLIP] Loading vision tower: {self._model_id}")
+            device = self._detect_device()
+            model = CLIPVisionModelWithProjection.from_pretrained(self._model_id).to(device)
+            model.eval()
+            self._vision_model = model
+            self._embedding_dim = model.config.projection_dim
+            self._image_processor = CLIPImageProcessor.from_pretrained(self._model_id)
+            print("[CLIP] Vision tower loaded.")
 
-        # Detect embedding dim from model config
-        self._embedding_dim = self._model.config.projection_dim
-        print(f"[CLIP] Model loaded. Embedding dim: {self._embedding_dim}")
+    def _ensure_text_loaded(self):
+        if self._tokenizer is None:
+            self.load_text_model()
 
-    def _ensure_loaded(self):
-        if self._model is None:
-            self.load_model()
+    def _ensure_vision_loaded(self):
+        if self._image_processor is None:
+            self.load_vision_model()
 
-    def embed_image(self, image: Image.Image) -> np.ndarray:
-        """Embed a single PIL Image. Returns shape (embedding_dim,)."""
-        self._ensure_loaded()
+    # --- Inference backend (overridden by the ONNX engine) ---
+
+    def _image_features(self, pixel_values: np.ndarray) -> np.ndarray:
+        """Raw (unnormalized) image embeddings for preprocessed pixels of shape (N, 3, H, W)."""
         import torch
 
-        inputs = self._processor(images=image, return_tensors="pt").to(self._device)
+        pixel_values = torch.from_numpy(np.ascontiguousarray(pixel_values, dtype=np.float32))
         with torch.no_grad():
-            features = self._model.get_image_features(**inputs)
-        # Normalize
-        features = features / features.norm(p=2, dim=-1, keepdim=True)
-        return features.cpu().numpy().flatten()
-
-    def embed_images(self, images: list[Image.Image]) -> np.ndarray:
-        """Embed a batch of PIL Images. Returns shape (N, embedding_dim)."""
-        self._ensure_loaded()
+            features = self._vision_model(pixel_values=pixel_values.to(self._device)).image_embeds
+        return features.cpu().numpy()
+
+    def _text_features(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Raw (unnormalized) text embeddings for padded token ids of shape (N, L)."""
         import torch
 
-        inputs = self._processor(images=images, return_tensors="pt", padding=True).to(self._device)
         with torch.no_grad():
-            features = self._model.get_image_features(**inputs)
-        features = features / features.norm(p=2, dim=-1, keepdim=True)
+            features = self._text_model(
+                input_ids=torch.from_numpy(input_ids).to(self._device),
+                attention_mask=torch.from_numpy(attention_mask).to(self._device),
+            ).text_embeds
         return features.cpu().numpy()
 
+    @staticmethod
+    def _normalize(features: np.ndarray) -> np.ndarray:
+        return (features / np.linalg.norm(features, axis=-1, keepdims=True)).astype(np.float32)
+
+    # --- Embedding API ---
+
+    def embed_image(self, image: Image.Image) -> np.ndarray:
+        """Embed a single PIL Image. Returns shape (embedding_dim,)."""
+        return self.embed_images([image])[0]
+
+    def embed_images(self, images: Union[list[Image.Image], np.ndarray]) -> np.ndarray:
+        """
+        Embed a batch of images. Returns shape (N, embedding_dim).
+        Accepts PIL Images, or already-preprocessed pixel values of shape
+        (N, 3, H, W) as produced by app.core.image_decode.
+        """
+        self._ensure_vision_loaded()
+        if isinstance(images, np.ndarray):
+            pixel_values = images
+        else:
+            pixel_values = self._image_processor(images=images, return_tensors="np")["pixel_values"]
+        return self._normalize(self._image_features(pixel_values))
+
+    def preprocess_config(self):
+        """Image preprocessing parameters of the loaded model, for out-of-process decoding."""
+        from app.core.image_decode import ClipPreprocess
+
+        self._ensure_vision_loaded()
+        ip = self._image_processor
+        size = ip.size.get("shortest_edge", 224) if isinstance(ip.size, dict) else ip.size
+        crop = ip.crop_size.get("height", size) if isinstance(ip.crop_size, dict) else ip.crop_size
+        return ClipPreprocess(
+            resize=int(size),
+            crop=int(crop),
+            mean=tuple(ip.image_mean),
+            std=tuple(ip.image_std),
+        )
+
     def embed_text(self, text: str) -> np.ndarray:
         """Embed a text query. Returns shape (embedding_dim,)."""
-        self._ensure_loaded()
-        import torch
+        return self.embed_texts([text])[0]
 
-        inputs = self._processor(text=[text], return_tensors="pt", padding=True).to(self._device)
-        with torch.no_grad():
-            features = self._model.get_text_features(**inputs)
-        features = features / features.norm(p=2, dim=-1, keepdim=True)
-        return features.cpu().numpy().flatten()
+    def embed_texts(self, texts: list[str], batch_size: int = 64) -> np.ndarray:
+        """
+        Embed many texts. Returns shape (N, embedding_dim), in input order.
+        Texts are tokenized once (truncated to CLIP's context), sorted by token
+        length and run in padded batches of similar length, so little compute
+        goes to padding.
+        """
+        self._ensure_text_loaded()
+        if not texts:
+            return np.zeros((0, self.embedding_dim), dtype=np.float32)
 
-    def embed_texts(self, texts: list[str]) -> np.ndarray:
-        """Embed a batch of text queries. Returns shape (N, embedding_dim)."""
-        self._ensure_loaded()
-        import torch
+        tokenizer = self._tokenizer
+        input_ids = tokenizer(list(texts), truncation=True, max_length=tokenizer.model_max_length)["input_ids"]
+        order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]))
 
-        inputs = self._processor(text=texts, return_tensors="pt", padding=True).to(self._device)
-        with torch.no_grad():
-            features = self._model.get_text_features(**inputs)
-        features = features / features.norm(p=2, dim=-1, keepdim=True)
-        return features.cpu().numpy()
+        out = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            idx = order[start : start + batch_size]
+            inputs = tokenizer.pad({"input_ids": [input_ids[i] for i in idx]}, return_tensors="np")
+            features = self._text_features(
+                inputs["input_ids"].astype(np.int64),
+                inputs["attention_mask"].astype(np.int64),
+            )
+            out[idx] = self._normalize(features)
+        return out
 
     # --- BaseEmbedder interface ---
 
@@ -164,3 +242,25 @@ class CLIPEmbedder(BaseEmbedder):
     @property
     def model_name(self) -> str:
         return self._model_id
+
+
+def create_clip_embedder(model_id: str = None) -> CLIPEmbedder:
+    """
+    Build the CLIP embedder for the engine chosen in config.json
+    (optimizations.clip_engine: "torch" — default — or "onnx").
+    """
+    opts = {}
+    try:
+        from app.core.first_run import get_or_create_config
+        opts = get_or_create_config().get("optimizations", {})
+    except Exception:
+        pass
+
+    if opts.get("clip_engine") == "onnx":
+        from app.ai.clip_onnx import ONNXCLIPEmbedder
+        return ONNXCLIPEmbedder(
+            model_id,
+            quantize=opts.get("onnx_quantize", True),
+            num_threads=opts.get("onnx_threads"),
+        )
+    return CLIPEmbedder(model_id)
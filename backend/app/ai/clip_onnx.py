@@ -0,0 +1,197 @@
+"""
+ONNX Runtime engine for CLIP.
+Exports the vision and text towers (with their projections) to ONNX once,
+optionally dynamic-quantizes them to int8, caches the result under
+data_dir/onnx/, and runs them with tuned CPU thread settings.
+Typically 2–4× faster image embedding than eager PyTorch on CPU.
+
+Selected with optimizations.clip_engine = "onnx" in config.json
+(first_run picks it for CPU-only machines). Falls back to the fp32 ONNX
+model if int8 quantization can't run (it needs the `onnx` package), and to
+the PyTorch engine if onnxruntime is missing or the export fails; the reason
+is reported once as a warning.
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+from app.ai.clip_embed import CLIPEmbedder
+from app.core.config import get_settings
+
+
+class ONNXCLIPEmbedder(CLIPEmbedder):
+    """CLIPEmbedder whose towers run in ONNX Runtime instead of PyTorch."""
+
+    def __init__(self, model_id: str = None, quantize: bool = True, num_threads: Optional[int] = None):
+        super().__init__(model_id)
+        self._quantize = quantize
+        self._num_threads = num_threads
+        # A tower whose session stays None runs on the PyTorch engine instead
+        self._vision_session = None
+        self._text_session = None
+        self._warned: set[str] = set()
+
+    def load_text_model(self) -> None:
+        """Load (exporting on first use) the ONNX text tower and the tokenizer."""
+        with self._load_lock:
+            if self._tokenizer is not None:
+                return
+            from transformers import CLIPTextConfig, CLIPTokenizerFast
+
+            try:
+                self._text_session = self._new_session(self._ensure_exported("text"))
+            except Exception as e:
+                self._warn_once(f"ONNX engine unavailable ({type(e).__name__}: {e}) — falling back to PyTorch")
+                return super().load_text_model()
+            self._embedding_dim = CLIPTextConfig.from_pretrained(self._model_id).projection_dim
+            self._tokenizer = CLIPTokenizerFast.from_pretrained(self._model_id)
+            print(f"[CLIP] ONNX text tower ready ({self._precision}, {self._threads()} threads). "
+                  f"Embedding dim: {self._embedding_dim}")
+
+    def load_vision_model(self) -> None:
+        """Load (exporting on first use) the ONNX vision tower and the image processor."""
+        with self._load_lock:
+            if self._image_processor is not None:
+                return
+            from transformers import CLIPImageProcessor
+
+            try:
+                self._vision_session = self._new_session(self._ensure_exported("vision"))
+            except Exception as e:
+                self._warn_once(f"ONNX engine unavailable ({type(e).__name__}: {e}) — falling back to PyTorch")
+                return super().load_vision_model()
+            self._image_processor = CLIPImageProcessor.from_pretrained(self._model_id)
+            print(f"[CLIP] ONNX vision tower ready ({self._precision}, {self._threads()} threads)")
+
+    @property
+    def _precision(self) -> str:
+        return "int8" if self._quantize else "fp32"
+
+    def _threads(self) -> int:
+        return self._num_threads or _physical_cores()
+
+    def _warn_once(self, message: str) -> None:
+        """Report why the engine isn't running as configured (both towers usually fail alike)."""
+        if message not in self._warned:
+            self._warned.add(message)
+            print(f"[CLIP] ⚠️  {message}")
+
+    # --- Export / quantization cache ---
+
+    def _cache_dir(self) -> str:
+        return os.path.join(get_settings().data_dir, "onnx", self._model_id.replace("/", "--"))
+
+    def _ensure_exported(self, tower: str) -> str:
+        """Return the model path for a tower ("vision" / "text"), exporting/quantizing if not cached."""
+        cache = self._cache_dir()
+        os.makedirs(cache, exist_ok=True)
+        fp32_path = os.path.join(cache, f"{tower}.onnx")
+        path = os.path.join(cache, f"{tower}.int8.onnx") if self._quantize else fp32_path
+        if not os.path.exists(fp32_path):
+            print(f"[CLIP] Exporting {tower} tower to ONNX (one-time)...")
+            self._export(tower, fp32_path)
+        if not os.path.exists(path):
+            print(f"[CLIP] Quantizing {tower} tower to int8 (one-time)...")
+            try:
+                _quantize_int8(fp32_path, path)
+            except ImportError as e:  # quantize_dynamic needs the onnx package
+                self._warn_once(f"int8 quantization unavailable ({e}) — running fp32 ONNX; pip install onnx")
+                self._quantize = False
+                return fp32_path
+        return path
+
+    def _export(self, tower: str, path: str) -> None:
+        import torch
+        from transformers import CLIPTextModelWithProjection, CLIPVisionModelWithProjection
+
+        tmp = path + ".tmp"
+        if tower == "vision":
+            model = CLIPVisionModelWithProjection.from_pretrained(self._model_id).eval()
+            size = model.config.image_size
+            args = (torch.zeros(1, 3, size, size),)
+            input_names = ["pixel_values"]
+            output_names = ["image_embeds"]
+            dynamic_axes = {"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}}
+        else:
+            model = CLIPTextModelWithProjection.from_pretrained(self._model_id).eval()
+            args = (torch.ones(1, 8, dtype=torch.int64), torch.ones(1, 8, dtype=torch.int64))
+            input_names = ["input_ids", "attention_mask"]
+            output_names = ["text_embeds"]
+            dynamic_axes = {
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "text_embeds": {0: "batch"},
+            }
+
+        wrapper = _tower_module(model, input_names, output_names[0])
+        with torch.no_grad():
+            torch.onnx.export(
+                wrapper, args, tmp,
+                input_names=input_names,
+                output_names=output_names,
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+            )
+        os.replace(tmp, path)  # never leave a half-written model in the cache
+
+    def _new_session(self, path: str):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.intra_op_num_threads = self._threads()
+        opts.inter_op_num_threads = 1
+        return ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+    # --- Inference backend ---
+
+    def _image_features(self, pixel_values: np.ndarray) -> np.ndarray:
+        if self._vision_session is None:
+            return super()._image_features(pixel_values)
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        return self._vision_session.run(None, {"pixel_values": pixel_values})[0]
+
+    def _text_features(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self._text_session is None:
+            return super()._text_features(input_ids, attention_mask)
+        return self._text_session.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+    @property
+    def model_name(self) -> str:
+        return f"{self._model_id} (onnx-{self._precision})"
+
+
+def _tower_module(model, input_names: list[str], output_name: str):
+    """Wrap a *WithProjection model so the exported graph returns just the projected embedding."""
+    import torch
+
+    class TowerOutput(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return getattr(self.model(**dict(zip(input_names, inputs))), output_name)
+
+    return TowerOutput()
+
+
+def _quantize_int8(src: str, dst: str) -> None:
+    """Dynamic (weight-only int8, activations quantized at runtime) quantization."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp = dst + ".tmp"
+    # MatMul/Gemm only: ConvInteger (the patch embedding) is poorly supported on CPU
+    quantize_dynamic(src, tmp, weight_type=QuantType.QInt8, op_types_to_quantize=["MatMul", "Gemm"])
+    os.replace(tmp, dst)
+
+
+def _physical_cores() -> int:
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
@@ -9,6 +9,8 @@ import torch
 from PIL import Image
 from typing import Optional
 
+# Detection batches group images whose sizes round up to the same multiple of this
+_PAD_TO = 64
 
 class FaceEmbedder:
     """Detects faces in images and generates 512-dim face embeddings."""
@@ -63,64 +65,81 @@ class FaceEmbedder:
               - 'box': [x1, y1, x2, y2] bounding box
               - 'confidence': float detection confidence
         """
-        self._ensure_loaded()
+        return self.detect_and_embed_batch([image])[0]
+
+    def detect_and_embed_batch(
+        self,
+        images: list[Image.Image],
+        detect_batch_size: int = 16,
+        embed_batch_size: int = 64,
+    ) -> list[list[dict]]:
+        """
+        Detect and embed faces in many images (same result format as detect_and_embed,
+        one list per image).
 
-        # Detect faces → get face crops and bounding boxes
-        try:
-            face_tensors, probs = self._detector.detect(image)
-        except Exception:
-            return []
-
-        if face_tensors is None:
-            return []
-
-        # Get cropped and aligned face tensors for embedding
-        try:
-            aligned_faces = self._detector(image)
-        except Exception:
-            return []
-
-        if aligned_faces is None:
-            return []
-
-        # If single face, unsqueeze to batch
-        if aligned_faces.dim() == 3:
-            aligned_faces = aligned_faces.unsqueeze(0)
-
-        results = []
-        # Generate embeddings
-        with torch.no_grad():
-            embeddings = self._recognizer(aligned_faces.to(self._device))
-            embeddings = embeddings.cpu().numpy()
-
-        for i in range(len(embeddings)):
-            # Normalize embedding
-            emb = embeddings[i]
-            norm = np.linalg.norm(emb)
-            if norm == 0:
-                continue
-            emb = emb / norm
-
-            box = face_tensors[i].tolist() if face_tensors is not None else [0, 0, 0, 0]
-            conf = float(probs[i]) if probs is not None else 0.0
-
-            if conf < 0.85:  # Slightly relaxed threshold (was 0.90) — catches more valid faces
-                continue
-
-            # Skip tiny faces (likely false positives)
-            x1, y1, x2, y2 = box
-            face_w = abs(x2 - x1)
-            face_h = abs(y2 - y1)
-            if face_w < 20 or face_h < 20:
-                continue
-
-            results.append({
-                "embedding": emb,
-                "box": box,
-                "confidence": conf,
-            })
-
-        return results
+        One MTCNN pass per image gives both boxes and aligned crops: detect() runs
+        the P/R/O-Net cascade on equally-sized images in batches, extract() crops
+        the kept boxes without re-detecting, and the crops of all images go
+        through InceptionResnetV1 together.
+        """
+        self._ensure_loaded()
+        results: list[list[dict]] = [[] for _ in images]
+
+        # Bucket images by padded size: MTCNN batches must share one shape. Padding
+        # is added at the right/bottom, so boxes stay in the original coordinates.
+        buckets: dict[tuple[int, int], list[int]] = {}
+        for i, image in enumerate(images):
+            w, h = image.size
+            buckets.setdefault((_round_up(w, _PAD_TO), _round_up(h, _PAD_TO)), []).append(i)
+
+        crops, owners = [], []
+        for size, indices in buckets.items():
+            for start in range(0, len(indices), detect_batch_size):
+                chunk = indices[start : start + detect_batch_size]
+                batch = [_pad_to(images[i], size) for i in chunk]
+                try:
+                    batch_boxes, batch_probs = self._detector.detect(batch)
+                except Exception:
+                    continue
+
+                kept = []
+                for i, boxes, probs in zip(chunk, batch_boxes, batch_probs):
+                    results[i] = _keep_faces(boxes, probs)
+                    if results[i]:
+                        kept.append(i)
+                if not kept:
+                    continue
+
+                # Crop from the unpadded images (extract() takes them one by one)
+                try:
+                    aligned = self._detector.extract(
+                        [images[i] for i in kept],
+                        [np.asarray([f["box"] for f in results[i]], dtype=np.float32) for i in kept],
+                        None,
+                    )
+                except Exception:
+                    for i in kept:
+                        results[i] = []
+                    continue
+                for i, faces_tensor in zip(kept, aligned):
+                    if faces_tensor.dim() == 3:
+                        faces_tensor = faces_tensor.unsqueeze(0)
+                    for face_idx in range(len(faces_tensor)):
+                        crops.append(faces_tensor[face_idx])
+                        owners.append((i, face_idx))
+
+        # Embed every crop of every image in a few large forward passes
+        embeddings = []
+        for start in range(0, len(crops), embed_batch_size):
+            batch = torch.stack(crops[start : start + embed_batch_size]).to(self._device)
+            with torch.no_grad():
+                embeddings.append(self._recognizer(batch).cpu().numpy())
+
+        if embeddings:
+            for (i, face_idx), emb in zip(owners, np.concatenate(embeddings)):
+                norm = np.linalg.norm(emb)
+                results[i][face_idx]["embedding"] = emb / norm if norm > 0 else None
+        return [[f for f in faces if f.get("embedding") is not None] for faces in results]
 
     def embed_single_face(self, image: Image.Image) -> Optional[np.ndarray]:
         """
@@ -135,3 +154,32 @@ class FaceEmbedder:
         # Pick highest-confidence face
         best = max(faces, key=lambda f: f["confidence"])
         return best["embedding"]
+
+
+def _round_up(value: int, multiple: int) -> int:
+    return -(-value // multiple) * multiple
+
+
+def _pad_to(image: Image.Image, size: tuple[int, int]) -> Image.Image:
+    """Pad an RGB image with black at the right/bottom to `size` (w, h)."""
+    if image.size == size:
+        return image
+    canvas = Image.new("RGB", size)
+    canvas.paste(image, (0, 0))
+    return canvas
+
+
+def _keep_faces(boxes, probs) -> list[dict]:
+    """Detections worth embedding: confident and not tiny (likely false positives)."""
+    faces = []
+    if boxes is None:
+        return faces
+    for box, prob in zip(boxes, probs):
+        conf = float(prob) if prob is not None else 0.0
+        if conf < 0.85:  # Slightly relaxed threshold (was 0.90) — catches more valid faces
+            continue
+        x1, y1, x2, y2 = box.tolist()
+        if abs(x2 - x1) < 20 or abs(y2 - y1) < 20:
+            continue
+        faces.append({"box": [x1, y1, x2, y2], "confidence": conf})
+    return faces
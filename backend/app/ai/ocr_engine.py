@@ -7,7 +7,66 @@ GPU-accelerated via PyTorch.
 from typing import Optional
 from PIL import Image
 import numpy as np
+import itertools
 import os
+import threading
+import time
+
+# Batched OCR groups images whose sizes round up to the same multiple of this
+_PAD_TO = 64
+
+
+class TextBudget:
+    """
+    Character and time limits for native text extraction. Extractors stop as
+    soon as the budget is spent and set `truncated` when they leave content
+    unread, so callers can record that the text is partial. With `sample`,
+    long documents are read as a spread of pages (first, quartiles, last)
+    that share the character budget, instead of only their beginning.
+    The default (no limits) reads everything.
+    """
+
+    SAMPLE_PAGES = 6  # documents with more pages/sheets than this are sampled
+
+    def __init__(self, max_chars: Optional[int] = None, seconds: Optional[float] = None, sample: bool = False):
+        self.max_chars = max_chars
+        self.seconds = seconds
+        self.sample = sample
+        self.start()
+
+    def start(self) -> None:
+        self.truncated = False
+        self._used = 0
+        self._deadline = time.monotonic() + self.seconds if self.seconds else None
+
+    @property
+    def full(self) -> bool:
+        """True once the characters or the time are used up."""
+        if self.max_chars is not None and self._used >= self.max_chars:
+            return True
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def take(self, text: str, cap: Optional[int] = None) -> str:
+        """The part of `text` that fits the budget (and the per-part cap), counted as used."""
+        limit = self.max_chars - self._used if self.max_chars is not None else None
+        if cap is not None:
+            limit = cap if limit is None else min(limit, cap)
+        if limit is not None and len(text) > limit:
+            text = text[: max(0, limit)]
+            self.truncated = True
+        self._used += len(text)
+        return text
+
+    def plan(self, n_parts: int) -> tuple[list[int], Optional[int]]:
+        """
+        Which parts (pages, slides, sheets) to read, in order, and the per-part
+        character cap. Marks the budget truncated if parts are skipped.
+        """
+        if not self.sample or self.max_chars is None or n_parts <= self.SAMPLE_PAGES:
+            return list(range(n_parts)), None
+        picks = sorted({0, 1, n_parts // 4, n_parts // 2, (3 * n_parts) // 4, n_parts - 1})
+        self.truncated = True
+        return picks, max(1, self.max_chars // len(picks))
 
 
 class OCREngine:
@@ -23,6 +82,8 @@ class OCREngine:
     def __init__(self, languages: list[str] = None):
         self._reader = None
         self._languages = languages or ["en"]
+        # The indexing pipeline calls in from several threads; EasyOCR is not thread-safe
+        self._lock = threading.RLock()
 
     def load_model(self) -> None:
         """Load EasyOCR reader with improved settings."""
@@ -37,8 +98,28 @@ class OCREngine:
         print(f"[OCR] Loaded EasyOCR with languages: {self._languages}")
 
     def _ensure_loaded(self):
-        if self._reader is None:
-            self.load_model()
+        with self._lock:
+            if self._reader is None:
+                self.load_model()
+
+    def _readtext(self, image, **kwargs) -> list:
+        """Serialized call into the shared EasyOCR reader."""
+        with self._lock:
+            return self._reader.readtext(image, **kwargs)
+
+    def _readtext_batched(self, images: list[np.ndarray], **kwargs) -> list[list]:
+        """Serialized batched call (CRAFT runs once over equally-sized images)."""
+        with self._lock:
+            return self._reader.readtext_batched(images, **kwargs)
+
+    @staticmethod
+    def _upscale_small(image: Image.Image) -> Image.Image:
+        """Upscale small images for better OCR accuracy."""
+        w, h = image.size
+        if w < 800 or h < 800:
+            scale = max(800 / w, 800 / h, 1.5)
+            image = image.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+        return image
 
     def extract_text(self, image: Image.Image) -> str:
         """
@@ -48,18 +129,10 @@ class OCREngine:
         self._ensure_loaded()
 
         try:
-            # Upscale small images for better OCR accuracy
-            w, h = image.size
-            if w < 800 or h < 800:
-                scale = max(800 / w, 800 / h, 1.5)
-                new_w = int(w * scale)
-                new_h = int(h * scale)
-                image = image.resize((new_w, new_h), Image.Resampling.LANCZOS)
-
-            img_array = np.array(image)
+            img_array = np.array(self._upscale_small(image))
 
             # detail=1 returns (bbox, text, confidence)
-            results = self._reader.readtext(
+            results = self._readtext(
                 img_array,
                 detail=1,
                 paragraph=False,   # Keep individual words for better keyword matching
@@ -75,6 +148,36 @@ class OCREngine:
             print(f"[OCR] Error: {e}")
             return ""
 
+    def extract_text_batch(self, images: list[np.ndarray], batch_size: int = 8) -> list[str]:
+        """
+        Extract text from many in-memory RGB images (uint8 arrays) — e.g. the
+        frames the indexer already decoded — instead of re-reading each file.
+        Images are grouped by size (padded at the right/bottom to a common
+        shape) so the CRAFT detector runs once per group rather than per image.
+        """
+        self._ensure_loaded()
+        texts = [""] * len(images)
+        groups: dict[tuple[int, int], list[tuple[int, np.ndarray]]] = {}
+        for i, image in enumerate(images):
+            arr = np.asarray(self._upscale_small(Image.fromarray(image)))
+            groups.setdefault((_round_up(arr.shape[0], _PAD_TO), _round_up(arr.shape[1], _PAD_TO)), []).append((i, arr))
+
+        for (h, w), members in groups.items():
+            for start in range(0, len(members), batch_size):
+                chunk = members[start : start + batch_size]
+                batch = [_pad_to(arr, h, w) for _, arr in chunk]
+                try:
+                    results = self._readtext_batched(
+                        batch, detail=1, paragraph=False, batch_size=batch_size, workers=0,
+                    )
+                except Exception as e:
+                    print(f"[OCR] Batched OCR failed, falling back to one image at a time: {e}")
+                    results = [self._readtext(arr, detail=1, paragraph=False, batch_size=8, workers=0)
+                               for _, arr in chunk]
+                for (i, _), result in zip(chunk, results):
+                    texts[i] = " ".join(r[1] for r in result if r[2] >= 0.4).strip()
+        return texts
+
     def extract_text_from_path(self, filepath: str) -> str:
         """
         Smart text extraction — picks the best method based on file type.
@@ -82,59 +185,67 @@ class OCREngine:
           1. Native text extraction (PDF, DOCX, PPTX, XLSX, TXT, MD, CSV)
           2. EasyOCR (images and scanned PDFs)
         """
+        text = self.extract_native_text(filepath)
+        if text is not None:
+            return text
+        return self.ocr_document(filepath)
+
+    def extract_native_text(self, filepath: str, budget: Optional[TextBudget] = None) -> Optional[str]:
+        """
+        Text from the document's own structure — no OCR model needed, so this is
+        what the document extraction worker processes run. With a budget, stops
+        early and sets budget.truncated if content was left unread.
+        Returns None when the file needs OCR instead (images, scanned PDFs).
+        """
         ext = os.path.splitext(filepath)[1].lower()
+        budget = budget or TextBudget()
+        budget.start()
 
-        # --- Native document extraction (fast, accurate, no OCR needed) ---
         if ext == ".pdf":
-            text = self._extract_pdf(filepath)
+            text = self._extract_pdf(filepath, budget)
             if text and len(text.strip()) > 20:
                 return text
-            # Scanned PDF — fall through to EasyOCR
-
-        elif ext in (".docx", ".doc"):
-            text = self._extract_docx(filepath)
-            if text:
-                return text
-
-        elif ext in (".pptx", ".ppt"):
-            text = self._extract_pptx(filepath)
-            if text:
-                return text
-
-        elif ext in (".xlsx", ".xls", ".csv"):
-            text = self._extract_xlsx(filepath)
-            if text:
-                return text
+            return None  # Scanned PDF — needs EasyOCR
 
-        elif ext in (".txt", ".md", ".rtf"):
-            text = self._extract_plaintext(filepath)
-            if text:
-                return text
+        if ext in (".docx", ".doc"):
+            return self._extract_docx(filepath, budget)
+        if ext in (".pptx", ".ppt"):
+            return self._extract_pptx(filepath, budget)
+        if ext in (".xlsx", ".xls", ".csv"):
+            return self._extract_xlsx(filepath, budget)
+        if ext in (".txt", ".md", ".rtf"):
+            return self._extract_plaintext(filepath, budget)
+        return None
 
-        # --- EasyOCR fallback for images and scanned documents ---
-        if ext in (".pdf",):
-            # Try rendering PDF pages as images and OCR them
+    def ocr_document(self, filepath: str) -> str:
+        """EasyOCR fallback for images and scanned PDFs (rendered page by page)."""
+        if os.path.splitext(filepath)[1].lower() == ".pdf":
             return self._ocr_pdf_pages(filepath)
-
-        # For image files — run EasyOCR directly
         return self._ocr_image_path(filepath)
 
     # ------------------------------------------------------------------ #
     #  Native extractors                                                   #
     # ------------------------------------------------------------------ #
 
-    def _extract_pdf(self, filepath: str) -> str:
+    def _extract_pdf(self, filepath: str, budget: Optional[TextBudget] = None) -> str:
         """Extract text from a digital (non-scanned) PDF using PyMuPDF."""
+        budget = budget or TextBudget()
         try:
             import fitz  # PyMuPDF
             doc = fitz.open(filepath)
             texts = []
-            for page in doc:
-                texts.append(page.get_text("text"))
+            pages, cap = budget.plan(len(doc))
+            for page_num in pages:
+                if budget.full:
+                    budget.truncated = True
+                    break
+                texts.append(budget.take(doc[page_num].get_text("text"), cap))
             doc.close()
             return " ".join(texts).strip()
         except ImportError:
             return ""
+        except MemoryError:
+            raise  # the extraction worker's memory cap: reported as such, not as empty text
         except Exception as e:
             print(f"[OCR] PDF native extract error: {e}")
             return ""
@@ -153,7 +264,7 @@ class OCREngine:
                 img_array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w, pix.n)
                 if pix.n == 4:
                     img_array = img_array[:, :, :3]
-                results = self._reader.readtext(img_array, detail=1, paragraph=False)
+                results = self._readtext(img_array, detail=1, paragraph=False)
                 page_text = " ".join(r[1] for r in results if r[2] >= 0.4)
                 texts.append(page_text)
             doc.close()
@@ -162,73 +273,95 @@ class OCREngine:
             print(f"[OCR] PDF page OCR error: {e}")
             return ""
 
-    def _extract_docx(self, filepath: str) -> str:
+    def _extract_docx(self, filepath: str, budget: Optional[TextBudget] = None) -> str:
         """Extract text from DOCX using python-docx."""
+        budget = budget or TextBudget()
         try:
             import docx
             doc = docx.Document(filepath)
             parts = []
-            for para in doc.paragraphs:
-                if para.text.strip():
-                    parts.append(para.text.strip())
-            # Also extract table content
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        if cell.text.strip():
-                            parts.append(cell.text.strip())
+            # Paragraphs, then table content
+            cells = (cell for table in doc.tables for row in table.rows for cell in row.cells)
+            for block in itertools.chain(doc.paragraphs, cells):
+                if budget.full:
+                    budget.truncated = True
+                    break
+                if block.text.strip():
+                    parts.append(budget.take(block.text.strip()))
             return " ".join(parts)
         except ImportError:
             return ""
+        except MemoryError:
+            raise  # the extraction worker's memory cap: reported as such, not as empty text
         except Exception as e:
             print(f"[OCR] DOCX extract error: {e}")
             return ""
 
-    def _extract_pptx(self, filepath: str) -> str:
+    def _extract_pptx(self, filepath: str, budget: Optional[TextBudget] = None) -> str:
         """Extract text from PPTX using python-pptx."""
+        budget = budget or TextBudget()
         try:
             from pptx import Presentation
             prs = Presentation(filepath)
             parts = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text.strip():
-                        parts.append(shape.text.strip())
-            return " ".join(parts)
+            slides, cap = budget.plan(len(prs.slides))
+            for slide_num in slides:
+                if budget.full:
+                    budget.truncated = True
+                    break
+                slide_parts = [
+                    shape.text.strip() for shape in prs.slides[slide_num].shapes
+                    if hasattr(shape, "text") and shape.text.strip()
+                ]
+                parts.append(budget.take(" ".join(slide_parts), cap))
+            return " ".join(p for p in parts if p)
         except ImportError:
             return ""
+        except MemoryError:
+            raise  # the extraction worker's memory cap: reported as such, not as empty text
         except Exception as e:
             print(f"[OCR] PPTX extract error: {e}")
             return ""
 
-    def _extract_xlsx(self, filepath: str) -> str:
-        """Extract text from XLSX/CSV."""
+    def _extract_xlsx(self, filepath: str, budget: Optional[TextBudget] = None) -> str:
+        """Extract text from XLSX/CSV (rows are streamed, so reading stops when the budget is spent)."""
+        budget = budget or TextBudget()
         ext = os.path.splitext(filepath)[1].lower()
         try:
             if ext == ".csv":
-                with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                    return f.read(5000)
+                return _read_prefix(filepath, budget)
             import openpyxl
             wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
             parts = []
-            for ws in wb.worksheets:
-                for row in ws.iter_rows(values_only=True):
+            sheets, cap = budget.plan(len(wb.worksheets))
+            for sheet_num in sheets:
+                sheet_parts, sheet_chars = [], 0
+                for row in wb.worksheets[sheet_num].iter_rows(values_only=True):
+                    if budget.full or (cap is not None and sheet_chars >= cap):
+                        budget.truncated = True
+                        break
                     for cell in row:
                         if cell is not None and str(cell).strip():
-                            parts.append(str(cell).strip())
+                            text = budget.take(str(cell).strip(), None if cap is None else cap - sheet_chars)
+                            sheet_chars += len(text) + 1
+                            sheet_parts.append(text)
+                parts.extend(p for p in sheet_parts if p)
             wb.close()
             return " ".join(parts)
         except ImportError:
             return ""
+        except MemoryError:
+            raise  # the extraction worker's memory cap: reported as such, not as empty text
         except Exception as e:
             print(f"[OCR] XLSX extract error: {e}")
             return ""
 
-    def _extract_plaintext(self, filepath: str) -> str:
+    def _extract_plaintext(self, filepath: str, budget: Optional[TextBudget] = None) -> str:
         """Read plain text files directly."""
         try:
-            with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read(10000)
+            return _read_prefix(filepath, budget or TextBudget())
+        except MemoryError:
+            raise
         except Exception:
             return ""
 
@@ -236,7 +369,7 @@ class OCREngine:
         """Run EasyOCR on an image file path."""
         self._ensure_loaded()
         try:
-            results = self._reader.readtext(
+            results = self._readtext(
                 filepath,
                 detail=1,
                 paragraph=False,
@@ -248,3 +381,23 @@ class OCREngine:
         except Exception as e:
             print(f"[OCR] Error on {filepath}: {e}")
             return ""
+
+
+def _round_up(value: int, multiple: int) -> int:
+    return -(-value // multiple) * multiple
+
+
+def _pad_to(image: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Pad an (H, W, 3) image with white at the bottom/right (blank paper for the text detector)."""
+    if image.shape[:2] == (height, width):
+        return image
+    out = np.full((height, width, image.shape[2]), 255, dtype=image.dtype)
+    out[: image.shape[0], : image.shape[1]] = image
+    return out
+
+
+def _read_prefix(filepath: str, budget: TextBudget) -> str:
+    """A text file up to the budget's characters (all of it without a limit); take() marks the rest truncated."""
+    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read() if budget.max_chars is None else f.read(budget.max_chars + 1)
+    return budget.take(text)
@@ -3,9 +3,12 @@ Indexing API endpoints.
 """
 
 import asyncio
+import json
 from fastapi import APIRouter, Request, BackgroundTasks, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.schemas import IndexRequest, IndexProgressResponse
-from app.core.indexer import index_directory, index_directory_incremental, get_progress, cancel_indexing, scan_directory
+from app.core.indexer import index_directory, index_directory_incremental, get_progress, cancel_indexing
+from app.core.scanner import iter_scan
 
 router = APIRouter()
 
@@ -29,6 +32,8 @@ async def start_indexing(
     face_embedder = request.app.state.face_embedder
     face_store = request.app.state.face_store
     ocr_engine = request.app.state.ocr_engine
+    text_embedder = request.app.state.text_embedder
+    passage_store = request.app.state.passage_store
 
     # Validate paths
     valid_paths = []
@@ -57,6 +62,8 @@ async def start_indexing(
                 face_embedder=face_embedder,
                 face_store=face_store,
                 ocr_engine=ocr_engine,
+                text_embedder=text_embedder,
+                passage_store=passage_store,
             )
 
     # Run as a background coroutine
@@ -75,6 +82,15 @@ async def indexing_progress():
     return get_progress().to_dict()
 
 
+@router.get("/watcher")
+async def watcher_status(request: Request):
+    """Status of the real-time folder watcher (pending changes, batches applied)."""
+    watcher = getattr(request.app.state, "folder_watcher", None)
+    if watcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **watcher.get_status()}
+
+
 @router.post("/cancel")
 async def cancel():
     """Cancel the current indexing job."""
@@ -85,22 +101,32 @@ async def cancel():
 @router.post("/scan")
 async def scan_files(body: IndexRequest):
     """
-    Dry-run scan — returns file count without indexing.
+    Dry-run scan — counts files without indexing.
+    Streams newline-delimited JSON: one progress line per scanned chunk
+    ({"done": false, "total_files", "breakdown"}), then a final line with "done": true.
     Useful for showing the user how many files will be indexed.
     """
-    total = 0
-    breakdown = {}
-    for path in body.paths:
-        import os
-        if os.path.isdir(path):
-            files = scan_directory(path)
-            total += len(files)
-            breakdown[path] = len(files)
-
-    return {
-        "total_files": total,
-        "breakdown": breakdown,
-    }
+    async def _stream():
+        total = 0
+        breakdown = {}
+        for path in body.paths:
+            import os
+            if not os.path.isdir(path):
+                continue
+            breakdown[path] = 0
+            chunks = iter_scan(path)
+            while True:
+                # Walk in a worker thread so the event loop keeps serving requests
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                total += len(chunk)
+                breakdown[path] += len(chunk)
+                yield json.dumps({"done": False, "total_files": total, "breakdown": breakdown}) + "\n"
+
+        yield json.dumps({"done": True, "total_files": total, "breakdown": breakdown}) + "\n"
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
 
 
 @router.post("/incremental")
@@ -122,6 +148,8 @@ async def start_incremental_indexing(
     face_embedder = request.app.state.face_embedder
     face_store = request.app.state.face_store
     ocr_engine = request.app.state.ocr_engine
+    text_embedder = request.app.state.text_embedder
+    passage_store = request.app.state.passage_store
 
     # Validate paths (same as regular indexing)
     valid_paths = []
@@ -147,6 +175,8 @@ async def start_incremental_indexing(
                 face_embedder=face_embedder,
                 face_store=face_store,
                 ocr_engine=ocr_engine,
+                text_embedder=text_embedder,
+                passage_store=passage_store,
             )
 
     # Run as a background coroutine
@@ -1,6 +1,7 @@
 """
 Search API endpoints.
-Supports: visual similarity search (CLIP), OCR text search, and face search.
+Supports: visual similarity search (CLIP), OCR text search, document passage
+search, and face search.
 """
 
 import io
@@ -9,8 +10,10 @@ from typing import Optional
 from fastapi import APIRouter, Request, HTTPException, UploadFile, File
 from PIL import Image
 
-from app.models.schemas import SearchRequest, SearchResponse
-from app.core.searcher import search_files
+from app.models.schemas import SearchRequest, SearchResponse, SearchPageRequest
+from app.core.config import get_settings
+from app.core.searcher import search_files, search_next_page
+from app.core.query_cache import get_query_cache
 
 router = APIRouter()
 
@@ -20,38 +23,20 @@ async def list_indexed_folders(request: Request):
     """
     Returns a list of unique top-level folder paths that have been indexed.
     Used by the frontend to let users scope their search to a specific folder.
+    Read from the folder table (one row per folder), sorted alphabetically.
     """
     vector_store = request.app.state.vector_store
     try:
-        raw = vector_store._collection.get(include=["metadatas"])
+        return {"folders": vector_store.list_folders()}
     except Exception:
         return {"folders": []}
 
-    metadatas = raw.get("metadatas") or []
-    seen_folders = set()
-
-    for meta in metadatas:
-        if not meta:
-            continue
-        filepath = meta.get("filepath", "")
-        if not filepath:
-            continue
-        # Detect path separator
-        sep = "\\" if "\\" in filepath else "/"
-        folder = filepath.rsplit(sep, 1)[0] if sep in filepath else filepath
-        if folder:
-            seen_folders.add(folder)
-
-    # Sort alphabetically
-    folders = sorted(seen_folders)
-    return {"folders": folders}
-
 
 @router.post("/", response_model=SearchResponse)
 async def search(request: Request, body: SearchRequest):
     """
     Search indexed files using natural language.
-    Combines CLIP visual similarity + OCR text-in-image matching.
+    Combines CLIP visual similarity + OCR text-in-image matching + document passages.
     """
     clip_embedder = request.app.state.clip_embedder
     vector_store = request.app.state.vector_store
@@ -66,10 +51,29 @@ async def search(request: Request, body: SearchRequest):
         folder_path=body.folder_path,
         min_score=body.min_score,
         text_only=body.text_only,
+        collapse_duplicates=body.collapse_duplicates,
+        page_size=body.page_size,
+        text_embedder=request.app.state.text_embedder,
+        passage_store=request.app.state.passage_store,
     )
     return results
 
 
+@router.post("/page", response_model=SearchResponse)
+async def search_page(request: Request, body: SearchPageRequest):
+    """
+    Fetch the next page of a paged search (next_cursor from the previous response).
+    Returns 410 once the cached result set has expired — search again.
+    """
+    try:
+        page = search_next_page(body.cursor, request.app.state.vector_store)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=410, detail="Search results expired — please search again")
+    return page
+
+
 @router.get("/stats")
 async def search_stats(request: Request):
     """Get index statistics."""
@@ -77,9 +81,17 @@ async def search_stats(request: Request):
     face_store = request.app.state.face_store
     stats = vector_store.get_stats()
     stats["total_faces"] = face_store.count()
+    stats["total_passages"] = request.app.state.passage_store.count()
+    stats["query_cache"] = get_query_cache().stats()
     return stats
 
 
+@router.get("/people")
+async def list_people(request: Request):
+    """People found by face clustering (stable person ids), largest first."""
+    return {"people": request.app.state.face_store.list_persons()}
+
+
 @router.post("/face")
 async def face_search(
     request: Request,
@@ -110,57 +122,49 @@ async def face_search(
             detail="No face detected in the uploaded image. Please upload a clear photo with a visible face."
         )
 
-    # Search for matching faces — get more raw results to allow best-per-file selection
-    raw_results = face_store.search_face(ref_embedding, n_results=n_results * 5)
-
-    # For each source file, keep only the BEST matching face (highest similarity)
-    # This gives one result per photo, showing the closest face match
-    best_per_file: dict[str, dict] = {}
-    for i, face_id in enumerate(raw_results["ids"]):
-        metadata = raw_results["metadatas"][i]
-        distance = raw_results["distances"][i]
-        source_file = metadata.get("source_file_id", "")
-
-        # Apply folder scope filter if specified
-        if folder_path:
-            file_path_val = metadata.get("filepath", "")
-            if folder_path.lower() not in file_path_val.lower():
-                continue
+    # Centroid lookup → posting lists of the matching person(s): one result per photo.
+    # min_similarity is on the 0–1 scale below; as a cosine it can tighten which persons
+    # match, but never below the clustering threshold (lower accepts unrelated people)
+    person_threshold = max(2 * min_similarity - 1, get_settings().face_cluster_threshold)
+    matches = face_store.find_person(
+        ref_embedding,
+        n_results=n_results,
+        folder_path=folder_path,
+        min_similarity=person_threshold,
+    )
 
-        # Cosine distance → similarity (0–1)
-        similarity = max(0, 1 - (distance / 2))
+    results = []
+    for match in matches:
+        metadata = match["metadata"]
+        # Cosine similarity → 0–1 (same scale as the former cosine-distance scores)
+        similarity = max(0, (1 + match["similarity"]) / 2)
 
         # Only include results above the user-specified minimum similarity threshold
         if similarity < min_similarity:
             continue
 
-        if source_file not in best_per_file or similarity > best_per_file[source_file]["_sim"]:
-            best_per_file[source_file] = {
-                "_sim": similarity,
-                "file_id": source_file,
-                "filepath": metadata.get("filepath", ""),
-                "filename": metadata.get("filename", ""),
-                "relevance_score": round(similarity * 100, 1),
-                "face_box": {
-                    "x1": metadata.get("box_x1", 0),
-                    "y1": metadata.get("box_y1", 0),
-                    "x2": metadata.get("box_x2", 0),
-                    "y2": metadata.get("box_y2", 0),
-                },
-                "confidence": metadata.get("confidence", 0),
-                "extension": os.path.splitext(metadata.get("filename", ""))[1].lower(),
-                "file_type": "image",
-                "match_type": "face",
-                "size_mb": 0,
-                "created": "",
-                "modified": "",
-            }
-
-    # Sort by similarity descending, remove internal key, cap at n_results
-    results = sorted(best_per_file.values(), key=lambda x: x["_sim"], reverse=True)
-    for r in results:
-        r.pop("_sim", None)
-    results = results[:n_results]
+        results.append({
+            "file_id": metadata.get("source_file_id", ""),
+            "filepath": metadata.get("filepath", ""),
+            "filename": metadata.get("filename", ""),
+            "relevance_score": round(similarity * 100, 1),
+            "person_id": match["person_id"],
+            "face_box": {
+                "x1": metadata.get("box_x1", 0),
+                "y1": metadata.get("box_y1", 0),
+                "x2": metadata.get("box_x2", 0),
+                "y2": metadata.get("box_y2", 0),
+            },
+            "confidence": metadata.get("confidence", 0),
+            "extension": os.path.splitext(metadata.get("filename", ""))[1].lower(),
+            "file_type": "image",
+            "match_type": "face",
+            "size_mb": 0,
+            "created": "",
+            "modified": "",
+        })
+
+    results.sort(key=lambda x: x["relevance_score"], reverse=True)
 
     return {
         "query": "face_search",
@@ -8,6 +8,7 @@ from fastapi import APIRouter, Request
 from app.models.schemas import SettingsResponse, GPUInfoResponse
 from app.core.config import get_settings
 from app.ai.gpu_detect import get_system_info
+from app.db.file_journal import get_file_journal
 
 router = APIRouter()
 
@@ -52,11 +53,13 @@ async def system_info():
 
 @router.post("/clear-index")
 async def clear_index(request: Request):
-    """Clear ALL indexed data (images + faces). This is destructive!"""
+    """Clear ALL indexed data (images + faces + document passages). This is destructive!"""
     vector_store = request.app.state.vector_store
     face_store = request.app.state.face_store
     vector_store.clear()
     face_store.clear()
+    request.app.state.passage_store.clear()
+    get_file_journal().clear()
     return {"status": "cleared", "message": "All indexed data has been removed."}
 
 
@@ -79,4 +82,8 @@ async def save_indexed_folders(request: Request, folders: list[str]):
     with open(settings.config_file, "w") as f:
         json.dump(config, f, indent=2)
 
+    watcher = getattr(request.app.state, "folder_watcher", None)
+    if watcher is not None:
+        watcher.update_folders(folders)
+
     return {"status": "saved", "folders": folders}
@@ -0,0 +1,53 @@
+"""
+Document chunking for passage-level retrieval.
+Extracted document text is split into overlapping passages small enough for
+the passage embedder (all-mpnet-base-v2 reads 384 tokens; ~800 characters is
+~200 tokens). Passage ends snap back to a sentence or word boundary so phrases
+aren't cut in half, and consecutive passages overlap so a match that straddles
+a boundary is still inside one passage.
+"""
+
+import re
+
+_WS_RE = re.compile(r"\s+")
+_SENTENCE_END_RE = re.compile(r"[.!?。]\s")
+
+
+def chunk_text(text: str, size: int = 800, overlap: int = 200, max_passages: int = 0) -> list[tuple[int, str]]:
+    """
+    Split text into overlapping passages of at most `size` characters.
+    Returns (start offset in the whitespace-normalized text, passage) pairs.
+    max_passages > 0 stops after that many passages.
+    """
+    text = _WS_RE.sub(" ", text).strip()
+    if not text:
+        return []
+    size = max(1, size)
+    overlap = min(max(0, overlap), size // 2)
+
+    passages = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            end = _snap_end(text, start, end, min_len=size // 2)
+        passages.append((start, text[start:end].strip()))
+        if end >= len(text) or (max_passages and len(passages) >= max_passages):
+            break
+        # Next passage starts `overlap` characters back, at a word boundary
+        next_start = max(start + 1, end - overlap)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return [(s, p) for s, p in passages if p]
+
+
+def _snap_end(text: str, start: int, end: int, min_len: int) -> int:
+    """Move a passage end back to the last sentence end (or space) that keeps it ≥ min_len."""
+    window = text[start + min_len : end]
+    sentence_ends = [m.end() for m in _SENTENCE_END_RE.finditer(window)]
+    if sentence_ends:
+        return start + min_len + sentence_ends[-1]
+    space = window.rfind(" ")
+    if space != -1:
+        return start + min_len + space + 1
+    return end
@@ -26,6 +26,74 @@ class Settings(BaseSettings):
     batch_size: int = 32
     max_threads: int = 4
     thumbnail_max_dim: int = 256
+    face_frame_max_dim: int = 1024  # Longest side of the reduced frame used for face detection
+    face_detect_batch_size: int = 16   # Equally-sized frames per MTCNN pass
+    face_embed_batch_size: int = 64    # Face crops (from any images) per recognizer pass
+    face_cluster_threshold: float = 0.6  # Cosine similarity for a face to join a person (people index)
+    ocr_frame_max_dim: int = 1280   # Longest side of the in-memory frame OCR reads (no second decode)
+    ocr_batch_size: int = 8         # Equally-sized frames per EasyOCR detector pass
+    # Skip OCR on images whose CLIP embedding says they almost surely hold no text
+    # (probability from "screenshot/document/sign…" vs "landscape/people…" prompts)
+    ocr_prescreen: bool = True
+    ocr_min_text_probability: float = 0.15
+
+    # Document text extraction (PDF/Office/text) runs in worker processes
+    doc_extract_workers: int = 0              # 0 = max_threads
+    doc_extract_timeout_seconds: float = 60.0  # per file; the file is indexed by name only if exceeded
+    doc_extract_memory_mb: int = 2048          # address-space cap per worker (Linux/macOS)
+    # Extraction stops once it has the text the index keeps (2000 chars, or
+    # passage_max_chars with passage retrieval on) or after this
+    # long; long PDFs/decks/workbooks are sampled (first, quartile, last pages) instead
+    doc_extract_budget_seconds: float = 5.0
+    doc_extract_sample_pages: bool = True
+
+    # Passage retrieval: document text is chunked into overlapping passages, each
+    # embedded with the sentence-transformer TextEmbedder into its own collection;
+    # search pools passage hits per file ("max" or "topk" = mean of the best k)
+    passage_index: bool = True
+    passage_chars: int = 800            # ~200 tokens, well inside mpnet's window
+    passage_overlap: int = 200
+    passage_max_chars: int = 100_000    # text extracted per document when passages are on
+    passage_batch_size: int = 64        # passages per TextEmbedder pass
+    passage_pool: str = "max"
+    passage_pool_k: int = 3
+    passage_search_limit: int = 300     # passages retrieved per query before pooling
+    passage_min_similarity: float = 0.35  # pooled cosine below this isn't a passage match
+
+    # Write-behind buffer for vector DB upserts
+    write_buffer_records: int = 1024     # Flush once this many file/face records are pending
+    write_buffer_seconds: float = 5.0    # ...or once the oldest pending record is this old
+
+    # File vector backend: "chroma" (HNSW), "flat" (exact search over a memory-mapped
+    # matrix — faster and exact up to a few hundred thousand files; float16 halves its size)
+    # or "ivfpq" (PQ codes in RAM + exact re-rank from the on-disk matrix, for millions;
+    # metadata moves from ChromaDB to SQLite on first start, so switching back needs a re-index)
+    vector_backend: str = "chroma"
+    flat_vector_dtype: str = "float32"
+    pq_subquantizers: int = 64        # bytes per vector for the PQ code
+    pq_nlist: int = 0                 # IVF lists (0 = ~4·sqrt(files))
+    pq_nprobe: int = 16               # lists scanned per query (recall vs speed)
+    pq_train_sample: int = 100_000    # vectors sampled to train the codebooks
+    pq_min_train_vectors: int = 20_000  # below this, search stays exact
+
+    # Content-hash deduplication: identical files are embedded/OCR'd/face-scanned once
+    content_dedup: bool = True
+    content_hash_sample_mb: int = 4  # MB hashed from each end of the file (plus its size)
+
+    # Query embedding cache (LRU, optionally persisted to data_dir/query_cache.npz)
+    query_cache_size: int = 1024
+    query_cache_persist: bool = True
+
+    # Cursor pagination: ranked result sets are kept server-side this long after last use
+    search_page_ttl_seconds: int = 300
+
+    # Search-only replicas: load just CLIP's text tower at startup (vision loads
+    # lazily if an indexing job or image query arrives) and don't watch folders
+    search_only: bool = False
+
+    # Real-time indexing of saved folders (watchdog)
+    watch_folders: bool = True
+    watch_debounce_seconds: float = 2.0  # Quiet period before a batch of changes is indexed
     max_file_size_mb: int = 100
 
     # Supported image extensions (ALL common formats — NO videos)
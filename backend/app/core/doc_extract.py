@@ -0,0 +1,221 @@
+"""
+Process-pool document text extraction.
+PyMuPDF, python-docx/pptx and openpyxl parsing is CPU-bound, so documents are
+parsed in worker processes (like image decoding) instead of one after another
+on the pipeline thread. Each file runs under a time limit and each worker under
+an address-space cap, so one 500-page PDF or giant spreadsheet costs at most its
+timeout instead of stalling the batch. Within that, each extraction runs under
+a character/time budget (TextBudget) and stops as soon as it is met, reporting
+whether the text is partial.
+
+  - soft timeout: SIGALRM inside the worker interrupts the parser between calls
+  - hard timeout: if the pool stops making progress (a parser stuck in C code),
+    the workers are killed, stuck files fail and the rest are resubmitted
+  - memory cap: RLIMIT_AS in each worker turns a runaway parse into a MemoryError.
+    Workers are spawned (not forked from the server, which holds the models) and
+    the cap is on top of what the worker maps at startup, so it bounds the parse
+
+Results are yielded as each extraction completes. Several pipeline threads
+may share one extractor; files caught in another thread's pool restart are
+retried.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+
+@dataclass
+class ExtractedText:
+    """Outcome for one document (index is its position in the submitted list)."""
+    index: int
+    text: Optional[str]         # None: the file needs OCR (scanned PDF) or extraction failed
+    error: Optional[str] = None
+    truncated: bool = False     # the budget stopped extraction with content left unread
+
+
+class _ExtractionTimeout(BaseException):  # not swallowed by the extractors' `except Exception`
+    pass
+
+
+# --- Worker process side ---
+
+_worker_engine = None
+
+
+def _init_worker(memory_limit_mb: int) -> None:
+    global _worker_engine
+    from app.ai.ocr_engine import OCREngine
+
+    _worker_engine = OCREngine()  # native extractors only: the EasyOCR model is never loaded here
+    if memory_limit_mb > 0:
+        try:
+            import resource
+            limit = _address_space() + memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass  # not available on this platform (e.g., Windows)
+
+
+def _address_space() -> int:
+    """Bytes of address space this process has mapped (0 where /proc isn't available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _on_alarm(signum, frame):
+    raise _ExtractionTimeout()
+
+
+def _extract(
+    filepath: str, timeout_seconds: float, max_chars: int, budget_seconds: float, sample: bool,
+) -> tuple[Optional[str], Optional[str], bool]:
+    """Extract one document's text. Returns (text or None, error or None, truncated)."""
+    from app.ai.ocr_engine import TextBudget
+
+    alarm = None
+    if timeout_seconds > 0:
+        try:
+            import signal
+            signal.signal(signal.SIGALRM, _on_alarm)
+            alarm = signal
+            signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+        except (ImportError, AttributeError, ValueError):
+            alarm = None
+    try:
+        budget = TextBudget(max_chars=max_chars, seconds=budget_seconds or None, sample=sample)
+        text = _worker_engine.extract_native_text(filepath, budget)
+        return (text[:max_chars] if text is not None else None), None, budget.truncated
+    except _ExtractionTimeout:
+        return None, f"Timed out after {timeout_seconds:.0f}s", False
+    except MemoryError:
+        return None, "Exceeded the extraction memory cap", False
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", False
+    finally:
+        if alarm is not None:
+            alarm.setitimer(alarm.ITIMER_REAL, 0)
+
+
+# --- Parent side ---
+
+class DocumentExtractor:
+    """Extracts document text in a process pool with per-file timeouts and memory caps."""
+
+    # Extra time the parent waits past the soft timeout before killing the workers
+    HARD_TIMEOUT_GRACE = 10.0
+    # Submissions per file before a crashed/killed extraction counts as a failure
+    MAX_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        max_workers: int,
+        timeout_seconds: float = 60.0,
+        memory_limit_mb: int = 2048,
+        budget_seconds: float = 0.0,
+        sample_pages: bool = False,
+    ):
+        self._max_workers = max(1, max_workers)
+        self._timeout = timeout_seconds
+        self._memory_limit_mb = memory_limit_mb
+        self._budget_seconds = budget_seconds  # soft: extraction stops early, keeping what it has
+        self._sample_pages = sample_pages
+        self._lock = threading.Lock()  # guards submit vs. restart
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            # Forked workers would inherit the server's models, and RLIMIT_AS counts them
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self._memory_limit_mb,),
+        )
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        """Kill every worker (some may be stuck in C code) and start a fresh pool."""
+        with self._lock:
+            if executor is not self._executor:
+                return  # another thread already restarted it
+            # The executor has no public way to kill a busy worker
+            processes = list((getattr(executor, "_processes", None) or {}).values())
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.kill()
+            self._executor = self._new_executor()
+
+    def extract_iter(self, filepaths: list[str], max_chars: int = 10000) -> Iterator[ExtractedText]:
+        """
+        Submit every file right away (so extraction overlaps whatever the caller
+        does next) and return an iterator of ExtractedText in completion order.
+        """
+        attempts = [0] * len(filepaths)
+        first = self._submit(filepaths, list(range(len(filepaths))), attempts, max_chars)
+        return self._collect(filepaths, attempts, max_chars, first)
+
+    def _submit(self, filepaths, todo: list[int], attempts: list[int], max_chars: int):
+        for i in todo:
+            attempts[i] += 1
+        with self._lock:
+            executor = self._executor
+            futures = {
+                executor.submit(
+                    _extract, filepaths[i], self._timeout, max_chars, self._budget_seconds, self._sample_pages,
+                ): i
+                for i in todo
+            }
+        return executor, futures
+
+    def _collect(self, filepaths, attempts: list[int], max_chars: int, submitted) -> Iterator[ExtractedText]:
+        while submitted is not None:
+            executor, futures = submitted
+            todo = []
+            started: dict = {}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                broken = False
+                for f in done:
+                    try:
+                        text, error, truncated = f.result()
+                        yield ExtractedText(futures[f], text, error, truncated)
+                    except (BrokenProcessPool, CancelledError) as e:
+                        broken = broken or isinstance(e, BrokenProcessPool)
+                        if attempts[futures[f]] >= self.MAX_ATTEMPTS:
+                            yield ExtractedText(futures[f], None, "Extraction worker crashed")
+                        else:
+                            todo.append(futures[f])
+                    except Exception as e:
+                        yield ExtractedText(futures[f], None, f"{type(e).__name__}: {e}")
+
+                # "running" includes the one call queued ahead per pool, so only the
+                # max_workers oldest overdue futures can actually be stuck in a worker
+                now = time.monotonic()
+                for f in pending:
+                    if f.running():
+                        started.setdefault(f, (now, futures[f]))
+                overdue = sorted(
+                    started[f] for f in pending
+                    if f in started and self._timeout > 0
+                    and now - started[f][0] > self._timeout + self.HARD_TIMEOUT_GRACE
+                )[: self._max_workers]
+                stuck = [f for f in pending if f in started and started[f] in overdue]
+                if stuck or broken:
+                    print(f"[DocExtract] {'Worker stuck' if stuck else 'Worker died'} — restarting extraction pool")
+                    for f in stuck:
+                        yield ExtractedText(futures[f], None, f"Timed out after {self._timeout:.0f}s (worker killed)")
+                    todo.extend(futures[f] for f in pending if f not in stuck)
+                    self._restart(executor)
+                    break
+            submitted = self._submit(filepaths, todo, attempts, max_chars) if todo else None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
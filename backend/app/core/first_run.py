@@ -35,6 +35,7 @@ def detect_hardware() -> dict:
         "gpu_vram_gb": 0,
         "ram_gb": round(psutil.virtual_memory().total / (1024**3), 1),
         "cpu_count": psutil.cpu_count(),
+        "physical_cores": psutil.cpu_count(logical=False) or psutil.cpu_count(),
     }
     
     try:
@@ -74,6 +75,7 @@ def create_personalized_config(hardware: dict) -> dict:
             clip_model = "openai/clip-vit-base-patch16"  # 512-dim, ~300MB
             batch_size = 8
             model_tier = "Entry-Level (<4GB VRAM)"
+        clip_engine = "torch"
     else:
         # CPU only - use smallest models
         clip_model = "openai/clip-vit-base-patch32"  # 512-dim, lightest
@@ -82,6 +84,8 @@ def create_personalized_config(hardware: dict) -> dict:
         else:
             batch_size = 4
         model_tier = "CPU Only"
+        # ONNX Runtime + int8 weights: 2–4× faster CLIP on CPU
+        clip_engine = "onnx"
     
     config = {
         "first_run_completed": True,
@@ -91,6 +95,9 @@ def create_personalized_config(hardware: dict) -> dict:
             "use_gpu": hardware["has_cuda"],
             "clip_model": clip_model,
             "model_tier": model_tier,
+            "clip_engine": clip_engine,
+            "onnx_quantize": True,
+            "onnx_threads": hardware.get("physical_cores") or hardware["cpu_count"],
         },
         "indexed_folders": [],
         "excluded_folders": settings.excluded_folders,
@@ -135,6 +142,7 @@ def run_first_time_setup() -> dict:
     print(f"   • CLIP model: {config['optimizations']['clip_model']}")
     print(f"   • Batch size: {config['optimizations']['batch_size']}")
     print(f"   • GPU acceleration: {'Enabled' if config['optimizations']['use_gpu'] else 'Disabled'}")
+    print(f"   • CLIP engine: {config['optimizations']['clip_engine']}")
     
     # Show model download size estimate
     model_name = config['optimizations']['clip_model']
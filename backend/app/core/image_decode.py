@@ -0,0 +1,316 @@
+"""
+Process-pool image decoding and CLIP preprocessing.
+JPEG decode, resize and normalization don't need the GIL, so they run in worker
+processes sized by Settings.max_threads. Workers write normalized pixel tensors
+straight into a shared-memory block owned by the parent — no pickled PIL images —
+which CLIPEmbedder.embed_images takes directly.
+
+Each file is decoded once, at the smallest resolution that still serves every
+consumer (CLIP input, the thumbnail, and the frame used for face detection):
+JPEGs use DCT scaling via Image.draft(), RAW files use their embedded preview.
+"""
+
+import io
+import math
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+
+RAW_EXTENSIONS = {
+    ".cr2", ".cr3", ".nef", ".arw", ".dng", ".orf",
+    ".rw2", ".raf", ".srw", ".pef", ".raw", ".rwl",
+}
+
+
+@dataclass(frozen=True)
+class ClipPreprocess:
+    """CLIP image preprocessing parameters (mirrors CLIPImageProcessor)."""
+    resize: int = 224       # shortest edge after resize
+    crop: int = 224         # center crop (square)
+    mean: tuple[float, float, float] = (0.48145466, 0.4578275, 0.40821073)
+    std: tuple[float, float, float] = (0.26862954, 0.26130258, 0.27577711)
+
+
+@dataclass
+class DecodedBatch:
+    """Result of ImageDecoder.decode_batch (all lists are aligned with the input paths)."""
+    pixels: np.ndarray                                   # (N, 3, crop, crop) float32
+    errors: list[Optional[str]]                          # error message or None
+    frames: list[Optional[np.ndarray]] = field(default_factory=list)  # reduced RGB uint8 frames
+    scales: list[float] = field(default_factory=list)    # frame size / original size
+
+
+def clip_pixels(image: Image.Image, cfg: ClipPreprocess) -> np.ndarray:
+    """Resize (bicubic) + center crop + normalize an RGB image. Returns (3, crop, crop) float32."""
+    w, h = image.size
+    scale = cfg.resize / min(w, h)
+    new_w, new_h = max(cfg.crop, round(w * scale)), max(cfg.crop, round(h * scale))
+    image = image.resize((new_w, new_h), Image.Resampling.BICUBIC)
+
+    left = (new_w - cfg.crop) // 2
+    top = (new_h - cfg.crop) // 2
+    image = image.crop((left, top, left + cfg.crop, top + cfg.crop))
+
+    arr = np.asarray(image, dtype=np.float32) / 255.0
+    arr = (arr - np.asarray(cfg.mean, dtype=np.float32)) / np.asarray(cfg.std, dtype=np.float32)
+    return arr.transpose(2, 0, 1)
+
+
+def _register_optional_openers() -> None:
+    """Enable HEIC/HEIF/AVIF decoding if pillow-heif is installed."""
+    try:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:
+        pass
+
+
+def _open_source(filepath: str) -> Image.Image:
+    """Open an image, preferring the embedded JPEG preview for RAW camera files."""
+    if os.path.splitext(filepath)[1].lower() in RAW_EXTENSIONS:
+        try:
+            import rawpy
+            with rawpy.imread(filepath) as raw:
+                thumb = raw.extract_thumb()
+            if thumb.format == rawpy.ThumbFormat.JPEG:
+                return Image.open(io.BytesIO(thumb.data))
+            return Image.fromarray(thumb.data)
+        except Exception:
+            pass  # rawpy missing or no preview — let PIL try the file itself
+    return Image.open(filepath)
+
+
+def load_reduced(filepath: str, min_short_side: int, min_long_side: int) -> tuple[Image.Image, float]:
+    """
+    Decode an image once at the smallest size with shortest edge ≥ min_short_side
+    and longest edge ≥ min_long_side (never upscaled).
+    Returns (RGB image, scale relative to the original dimensions).
+    """
+    img = _open_source(filepath)
+    orig_w, orig_h = img.size
+    factor = min(1.0, max(min_short_side / min(orig_w, orig_h), min_long_side / max(orig_w, orig_h)))
+    target = (max(1, math.ceil(orig_w * factor)), max(1, math.ceil(orig_h * factor)))
+
+    # JPEG: let libjpeg decode at 1/2, 1/4 or 1/8 scale (no-op for other formats)
+    if factor < 1.0:
+        img.draft("RGB", target)
+    img = img.convert("RGB")
+
+    # Finish the reduction (draft only gets within a power of two)
+    if img.size[0] > target[0] * 1.05:
+        reduce_by = int(img.size[0] / target[0])
+        if reduce_by >= 2:
+            img = img.reduce(reduce_by)
+        if img.size[0] > target[0] * 1.05:
+            img = img.resize(target, Image.Resampling.LANCZOS)
+
+    return img, img.size[0] / orig_w
+
+
+# --- Worker process side ---
+
+_worker_opts: dict = {}
+
+
+def _init_worker(opts: dict) -> None:
+    global _worker_opts
+    _worker_opts = opts
+    _register_optional_openers()
+
+
+def _decode_into(
+    pixels_shm: str,
+    pixels_shape: tuple,
+    frames_shm: Optional[str],
+    frames_shape: Optional[tuple],
+    index: int,
+    filepath: str,
+) -> tuple[Optional[str], Optional[tuple], float]:
+    """
+    Decode one file into row `index` of the shared blocks.
+    Returns (error or None, (h, w) of the frame written, frame scale vs. original).
+    """
+    from app.core.metadata import generate_thumbnail
+
+    cfg: ClipPreprocess = _worker_opts["clip"]
+    frame_dim = _worker_opts["frame_max_dim"]
+    try:
+        img, scale = load_reduced(
+            filepath,
+            min_short_side=cfg.resize,
+            min_long_side=max(_worker_opts["thumbnail_max_dim"], frame_dim),
+        )
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None, 1.0
+
+    try:
+        # Pool workers share the parent's resource tracker, so attaching here is safe
+        shm = shared_memory.SharedMemory(name=pixels_shm)
+        out = np.ndarray(pixels_shape, dtype=np.float32, buffer=shm.buf)
+        try:
+            out[index] = clip_pixels(img, cfg)
+        finally:
+            del out  # release the buffer view before closing the block
+            shm.close()
+
+        frame_hw = None
+        if frames_shm:
+            frame = img
+            if max(frame.size) > frame_dim:
+                frame = frame.copy()
+                frame.thumbnail((frame_dim, frame_dim), Image.Resampling.BILINEAR)
+            shm = shared_memory.SharedMemory(name=frames_shm)
+            out = np.ndarray(frames_shape, dtype=np.uint8, buffer=shm.buf)
+            try:
+                w, h = frame.size
+                out[index, :h, :w] = np.asarray(frame)
+                frame_hw = (h, w)
+                scale *= w / img.size[0]
+            finally:
+                del out
+                shm.close()
+
+        generate_thumbnail(filepath, _worker_opts["thumbnails_dir"], _worker_opts["thumbnail_max_dim"], image=img)
+        return None, frame_hw, scale
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None, 1.0
+    finally:
+        img.close()
+
+
+# --- Parent side ---
+
+class ImageDecoder:
+    """
+    Decodes batches of image files into CLIP-ready pixel tensors using a process pool.
+    With frame_max_dim > 0 it also returns a reduced RGB frame per image
+    (longest side ≤ frame_max_dim) for face detection, from the same decode.
+    Safe to share between threads: the pool is restarted once when a worker dies,
+    and the files caught in it are resubmitted.
+    """
+
+    # Submissions per file before a crashed decode counts as a failure
+    MAX_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        cfg: ClipPreprocess,
+        max_workers: int,
+        thumbnails_dir: str,
+        thumbnail_max_dim: int,
+        frame_max_dim: int = 0,
+    ):
+        self._cfg = cfg
+        self._max_workers = max(1, max_workers)
+        self._frame_max_dim = frame_max_dim
+        self._opts = {
+            "clip": cfg,
+            "thumbnails_dir": thumbnails_dir,
+            "thumbnail_max_dim": thumbnail_max_dim,
+            "frame_max_dim": frame_max_dim,
+        }
+        self._lock = threading.Lock()  # guards submit vs. restart
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            initializer=_init_worker,
+            initargs=(self._opts,),
+        )
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        """Replace a broken pool, unless another thread already did."""
+        with self._lock:
+            if executor is not self._executor:
+                return
+            print("[Decoder] Worker process died — restarting decode pool")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+
+    def _submit(self, todo: list[int], attempts: list[int], filepaths: list[str], *shm_args):
+        for i in todo:
+            attempts[i] += 1
+        with self._lock:
+            executor = self._executor
+            futures = {}
+            for i in todo:
+                try:
+                    f = executor.submit(_decode_into, *shm_args, i, filepaths[i])
+                except (BrokenProcessPool, RuntimeError) as e:  # broken, or shut down
+                    f = Future()
+                    f.set_exception(e)
+                futures[f] = i
+        return executor, futures
+
+    def decode_batch(self, filepaths: list[str]) -> DecodedBatch:
+        """
+        Decode a batch of images in parallel.
+        Rows for failed files are left zeroed and their error is set.
+        """
+        n = len(filepaths)
+        pixels_shape = (n, 3, self._cfg.crop, self._cfg.crop)
+        frames_shape = (n, self._frame_max_dim, self._frame_max_dim, 3) if self._frame_max_dim else None
+
+        pixels_shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(pixels_shape)) * 4))
+        frames_shm = (
+            shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(frames_shape))))
+            if frames_shape else None
+        )
+        shm_args = (pixels_shm.name, pixels_shape, frames_shm.name if frames_shm else None, frames_shape)
+        try:
+            results: list = [None] * n
+            attempts = [0] * n
+            todo = list(range(n))
+            retrying = False
+            while todo:
+                # After a crash the suspects go one at a time, so the culprit can't take the rest down again
+                batch, todo = (todo[:1], todo[1:]) if retrying else (todo, [])
+                executor, futures = self._submit(batch, attempts, filepaths, *shm_args)
+                broken = False
+                for f, i in futures.items():
+                    try:
+                        results[i] = f.result()
+                    except (BrokenProcessPool, CancelledError, RuntimeError) as e:
+                        # A worker crashed (e.g., decoder segfault) and took the pool with it:
+                        # the file may be innocent, so it goes to the fresh pool
+                        broken = True
+                        if attempts[i] >= self.MAX_ATTEMPTS:
+                            results[i] = (f"Decode worker crashed: {type(e).__name__}: {e}", None, 1.0)
+                        else:
+                            todo.append(i)
+                    except Exception as e:
+                        results[i] = (f"{type(e).__name__}: {e}", None, 1.0)
+                if broken:
+                    retrying = True
+                    self._restart(executor)
+
+            view = np.ndarray(pixels_shape, dtype=np.float32, buffer=pixels_shm.buf)
+            batch = DecodedBatch(pixels=view.copy(), errors=[r[0] for r in results])
+            del view
+
+            if frames_shm:
+                view = np.ndarray(frames_shape, dtype=np.uint8, buffer=frames_shm.buf)
+                for i, (err, hw, scale) in enumerate(results):
+                    batch.frames.append(view[i, :hw[0], :hw[1]].copy() if hw and not err else None)
+                    batch.scales.append(scale)
+                del view
+            return batch
+        finally:
+            for shm in (pixels_shm, frames_shm):
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor = self._executor
+        executor.shutdown(wait=True, cancel_futures=True)
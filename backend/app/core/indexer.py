@@ -2,20 +2,39 @@
 File scanner and indexing engine.
 Scans directories, generates embeddings, and stores them in the vector DB.
 Supports incremental indexing (skip unchanged files).
-Also extracts faces (for face search) and OCR text (for text-in-image search).
+Also extracts faces (for face search) and OCR text (for text-in-image search),
+and chunks document text into passages (for passage-level document search).
+
+Files flow through a staged pipeline (see app/core/pipeline.py):
+  scan → decode (metadata, document text; image decode + thumbnails in a process pool)
+       → embed (batched CLIP) → passages (chunk + TextEmbedder) → enrich (OCR) → faces
+       → store (write-behind buffer → vector DB)
 """
 
 import os
 import time
 import asyncio
+import threading
+from functools import partial
 from typing import Optional
 from dataclasses import dataclass, field
+
+import numpy as np
 from PIL import Image
 
 from app.core.config import get_settings
-from app.core.metadata import extract_metadata, get_file_id, get_file_hash, generate_thumbnail
+from app.core.chunking import chunk_text
+from app.core.metadata import extract_metadata, get_file_id, get_file_hash, get_content_hash, copy_thumbnail
+from app.core.pipeline import Pipeline, PipelineStage, StageStats
+from app.core.doc_extract import DocumentExtractor
+from app.core.image_decode import ImageDecoder
+from app.core.ocr_prescreen import text_probability
+from app.core.scanner import ScannedFile, iter_scan, scan_paths
 from app.ai.clip_embed import CLIPEmbedder
 from app.db.vector_store import VectorStore, FaceStore
+from app.db.passage_store import PassageStore
+from app.db.file_journal import FileJournal, get_file_journal
+from app.db.write_buffer import WriteBehindBuffer
 
 
 @dataclass
@@ -30,8 +49,21 @@ class IndexingProgress:
     started_at: Optional[float] = None
     finished_at: Optional[float] = None
     current_file: str = ""
+    is_scanning: bool = False  # total_files still growing while the scanner streams
     faces_found: int = 0
     ocr_extracted: int = 0
+    ocr_skipped: int = 0  # images the pre-screen judged text-free
+    text_truncated: int = 0  # documents indexed from partial text (extraction budget)
+    passages_indexed: int = 0  # document passages embedded for passage search
+    deduplicated: int = 0  # files that reused the results of an identical file
+    stages: dict[str, StageStats] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts: int) -> None:
+        """Thread-safe increment of counters (pipeline stages run concurrently)."""
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
 
     @property
     def elapsed_seconds(self) -> float:
@@ -73,107 +105,29 @@ class IndexingProgress:
             "eta_seconds": round(self.eta_seconds),
             "elapsed_seconds": round(self.elapsed_seconds),
             "current_file": self.current_file,
+            "is_scanning": self.is_scanning,
             "error_count": len(self.errors),
             "faces_found": self.faces_found,
             "ocr_extracted": self.ocr_extracted,
+            "ocr_skipped": self.ocr_skipped,
+            "text_truncated": self.text_truncated,
+            "passages_indexed": self.passages_indexed,
+            "deduplicated": self.deduplicated,
+            "stages": {name: s.to_dict() for name, s in self.stages.items()},
         }
 
 
 # Global progress tracker (single indexing job at a time)
 _current_progress = IndexingProgress()
 
+# Serializes pipeline runs (user-started jobs and watcher batches share the models)
+_pipeline_lock = threading.Lock()
+
 
 def get_progress() -> IndexingProgress:
     return _current_progress
 
 
-def compare_files_for_incremental(
-    current_files: list[str],
-    indexed_files: dict,
-) -> tuple[list[str], list[str], list[str]]:
-    """
-    Compare current filesystem state with indexed files.
-    Returns (new_files, modified_files, deleted_files).
-    
-    Args:
-        current_files: List of file paths found in filesystem
-        indexed_files: Dict of {filepath: metadata} from database
-    """
-    new_files = []
-    modified_files = []
-    deleted_files = []
-    
-    # Convert current files to set for faster lookup
-    current_set = set(current_files)
-    indexed_set = set(indexed_files.keys())
-    
-    # Find new files (in filesystem, not in database)
-    new_files = list(current_set - indexed_set)
-    
-    # Find potentially modified files (in both, but check if changed)
-    common_files = current_set & indexed_set
-    for filepath in common_files:
-        try:
-            # Check if file has been modified since last index
-            current_mtime = int(os.stat(filepath).st_mtime)
-            indexed_mtime = indexed_files[filepath].get("last_modified", 0)
-            
-            if current_mtime > indexed_mtime:
-                modified_files.append(filepath)
-        except (OSError, FileNotFoundError):
-            # File might have been deleted between scan and check
-            deleted_files.append(filepath)
-    
-    # Find deleted files (in database, not in filesystem)
-    deleted_files.extend(list(indexed_set - current_set))
-    
-    return new_files, modified_files, deleted_files
-
-
-def scan_directory(root_path: str) -> list[str]:
-    """
-    Recursively scan a directory and return all supported file paths.
-    Explicitly skips videos. Only includes images and documents.
-    """
-    settings = get_settings()
-    supported_exts = set(settings.image_extensions + settings.document_extensions)
-    video_exts = set(settings.video_extensions)  # Explicitly excluded
-    excluded = set(settings.excluded_folders)
-    max_size = settings.max_file_size_mb * 1024 * 1024
-
-    files = []
-    skipped_videos = 0
-    for dirpath, dirnames, filenames in os.walk(root_path):
-        dirnames[:] = [d for d in dirnames if d not in excluded and not d.startswith(".")]
-
-        for fname in filenames:
-            ext = os.path.splitext(fname)[1].lower()
-
-            # Skip videos explicitly
-            if ext in video_exts:
-                skipped_videos += 1
-                continue
-
-            if ext not in supported_exts:
-                continue
-
-            filepath = os.path.join(dirpath, fname)
-            try:
-                size = os.path.getsize(filepath)
-                if size > max_size or size == 0:
-                    continue
-            except OSError:
-                continue
-
-            files.append(filepath)
-
-    print(f"[Scanner] Found {len(files)} supported files in {root_path}")
-    if skipped_videos > 0:
-        print(f"[Scanner] Skipped {skipped_videos} video files")
-
-    return sorted(files)
-
-
 async def index_directory(
     root_path: str,
     clip_embedder: CLIPEmbedder,
@@ -181,6 +135,8 @@ async def index_directory(
     face_embedder=None,
     face_store: Optional[FaceStore] = None,
     ocr_engine=None,
+    text_embedder=None,
+    passage_store: Optional[PassageStore] = None,
 ) -> IndexingProgress:
     """
     Index all supported files in a directory tree.
@@ -194,27 +150,22 @@ async def index_directory(
     _current_progress.is_running = True
     _current_progress.started_at = time.time()
 
-    files = scan_directory(root_path)
-    _current_progress.total_files = len(files)
-
-    if not files:
-        _current_progress.is_running = False
-        _current_progress.finished_at = time.time()
-        return _current_progress
-
-    batch_size = settings.batch_size
-
-    for i in range(0, len(files), batch_size):
-        if not _current_progress.is_running:
-            break
-
-        batch = files[i : i + batch_size]
-        await asyncio.to_thread(
-            _process_batch_sync,
-            batch, clip_embedder, vector_store, settings,
-            face_embedder, face_store, ocr_engine,
-        )
-        await asyncio.sleep(0)
+    journal = get_file_journal()
+    ctx = IndexingContext(
+        clip_embedder=clip_embedder,
+        vector_store=vector_store,
+        settings=settings,
+        progress=_current_progress,
+        face_embedder=face_embedder,
+        face_store=face_store,
+        ocr_engine=ocr_engine,
+        text_embedder=text_embedder,
+        passage_store=passage_store,
+        journal=journal,
+        run_id=journal.begin_run(),
+    )
+    # Files are indexed as the scanner finds them — no waiting for the full walk
+    await asyncio.to_thread(_run_pipeline, ctx, _iter_scanned_batches(root_path, _current_progress))
 
     _current_progress.is_running = False
     _current_progress.finished_at = time.time()
@@ -236,6 +187,8 @@ async def index_directory_incremental(
     face_embedder=None,
     face_store: Optional[FaceStore] = None,
     ocr_engine=None,
+    text_embedder=None,
+    passage_store: Optional[PassageStore] = None,
 ) -> IndexingProgress:
     """
     Incremental indexing - only processes new, modified, or deleted files.
@@ -251,57 +204,41 @@ async def index_directory_incremental(
     _current_progress.is_running = True
     _current_progress.started_at = time.time()
     
-    # Step 1: Scan filesystem
-    print(f"[Incremental] Scanning filesystem: {root_path}")
-    current_files = scan_directory(root_path)
-    
-    # Step 2: Get already indexed files from database
-    print(f"[Incremental] Getting indexed files from database...")
-    indexed_files = vector_store.get_all_indexed_files()
-    
-    # Step 3: Compare and identify changes
-    print(f"[Incremental] Comparing files...")
-    new_files, modified_files, deleted_files = compare_files_for_incremental(
-        current_files, indexed_files
+    journal = get_file_journal()
+    if journal.count() == 0 and vector_store.count() > 0:
+        _seed_journal(journal, vector_store)
+
+    ctx = IndexingContext(
+        clip_embedder=clip_embedder,
+        vector_store=vector_store,
+        settings=settings,
+        progress=_current_progress,
+        face_embedder=face_embedder,
+        face_store=face_store,
+        ocr_engine=ocr_engine,
+        text_embedder=text_embedder,
+        passage_store=passage_store,
+        journal=journal,
+        run_id=journal.begin_run(),
     )
-    
-    # Calculate total work
-    files_to_process = new_files + modified_files
-    _current_progress.total_files = len(files_to_process)
-    
-    print(f"[Incremental] Changes detected:")
-    print(f"  New files: {len(new_files)}")
-    print(f"  Modified files: {len(modified_files)}")
-    print(f"  Deleted files: {len(deleted_files)}")
-    print(f"  Total to process: {len(files_to_process)}")
-    
-    # Step 4: Remove deleted files from index
-    if deleted_files:
-        print(f"[Incremental] Removing {len(deleted_files)} deleted files...")
-        removed_count = vector_store.remove_files_by_path(deleted_files)
-        print(f"[Incremental] Removed {removed_count} files from index")
-    
-    # Step 5: Process new and modified files
-    if not files_to_process:
+
+    # Steps 1–3: walk the filesystem and diff each chunk against the journal as it
+    # arrives; only new/changed files enter the pipeline (no vector-DB reads)
+    print(f"[Incremental] Scanning filesystem: {root_path}")
+    scan_state = {}
+    await asyncio.to_thread(_run_pipeline, ctx, _iter_changed_batches(root_path, ctx, scan_state))
+
+    # Step 4: Anything under root_path the walk didn't see has been deleted.
+    # Only trust that if the walk ran to completion (not cancelled).
+    if scan_state.get("completed"):
+        deleted = journal.entries_under(root_path, unseen_in_run=ctx.run_id)
+        if deleted:
+            print(f"[Incremental] Removing {len(deleted)} deleted files...")
+            _remove_deleted(ctx, deleted)
+
+    if _current_progress.total_files == 0:
         print("[Incremental] No files to process - index is up to date!")
-        _current_progress.is_running = False
-        _current_progress.finished_at = time.time()
-        return _current_progress
-    
-    batch_size = settings.batch_size
-    
-    for i in range(0, len(files_to_process), batch_size):
-        if not _current_progress.is_running:
-            break
-        
-        batch = files_to_process[i : i + batch_size]
-        await asyncio.to_thread(
-            _process_batch_sync,
-            batch, clip_embedder, vector_store, settings,
-            face_embedder, face_store, ocr_engine,
-        )
-        await asyncio.sleep(0)
-    
+
     _current_progress.is_running = False
     _current_progress.finished_at = time.time()
     
@@ -313,168 +250,659 @@ async def index_directory_incremental(
     return _current_progress
 
 
-def _process_batch_sync(
-    filepaths: list[str],
+@dataclass
+class IndexingContext:
+    """Everything the pipeline stages need for one indexing run."""
+    clip_embedder: CLIPEmbedder
+    vector_store: VectorStore
+    settings: object
+    progress: IndexingProgress
+    face_embedder: object = None
+    face_store: Optional[FaceStore] = None
+    ocr_engine: object = None
+    text_embedder: object = None
+    passage_store: Optional[PassageStore] = None
+    image_decoder: Optional[ImageDecoder] = None
+    doc_extractor: Optional[DocumentExtractor] = None
+    writer: Optional[WriteBehindBuffer] = None
+    journal: Optional[FileJournal] = None
+    run_id: int = 0
+
+
+@dataclass
+class FileWork:
+    """One file travelling through the pipeline."""
+    file_id: str
+    filepath: str
+    metadata: dict
+    scanned: Optional[ScannedFile] = None  # stat snapshot from the scanner (for the journal)
+    pixels: Optional[np.ndarray] = None  # CLIP-ready (3, H, W) tensor (images only)
+    frame: Optional[np.ndarray] = None   # reduced RGB frame for OCR and face detection
+    frame_scale: float = 1.0             # frame size / original image size
+    embedding: Optional[np.ndarray] = None
+    faces: list[dict] = field(default_factory=list)
+    doc_text: Optional[str] = None       # full extracted text, until the passages stage chunks it
+    passages: list[str] = field(default_factory=list)
+    passage_embeddings: Optional[np.ndarray] = None
+    duplicates: list["FileWork"] = field(default_factory=list)  # same content, later in the batch
+    reused_from: Optional[str] = None    # file_id whose results this file reuses
+
+    @property
+    def is_image(self) -> bool:
+        return self.metadata.get("file_type") == "image"
+
+    @property
+    def copies(self) -> int:
+        """Files that succeed or fail together with this one."""
+        return 1 + len(self.duplicates)
+
+
+# Metadata derived from file content (safe to copy between identical files)
+_CONTENT_DERIVED_KEYS = ("ocr_text", "text_truncated")
+
+
+def index_changes(
+    changed_paths: list[str],
+    deleted_paths: list[str],
     clip_embedder: CLIPEmbedder,
     vector_store: VectorStore,
-    settings,
     face_embedder=None,
     face_store: Optional[FaceStore] = None,
     ocr_engine=None,
-):
-    """Process a batch: extract metadata, CLIP embeddings, faces, OCR, store."""
-    global _current_progress
+    text_embedder=None,
+    passage_store: Optional[PassageStore] = None,
+) -> IndexingProgress:
+    """
+    Apply a small set of known filesystem changes (e.g. from the folder watcher)
+    without walking whole trees. Paths may be files or directories.
+    Blocking — call from a worker thread. Uses its own progress object so the
+    UI's progress for user-started jobs isn't disturbed.
+    """
+    settings = get_settings()
+    progress = IndexingProgress(is_running=True, started_at=time.time())
+    journal = get_file_journal()
+    ctx = IndexingContext(
+        clip_embedder=clip_embedder,
+        vector_store=vector_store,
+        settings=settings,
+        progress=progress,
+        face_embedder=face_embedder,
+        face_store=face_store,
+        ocr_engine=ocr_engine,
+        text_embedder=text_embedder,
+        passage_store=passage_store,
+        journal=journal,
+        run_id=journal.begin_run(),
+    )
+
+    deleted = [entry for path in deleted_paths for entry in journal.entries_under(path)]
+    if deleted:
+        _remove_deleted(ctx, deleted)
+
+    changed = journal.diff_chunk(scan_paths(changed_paths), ctx.run_id)
+    progress.total_files = len(changed)
+    if changed:
+        batch_size = settings.batch_size
+        _run_pipeline(ctx, (changed[i : i + batch_size] for i in range(0, len(changed), batch_size)))
+
+    progress.is_running = False
+    progress.finished_at = time.time()
+    return progress
+
+
+def _iter_scanned_batches(root_path: str, progress: IndexingProgress):
+    """Stream scanner chunks into the pipeline, growing total_files as they arrive."""
+    progress.is_scanning = True
+    try:
+        for chunk in iter_scan(root_path):
+            progress.add(total_files=len(chunk))
+            yield chunk
+    finally:
+        progress.is_scanning = False
+
+
+def _iter_changed_batches(root_path: str, ctx: IndexingContext, scan_state: dict):
+    """
+    Stream only new/modified files into the pipeline by diffing each scanner chunk
+    against the journal. Sets scan_state['completed'] once the walk finishes.
+    """
+    progress = ctx.progress
+    progress.is_scanning = True
+    pending: list[ScannedFile] = []
+    try:
+        for chunk in iter_scan(root_path):
+            changed = ctx.journal.diff_chunk(chunk, ctx.run_id)
+            progress.add(total_files=len(changed))
+            pending.extend(changed)
+            # Re-batch: an unchanged library yields tiny diffs per chunk
+            while len(pending) >= ctx.settings.batch_size:
+                yield pending[: ctx.settings.batch_size]
+                pending = pending[ctx.settings.batch_size :]
+        if pending:
+            yield pending
+        scan_state["completed"] = progress.is_running
+    finally:
+        progress.is_scanning = False
+
+
+def _seed_journal(journal: FileJournal, vector_store: VectorStore) -> None:
+    """
+    One-time migration for indexes built before the journal existed.
+    Seeded entries never match a real stat (no inode / ns mtime), so each file is
+    re-checked once against its stored hash and then journaled properly.
+    """
+    print("[Incremental] Building file journal from existing index (one-time)...")
+    indexed = vector_store.get_all_indexed_files()
+    journal.record(
+        (ScannedFile(path, meta.get("size_bytes", 0), 0, 0), get_file_id(path))
+        for path, meta in indexed.items()
+    )
 
-    images_to_embed = []
-    file_data = []  # (file_id, metadata, filepath)
 
-    for filepath in filepaths:
-        _current_progress.current_file = filepath
-        file_id = get_file_id(filepath)
+def _remove_deleted(ctx: IndexingContext, deleted: list[tuple[str, str]]) -> None:
+    """Drop deleted files (and their faces and passages) from the vector DB and the journal."""
+    paths = [p for p, _ in deleted]
+    file_ids = [fid for _, fid in deleted]
+    ctx.vector_store.delete_files(file_ids)
+    if ctx.face_store:
+        ctx.face_store.delete_faces_for_files(file_ids)
+    if ctx.passage_store:
+        ctx.passage_store.delete_passages_for_files(file_ids)
+    ctx.journal.remove(paths)
+    print(f"[Indexer] Removed {len(file_ids)} deleted files from index")
+
+
+def _run_pipeline(ctx: IndexingContext, batches) -> None:
+    """Run file batches through decode → embed → passages → enrich → faces → store. Blocks until done."""
+    stages = [
+        PipelineStage("decode", partial(_decode_stage, ctx), workers=max(1, ctx.settings.max_threads)),
+        PipelineStage("embed", partial(_embed_stage, ctx)),
+        PipelineStage("passages", partial(_passages_stage, ctx)),
+        PipelineStage("enrich", partial(_enrich_stage, ctx)),
+        PipelineStage("faces", partial(_faces_stage, ctx)),
+        PipelineStage("store", partial(_store_stage, ctx)),
+    ]
+    pipeline = Pipeline(
+        stages,
+        stats=ctx.progress.stages,
+        should_stop=lambda: not ctx.progress.is_running,
+    )
+    with _pipeline_lock:
+        ctx.image_decoder = ImageDecoder(
+            ctx.clip_embedder.preprocess_config(),
+            max_workers=ctx.settings.max_threads,
+            thumbnails_dir=ctx.settings.thumbnails_dir,
+            thumbnail_max_dim=ctx.settings.thumbnail_max_dim,
+            frame_max_dim=_frame_max_dim(ctx),
+        )
+        ctx.doc_extractor = DocumentExtractor(
+            max_workers=ctx.settings.doc_extract_workers or ctx.settings.max_threads,
+            timeout_seconds=ctx.settings.doc_extract_timeout_seconds,
+            memory_limit_mb=ctx.settings.doc_extract_memory_mb,
+            budget_seconds=ctx.settings.doc_extract_budget_seconds,
+            sample_pages=ctx.settings.doc_extract_sample_pages,
+        )
+        ctx.writer = WriteBehindBuffer(
+            ctx.vector_store,
+            face_store=ctx.face_store,
+            passage_store=ctx.passage_store,
+            journal=ctx.journal,
+            run_id=ctx.run_id,
+            max_records=ctx.settings.write_buffer_records,
+            max_delay_seconds=ctx.settings.write_buffer_seconds,
+            on_error=partial(_on_write_error, ctx.progress),
+        )
+        try:
+            pipeline.run(batches)
+        finally:
+            ctx.image_decoder.shutdown()
+            ctx.doc_extractor.shutdown()
+            # Also reached on cancel: everything already embedded still gets written
+            ctx.writer.close()
+    ctx.progress.errors.extend(pipeline.errors)
+
+
+def _frame_max_dim(ctx: IndexingContext) -> int:
+    """Size of the reduced frame decoded for in-memory OCR / face detection (0 = none)."""
+    dims = [0]
+    if ctx.face_embedder and ctx.face_store:
+        dims.append(ctx.settings.face_frame_max_dim)
+    if ctx.ocr_engine:
+        dims.append(ctx.settings.ocr_frame_max_dim)
+    return max(dims)
+
+
+def _passages_enabled(ctx: IndexingContext) -> bool:
+    return bool(ctx.settings.passage_index and ctx.text_embedder and ctx.passage_store)
+
+
+def _on_write_error(progress: IndexingProgress, n_files: int, message: str) -> None:
+    """Files counted as processed when buffered turned out not to be written."""
+    progress.add(processed=-n_files, failed=n_files)
+    progress.errors.append(message)
+
+
+def _decode_stage(ctx: IndexingContext, files: list[ScannedFile]) -> Optional[list[FileWork]]:
+    """Skip unchanged files, extract metadata, read documents, decode images (process pool)."""
+    progress = ctx.progress
+    candidates = []
+    works = []
+    unchanged = []
+
+    # --- Incremental check: one lookup for the whole batch ---
+    file_ids = [get_file_id(f.path) for f in files]
+    try:
+        indexed = ctx.vector_store.get_files_batch(file_ids)
+    except Exception as e:
+        print(f"[Indexer] Batch lookup failed, re-indexing batch: {type(e).__name__}: {e}")
+        indexed = {}
+
+    for scanned, file_id in zip(files, file_ids):
+        filepath = scanned.path
+        progress.current_file = filepath
 
         try:
-            # --- Incremental check: skip files that haven't changed ---
-            existing = vector_store.get_file(file_id)
+            # Skip files that haven't changed
+            existing = indexed.get(file_id)
             if existing:
                 current_hash = get_file_hash(filepath)
                 if existing.get("file_hash") == current_hash:
-                    _current_progress.skipped += 1
+                    progress.add(skipped=1)
+                    unchanged.append((scanned, file_id))
                     continue
                 # File changed — will re-index it
 
             metadata = extract_metadata(filepath)
-
-            if metadata["file_type"] == "image":
-                try:
-                    img = Image.open(filepath).convert("RGB")
-                    images_to_embed.append(img)
-                    file_data.append((file_id, metadata, filepath))
-                    generate_thumbnail(filepath, settings.thumbnails_dir, settings.thumbnail_max_dim)
-                except Exception:
-                    # PIL can't open this format (e.g., RAW camera files)
-                    # Still record it in the index with metadata, just skip CLIP embedding
-                    _current_progress.failed += 1
-                    continue
-            elif metadata["file_type"] == "document":
-                # Documents: use OCR/text extraction for embedding via text embedder
-                # Store with a zero embedding (placeholder) so they appear in text search
-                file_data.append((file_id, metadata, filepath))
-                images_to_embed.append(None)  # placeholder, handled below
+            if metadata["file_type"] in ("image", "document"):
+                candidates.append(FileWork(file_id, filepath, metadata, scanned))
 
         except Exception as e:
-            _current_progress.failed += 1
-            _current_progress.errors.append(f"{filepath}: {str(e)}")
+            progress.add(failed=1)
+            progress.errors.append(f"{filepath}: {str(e)}")
             print(f"[Indexer] ERROR: {filepath}")
             print(f"[Indexer] {type(e).__name__}: {e}")
             continue
 
-    # Separate image entries from document entries
-    image_indices = [i for i, img in enumerate(images_to_embed) if img is not None]
-    doc_indices   = [i for i, img in enumerate(images_to_embed) if img is None]
+    if ctx.journal:
+        ctx.journal.record(unchanged, ctx.run_id)
+
+    # Copies of already-indexed content skip straight to the store stage
+    if ctx.settings.content_dedup:
+        candidates, works = _dedup_by_content(ctx, candidates)
+
+    # Documents go to the extraction pool first, so parsing overlaps image decoding
+    image_works = [w for w in candidates if w.is_image]
+    doc_works = [w for w in candidates if not w.is_image]
+    max_chars = ctx.settings.passage_max_chars if _passages_enabled(ctx) else _DOC_TEXT_CHARS
+    extraction = ctx.doc_extractor.extract_iter([w.filepath for w in doc_works], max_chars=max_chars)
+
+    # Decode + preprocess all images of the batch in parallel worker processes
+    if image_works:
+        decoded = ctx.image_decoder.decode_batch([w.filepath for w in image_works])
+        for i, w in enumerate(image_works):
+            if decoded.errors[i]:
+                # PIL can't open this format (e.g., RAW without rawpy)
+                progress.add(failed=w.copies)
+                continue
+            w.pixels = decoded.pixels[i]
+            if decoded.frames:
+                w.frame, w.frame_scale = decoded.frames[i], decoded.scales[i]
+            works.append(w)
+
+    # Documents join the batch as their extractions complete
+    for result in extraction:
+        w = doc_works[result.index]
+        _apply_document_text(ctx, w, result.text, result.error, result.truncated)
+        works.append(w)
 
-    # Batch embed all images with CLIP
-    if image_indices:
+    return works or None
+
+
+def _dedup_by_content(ctx: IndexingContext, works: list[FileWork]) -> tuple[list[FileWork], list[FileWork]]:
+    """
+    Fingerprint each file's content. A copy of something already in the index
+    reuses its embedding, text, faces and passages; later copies within the batch ride
+    along with the first one (filled in by the store stage).
+    Returns (works that still need processing, works with reused results).
+    """
+    for w in works:
+        try:
+            w.metadata["content_hash"] = get_content_hash(
+                w.filepath,
+                w.scanned.size if w.scanned else None,
+                ctx.settings.content_hash_sample_mb,
+            )
+        except OSError:
+            pass  # Unreadable — let the normal path report it
+
+    hashes = {w.metadata["content_hash"] for w in works if "content_hash" in w.metadata}
+    # Recently finished files may still sit in the write-behind buffer
+    pending = ctx.writer.pending_by_content_hash(hashes) if ctx.writer else {}
+    known_faces = {p["file_id"]: p["faces"] for p in pending.values()}
+    known_passages = {p["file_id"]: p["passages"] for p in pending.values() if p["passages"]}
+    try:
+        stored = ctx.vector_store.get_by_content_hashes(list(hashes - pending.keys()))
+        if stored and ctx.face_store and ctx.face_embedder:
+            known_faces.update(ctx.face_store.get_faces_for_files([k["file_id"] for k in stored.values()]))
+        stored_docs = [k["file_id"] for k in stored.values() if k["metadata"].get("file_type") != "image"]
+        if stored_docs and _passages_enabled(ctx):
+            known_passages.update(ctx.passage_store.get_passages_for_files(stored_docs))
+    except Exception as e:
+        print(f"[Indexer] Content lookup failed, processing batch normally: {type(e).__name__}: {e}")
+        stored = {}
+    known = {**stored, **pending}
+
+    todo, reused = [], []
+    leaders: dict[str, FileWork] = {}
+    for w in works:
+        h = w.metadata.get("content_hash")
+        if h in known:
+            src = known[h]
+            w.embedding = src["embedding"]
+            for key in _CONTENT_DERIVED_KEYS:
+                if key in src["metadata"]:
+                    w.metadata[key] = src["metadata"][key]
+            w.faces = [dict(f) for f in known_faces.get(src["file_id"], [])]
+            if src["file_id"] in known_passages:
+                w.passages, w.passage_embeddings = known_passages[src["file_id"]]
+            w.reused_from = src["file_id"]
+            reused.append(w)
+        elif h in leaders:
+            leaders[h].duplicates.append(w)
+        else:
+            if h:
+                leaders[h] = w
+            todo.append(w)
+    return todo, reused
+
+
+# Document text kept in metadata (for keyword search and the CLIP text embedding)
+_DOC_TEXT_CHARS = 2000
+
+
+def _apply_document_text(
+    ctx: IndexingContext, w: FileWork, text: Optional[str], error: Optional[str], truncated: bool = False,
+) -> None:
+    """
+    Store extracted document text in metadata['ocr_text']. Scanned PDFs (no
+    native text) are OCR'd here, in the parent, where the EasyOCR model lives.
+    A document whose extraction failed is still indexed by its filename.
+    With passage retrieval on, the full text is also kept for the passages stage.
+    metadata['text_truncated'] records that the text covers only part of the document.
+    """
+    if error:
+        ctx.progress.errors.append(f"Text extraction failed for {w.filepath}: {error}")
+    elif text is None and ctx.ocr_engine:
+        try:
+            text = ctx.ocr_engine.ocr_document(w.filepath)
+        except Exception:
+            text = None
+
+    if text:
+        if _passages_enabled(ctx):
+            w.doc_text = text[: ctx.settings.passage_max_chars]
+            truncated = truncated or len(text) > ctx.settings.passage_max_chars
+        else:
+            truncated = truncated or len(text) > _DOC_TEXT_CHARS
+        w.metadata["ocr_text"] = text[:_DOC_TEXT_CHARS]
+        ctx.progress.add(ocr_extracted=1)
+    if truncated:
+        w.metadata["text_truncated"] = True
+        ctx.progress.add(text_truncated=1)
+
+
+def _embed_stage(ctx: IndexingContext, works: list[FileWork]) -> Optional[list[FileWork]]:
+    """Batch-embed all images with CLIP; embed documents via CLIP text."""
+    progress = ctx.progress
+    embedded = [w for w in works if w.embedding is not None]  # reused from an identical file
+    images = [w for w in works if w.is_image and w.embedding is None]
+    docs = [w for w in works if not w.is_image and w.embedding is None]
+
+    if images:
         try:
-            real_images = [images_to_embed[i] for i in image_indices]
-            embeddings = clip_embedder.embed_images(real_images)
-            ids   = [file_data[i][0] for i in image_indices]
-            metas = [file_data[i][1] for i in image_indices]
-            paths = [file_data[i][2] for i in image_indices]
+            embeddings = ctx.clip_embedder.embed_images(np.stack([w.pixels for w in images]))
 
             # Validate embedding shape matches vector store expectation
-            if embeddings.ndim != 2 or embeddings.shape[0] != len(ids):
-                raise ValueError(f"Embedding shape mismatch: got {embeddings.shape}, expected ({len(ids)}, dim)")
-
-            # Run OCR on each image and add text to metadata
-            if ocr_engine:
-                for j, fpath in enumerate(paths):
-                    try:
-                        ocr_text = ocr_engine.extract_text_from_path(fpath)
-                        if ocr_text:
-                            metas[j]["ocr_text"] = ocr_text[:1000]
-                            _current_progress.ocr_extracted += 1
-                    except Exception:
-                        pass
-
-            vector_store.add_files_batch(ids, embeddings, metas)
-            _current_progress.processed += len(ids)
-            print(f"[Indexer] Batch done: {len(ids)} images embedded ({embeddings.shape[1]}-dim)")
+            if embeddings.ndim != 2 or embeddings.shape[0] != len(images):
+                raise ValueError(f"Embedding shape mismatch: got {embeddings.shape}, expected ({len(images)}, dim)")
+
+            for w, emb in zip(images, embeddings):
+                w.embedding = emb
+                w.pixels = None  # release the CLIP tensor as soon as it's consumed
+            embedded.extend(images)
+            print(f"[Indexer] Batch done: {len(images)} images embedded ({embeddings.shape[1]}-dim)")
         except Exception as e:
-            _current_progress.failed += len(image_indices)
+            progress.add(failed=sum(w.copies for w in images))
             print(f"[Indexer] ❌ ERROR in batch image embedding: {type(e).__name__}: {e}")
             import traceback
             traceback.print_exc()
-            _current_progress.errors.append(f"Batch embed error: {str(e)}")
-
-    # Index documents (PDFs, DOCX, TXT, etc.) using smart text extraction
-    for i in doc_indices:
-        fid, meta, fpath = file_data[i]
+            progress.errors.append(f"Batch embed error: {str(e)}")
+
+    # Build a rich embed string: filename + first 400 chars of content
+    # CLIP text embedding allows semantic search over document content
+    if docs:
+        texts = []
+        for w in docs:
+            fname = w.metadata.get("filename", "")
+            doc_text = w.metadata.get("ocr_text", "")
+            texts.append(f"{fname} {doc_text[:400]}".strip() if doc_text else fname)
         try:
-            doc_text = ""
-            ext = meta.get("extension", "").lower()
-
-            # Use the OCR engine's smart extractor (handles PDF native, DOCX, PPTX, XLSX, etc.)
-            if ocr_engine:
+            # One length-sorted, padded pass for the whole batch
+            for w, emb in zip(docs, ctx.clip_embedder.embed_texts(texts)):
+                w.embedding = emb
+            embedded.extend(docs)
+        except Exception as e:
+            print(f"[Indexer] Batch text embedding failed, embedding documents one by one: {type(e).__name__}: {e}")
+            for w, text in zip(docs, texts):
                 try:
-                    doc_text = ocr_engine.extract_text_from_path(fpath)
-                except Exception:
-                    pass
+                    w.embedding = ctx.clip_embedder.embed_texts([text])[0]
+                    embedded.append(w)
+                except Exception as e:
+                    progress.add(failed=w.copies)
+                    progress.errors.append(f"Doc index error {w.filepath}: {str(e)}")
 
-            # Direct fallback for plain text if OCR engine not available
-            if not doc_text and ext in (".txt", ".md", ".csv", ".rtf"):
-                try:
-                    with open(fpath, "r", encoding="utf-8", errors="ignore") as f:
-                        doc_text = f.read()[:10000]
-                except Exception:
-                    pass
-
-            if doc_text:
-                # Store up to 2000 chars of text for better keyword search coverage
-                meta["ocr_text"] = doc_text[:2000]
-                _current_progress.ocr_extracted += 1
-
-            # Build a rich embed string: filename + first 400 chars of content
-            # CLIP text embedding allows semantic search over document content
-            fname = meta.get("filename", "")
-            embed_text = f"{fname} {doc_text[:400]}".strip() if doc_text else fname
-            doc_embedding = clip_embedder.embed_text(embed_text)
-            vector_store.add_file(fid, doc_embedding, meta)
-            _current_progress.processed += 1
+    return embedded or None
+
+
+def _passages_stage(ctx: IndexingContext, works: list[FileWork]) -> list[FileWork]:
+    """
+    Chunk each new document's full text into overlapping passages and embed them
+    with the sentence-transformer TextEmbedder. Passages from the whole batch are
+    length-sorted and embedded passage_batch_size at a time, so each pass pads to
+    similar lengths. Passages are stored with their file in the store stage.
+    """
+    docs = [w for w in works if w.doc_text]
+    if not docs:
+        return works
+
+    settings = ctx.settings
+    for w in docs:
+        w.passages = [p for _, p in chunk_text(w.doc_text, settings.passage_chars, settings.passage_overlap)]
+        w.doc_text = None
+    texts = [p for w in docs for p in w.passages]
+    if not texts:
+        return works
+
+    try:
+        embeddings = np.empty((len(texts), ctx.text_embedder.embedding_dim), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batch_size = max(1, settings.passage_batch_size)
+        for start in range(0, len(order), batch_size):
+            idx = order[start : start + batch_size]
+            embeddings[idx] = ctx.text_embedder.embed_texts([texts[i] for i in idx])
+    except Exception as e:
+        print(f"[Indexer] Passage embedding failed for batch: {type(e).__name__}: {e}")
+        ctx.progress.errors.append(f"Passage embed error: {str(e)}")
+        for w in docs:
+            w.passages = []
+        return works
+
+    offset = 0
+    for w in docs:
+        w.passage_embeddings = embeddings[offset : offset + len(w.passages)]
+        offset += len(w.passages)
+    ctx.progress.add(passages_indexed=len(texts))
+    print(f"[Indexer] Batch done: {len(texts)} passages from {len(docs)} documents embedded")
+    return works
+
+
+def _enrich_stage(ctx: IndexingContext, works: list[FileWork]) -> list[FileWork]:
+    """
+    Run OCR on embedded images: a CLIP-embedding pre-screen drops images that
+    almost surely hold no text, the rest are OCR'd in batches from the frames
+    already decoded in memory.
+    """
+    progress = ctx.progress
+    if not ctx.ocr_engine:
+        return works
+
+    images = [w for w in works if w.is_image and not w.reused_from and w.frame is not None]
+    if images and ctx.settings.ocr_prescreen:
+        try:
+            probs = text_probability(ctx.clip_embedder, np.stack([w.embedding for w in images]))
+            keep = probs >= ctx.settings.ocr_min_text_probability
+            progress.add(ocr_skipped=int((~keep).sum()))
+            images = [w for w, k in zip(images, keep) if k]
         except Exception as e:
-            _current_progress.failed += 1
-            _current_progress.errors.append(f"Doc index error {fpath}: {str(e)}")
-
-    # Extract faces and store in face DB (images only)
-    if face_embedder and face_store:
-        for i in image_indices:
-            fid, meta, fpath = file_data[i]
-            img = images_to_embed[i]
-            try:
-                faces = face_embedder.detect_and_embed(img)
-                for face_idx, face in enumerate(faces):
-                    face_id = f"{fid}_face{face_idx}"
-                    face_meta = {
-                        "source_file_id": fid,
-                        "filepath": fpath,
-                        "filename": meta.get("filename", ""),
-                        "box_x1": int(face["box"][0]),
-                        "box_y1": int(face["box"][1]),
-                        "box_x2": int(face["box"][2]),
-                        "box_y2": int(face["box"][3]),
-                        "confidence": round(face["confidence"], 3),
-                    }
-                    face_store.add_face(face_id, face["embedding"], face_meta)
-                    _current_progress.faces_found += 1
-            except Exception:
-                pass
-
-    # Close images
-    for img in images_to_embed:
-        if img is not None:
-            img.close()
+            print(f"[Indexer] OCR pre-screen failed, running OCR on the whole batch: {type(e).__name__}: {e}")
+
+    if images:
+        try:
+            texts = ctx.ocr_engine.extract_text_batch(
+                [w.frame for w in images], batch_size=ctx.settings.ocr_batch_size
+            )
+        except Exception as e:
+            print(f"[Indexer] OCR failed for batch: {type(e).__name__}: {e}")
+            texts = []
+        for w, ocr_text in zip(images, texts):
+            if ocr_text:
+                w.metadata["ocr_text"] = ocr_text[:1000]
+                progress.add(ocr_extracted=1)
+
+    return works
+
+
+def _faces_stage(ctx: IndexingContext, works: list[FileWork]) -> list[FileWork]:
+    """
+    Detect and embed faces for the whole batch at once (on its own thread, so it
+    overlaps OCR of the next batch). Uses the reduced frames decoded alongside the
+    CLIP tensors; boxes are mapped back to original pixels. Faces are stored with
+    their file in the store stage.
+    """
+    face_works = [w for w in works if w.frame is not None]
+    if not (ctx.face_embedder and ctx.face_store) or not face_works:
+        for w in face_works:
+            w.frame = None  # decoded for OCR only
+        return works
+
+    frames = []
+    for w in face_works:
+        frame = Image.fromarray(w.frame)
+        if max(frame.size) > ctx.settings.face_frame_max_dim:  # frame was sized for OCR
+            width = frame.size[0]
+            frame.thumbnail((ctx.settings.face_frame_max_dim,) * 2, Image.Resampling.BILINEAR)
+            w.frame_scale *= frame.size[0] / width
+        frames.append(frame)
+
+    try:
+        batch_faces = ctx.face_embedder.detect_and_embed_batch(
+            frames,
+            detect_batch_size=ctx.settings.face_detect_batch_size,
+            embed_batch_size=ctx.settings.face_embed_batch_size,
+        )
+    except Exception as e:
+        print(f"[Indexer] Face detection failed for batch: {type(e).__name__}: {e}")
+        batch_faces = [[] for _ in face_works]
+
+    for w, faces in zip(face_works, batch_faces):
+        for face in faces:
+            face["box"] = [c / w.frame_scale for c in face["box"]]
+        w.faces = faces
+        w.frame = None
+
+    return works
+
+
+def _store_stage(ctx: IndexingContext, works: list[FileWork]) -> None:
+    """Hand file, face and passage embeddings to the write-behind buffer (batched upserts)."""
+    progress = ctx.progress
+    works = _expand_duplicates(works)
+
+    ctx.writer.add_files(
+        [w.file_id for w in works],
+        np.stack([w.embedding for w in works]),
+        [w.metadata for w in works],
+        journal_entries=[(w.scanned, w.file_id) for w in works if w.scanned],
+    )
+    progress.add(processed=len(works))
+    reused = [w for w in works if w.reused_from]
+    if reused:
+        progress.add(deduplicated=len(reused))
+        for w in reused:
+            if w.is_image:
+                copy_thumbnail(w.reused_from, w.file_id, ctx.settings.thumbnails_dir)
+
+    if ctx.face_store:
+        face_ids, face_embs, face_metas = [], [], []
+        for w in works:
+            for face_idx, face in enumerate(w.faces):
+                face_ids.append(f"{w.file_id}_face{face_idx}")
+                face_embs.append(face["embedding"])
+                face_metas.append({
+                    "source_file_id": w.file_id,
+                    "filepath": w.filepath,
+                    "filename": w.metadata.get("filename", ""),
+                    "box_x1": int(face["box"][0]),
+                    "box_y1": int(face["box"][1]),
+                    "box_x2": int(face["box"][2]),
+                    "box_y2": int(face["box"][3]),
+                    "confidence": round(face["confidence"], 3),
+                })
+        if face_ids:
+            ctx.writer.add_faces(face_ids, np.stack(face_embs), face_metas)
+            progress.add(faces_found=len(face_ids))
+
+    # Every document is registered, so a re-indexed file with no passages drops its old ones
+    if ctx.passage_store:
+        docs = [w for w in works if not w.is_image]
+        if docs:
+            ctx.writer.add_passages(
+                [w.file_id for w in docs],
+                [(w.passages, w.passage_embeddings) for w in docs],
+            )
+
+
+def _expand_duplicates(works: list[FileWork]) -> list[FileWork]:
+    """Give in-batch copies the results computed for the first file with their content."""
+    expanded = []
+    for w in works:
+        expanded.append(w)
+        for d in w.duplicates:
+            d.embedding = w.embedding
+            for key in _CONTENT_DERIVED_KEYS:
+                if key in w.metadata:
+                    d.metadata[key] = w.metadata[key]
+            d.faces = [dict(f) for f in w.faces]
+            d.passages, d.passage_embeddings = w.passages, w.passage_embeddings
+            d.reused_from = w.file_id
+            expanded.append(d)
+        w.duplicates = []
+    return expanded
 
 
 def cancel_indexing():
     """Cancel the current indexing job."""
     global _current_progress
     _current_progress.is_running = False
+
+
+def shutdown_indexing(timeout: float = 30.0) -> None:
+    """
+    Cancel the current job and wait (up to timeout) for the pipeline to drain,
+    so buffered vectors are flushed before the process exits.
+    """
+    cancel_indexing()
+    if _pipeline_lock.acquire(timeout=timeout):
+        _pipeline_lock.release()
+    else:
+        print("[Indexer] Timed out waiting for indexing to stop")
@@ -4,6 +4,7 @@ File metadata extraction — EXIF data, file stats, and thumbnail generation.
 
 import os
 import hashlib
+import shutil
 from datetime import datetime
 from typing import Optional
 from PIL import Image
@@ -18,6 +19,43 @@ def get_file_hash(filepath: str) -> str:
     return hashlib.md5(raw.encode()).hexdigest()
 
 
+def get_content_hash(filepath: str, size: Optional[int] = None, sample_mb: int = 4) -> str:
+    """
+    Fingerprint a file's content: size + the first and last `sample_mb` MB
+    (the whole file when it is smaller). Copies of the same photo get the same
+    hash wherever they live. Uses xxhash when installed, else blake2b.
+    """
+    if size is None:
+        size = os.path.getsize(filepath)
+    try:
+        import xxhash
+        h = xxhash.xxh3_128()
+    except ImportError:
+        h = hashlib.blake2b(digest_size=16)
+
+    h.update(str(size).encode())
+    sample = sample_mb * 1024 * 1024
+    with open(filepath, "rb") as f:
+        if size <= 2 * sample:
+            h.update(f.read())
+        else:
+            h.update(f.read(sample))
+            f.seek(-sample, os.SEEK_END)
+            h.update(f.read(sample))
+    return h.hexdigest()
+
+
+def copy_thumbnail(src_file_id: str, dst_file_id: str, output_dir: str) -> None:
+    """Reuse an existing thumbnail for another file with identical content."""
+    src = os.path.join(output_dir, f"{src_file_id}.webp")
+    dst = os.path.join(output_dir, f"{dst_file_id}.webp")
+    if src != dst and os.path.exists(src) and not os.path.exists(dst):
+        try:
+            shutil.copyfile(src, dst)
+        except OSError:
+            pass
+
+
 def get_file_id(filepath: str) -> str:
     """Generate a stable unique ID for a file based on its absolute path."""
     return hashlib.md5(os.path.abspath(filepath).encode()).hexdigest()
@@ -109,9 +147,11 @@ def generate_thumbnail(
     filepath: str,
     output_dir: str,
     max_dim: int = 256,
+    image: Optional[Image.Image] = None,
 ) -> Optional[str]:
     """
     Generate a thumbnail for an image file.
+    Pass an already-decoded `image` to avoid opening the file again.
     Returns the path to the saved thumbnail, or None on failure.
     """
     try:
@@ -122,7 +162,7 @@ def generate_thumbnail(
         if os.path.exists(thumb_path):
             return thumb_path
 
-        with Image.open(filepath) as img:
+        with (image.copy() if image is not None else Image.open(filepath)) as img:
             img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
             # Convert to RGB if needed (e.g., RGBA PNGs)
             if img.mode in ("RGBA", "P"):
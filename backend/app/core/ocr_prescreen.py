@@ -0,0 +1,64 @@
+"""
+OCR pre-screen: a text-likelihood score from the CLIP image embedding that the
+embed stage already computed. Images are compared against a few "contains text"
+prompts (screenshot, document, receipt, sign...) and a few text-free ones
+(landscape, people, animals...); the softmax mass on the text prompts is the
+probability that the image is worth running OCR on. Costs one small
+matrix product per batch — no extra model pass.
+"""
+
+import threading
+
+import numpy as np
+
+TEXT_PROMPTS = (
+    "a screenshot",
+    "a photo of a document",
+    "a scanned page of text",
+    "a photo of a receipt",
+    "a presentation slide with text",
+    "a whiteboard with handwriting",
+    "a photo of a sign with text",
+    "a poster with words",
+    "a restaurant menu",
+    "a chart or table",
+)
+
+PLAIN_PROMPTS = (
+    "a photo of a landscape",
+    "a photo of people",
+    "a portrait photo of a person",
+    "a photo of an animal",
+    "a photo of food",
+    "a photo of a building",
+    "a photo of the sky",
+    "a photo of a room",
+    "a photo of an object",
+)
+
+# CLIP's learned logit scale (exp(4.6052) ≈ 100) for every released checkpoint
+_LOGIT_SCALE = 100.0
+
+_prompt_cache: dict[tuple, np.ndarray] = {}
+_prompt_lock = threading.Lock()
+
+
+def _prompt_embeddings(clip_embedder) -> np.ndarray:
+    """TEXT_PROMPTS + PLAIN_PROMPTS embedded once per embedder instance."""
+    key = (id(clip_embedder), clip_embedder.model_name)
+    with _prompt_lock:
+        if key not in _prompt_cache:
+            _prompt_cache[key] = np.asarray(
+                clip_embedder.embed_texts(list(TEXT_PROMPTS + PLAIN_PROMPTS)), dtype=np.float32
+            )
+        return _prompt_cache[key]
+
+
+def text_probability(clip_embedder, image_embeddings: np.ndarray) -> np.ndarray:
+    """Probability (0–1) that each image contains readable text, from its CLIP embedding."""
+    image_embeddings = np.atleast_2d(np.asarray(image_embeddings, dtype=np.float32))
+    logits = _LOGIT_SCALE * image_embeddings @ _prompt_embeddings(clip_embedder).T
+    logits -= logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=1, keepdims=True)
+    return probs[:, : len(TEXT_PROMPTS)].sum(axis=1)
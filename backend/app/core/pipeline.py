@@ -0,0 +1,164 @@
+"""
+Staged producer/consumer pipeline used by the indexer.
+Each stage runs on its own worker thread(s) and hands work to the next stage
+through a bounded queue, so decode of batch N+1 overlaps embedding of batch N
+and the vector DB writes of batch N-1.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional
+
+
+# Marks the end of the stream on a stage's input queue
+_SENTINEL = object()
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+    items: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.batches += 1
+            self.busy_seconds += seconds
+
+    @property
+    def items_per_second(self) -> float:
+        """Rate while the stage was actually working (not waiting on queues)."""
+        if self.busy_seconds == 0:
+            return 0
+        return self.items / self.busy_seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "busy_seconds": round(self.busy_seconds, 1),
+            "items_per_second": round(self.items_per_second, 1),
+        }
+
+
+@dataclass
+class PipelineStage:
+    """
+    One step of the pipeline.
+    `fn` takes a work item and returns the item for the next stage,
+    or None to drop it. Stages with workers > 1 must be thread-safe.
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+
+
+class Pipeline:
+    """
+    Runs a source iterable through a chain of stages connected by bounded queues.
+
+    Args:
+        stages: Ordered list of stages; the last stage's output is discarded.
+        stats: Dict to fill with one StageStats per stage name (shared with progress).
+        queue_size: Max items waiting between two stages (back-pressure).
+        should_stop: Polled between items; returning True drains the pipeline early.
+        size_of: Returns how many files a work item holds (for throughput stats).
+    """
+
+    def __init__(
+        self,
+        stages: list[PipelineStage],
+        stats: Optional[dict[str, StageStats]] = None,
+        queue_size: int = 2,
+        should_stop: Optional[Callable[[], bool]] = None,
+        size_of: Callable[[Any], int] = len,
+    ):
+        self._stages = stages
+        self._stats = stats if stats is not None else {}
+        self._queue_size = queue_size
+        self._should_stop = should_stop or (lambda: False)
+        self._size_of = size_of
+        self._errors: list[str] = []
+
+    @property
+    def errors(self) -> list[str]:
+        return self._errors
+
+    def run(self, source: Iterable[Any]) -> dict[str, StageStats]:
+        """Feed every item from `source` through all stages. Blocks until drained."""
+        queues = [queue.Queue(maxsize=self._queue_size) for _ in self._stages]
+        threads = []
+        scan_stats = self._stats.setdefault("scan", StageStats())
+
+        for idx, stage in enumerate(self._stages):
+            stats = self._stats.setdefault(stage.name, StageStats())
+            in_q = queues[idx]
+            out_q = queues[idx + 1] if idx + 1 < len(queues) else None
+            remaining = [stage.workers]  # workers still running (shared, guarded by lock)
+            lock = threading.Lock()
+
+            for w in range(stage.workers):
+                t = threading.Thread(
+                    target=self._worker,
+                    args=(stage, stats, in_q, out_q, remaining, lock),
+                    name=f"pipeline-{stage.name}-{w}",
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        # Producer: push source items into the first stage
+        started = time.perf_counter()
+        try:
+            for item in source:
+                if self._should_stop():
+                    break
+                scan_stats.record(self._size_of(item), time.perf_counter() - started)
+                queues[0].put(item)
+                started = time.perf_counter()
+        except Exception as e:
+            self._errors.append(f"scan: {e}")
+            print(f"[Pipeline] Source error: {type(e).__name__}: {e}")
+        finally:
+            queues[0].put(_SENTINEL)
+
+        for t in threads:
+            t.join()
+
+        return self._stats
+
+    def _worker(self, stage, stats, in_q, out_q, remaining, lock) -> None:
+        while True:
+            item = in_q.get()
+            if item is _SENTINEL:
+                # Let sibling workers see the sentinel too; the last one forwards it
+                in_q.put(_SENTINEL)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and out_q is not None:
+                    out_q.put(_SENTINEL)
+                return
+
+            # Once cancelled, keep draining so upstream stages never block on put()
+            if self._should_stop() and out_q is not None:
+                continue
+
+            started = time.perf_counter()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                self._errors.append(f"{stage.name}: {e}")
+                print(f"[Pipeline] ❌ ERROR in stage '{stage.name}': {type(e).__name__}: {e}")
+                import traceback
+                traceback.print_exc()
+                continue
+            stats.record(self._size_of(item), time.perf_counter() - started)
+
+            if result is not None and out_q is not None:
+                out_q.put(result)
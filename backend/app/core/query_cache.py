@@ -0,0 +1,123 @@
+"""
+LRU cache of query text → text embedding (CLIP, or the passage TextEmbedder).
+The frontend re-sends the same query whenever filters, min_score or n_results
+change; warm queries skip model inference entirely. Keys are normalized for case
+and whitespace (CLIP's tokenizer lowercases anyway) and scoped to the model id.
+Optionally persisted to data_dir so the cache survives restarts.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.core.config import get_settings
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace."""
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Bounded, thread-safe LRU of (model id, normalized query) → embedding."""
+
+    def __init__(self, max_entries: int = 1024, persist_path: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.persist_path = persist_path
+        self._entries: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if persist_path:
+            self._load()
+
+    def get_or_compute(self, query: str, model_id: str, compute: Callable[[str], np.ndarray]) -> np.ndarray:
+        """Return the cached embedding, or compute (outside the lock), store and return it."""
+        key = (model_id, normalize_query(query))
+        with self._lock:
+            emb = self._entries.get(key)
+            if emb is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return emb
+            self.misses += 1
+
+        emb = np.asarray(compute(key[1]), dtype=np.float32)
+        emb.setflags(write=False)  # shared between requests
+        with self._lock:
+            self._entries[key] = emb
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return emb
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+    # --- Persistence ---
+
+    def save(self) -> None:
+        """Write the cache to persist_path (oldest first, so LRU order survives)."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            items = list(self._entries.items())
+        if not items:
+            return
+        try:
+            tmp = self.persist_path + ".tmp.npz"
+            np.savez(
+                tmp,
+                models=np.array([k[0] for k, _ in items]),
+                queries=np.array([k[1] for k, _ in items]),
+                # Flattened, since models differ in dimension (CLIP 512/768, mpnet 768)
+                dims=np.array([len(v) for _, v in items]),
+                embeddings=np.concatenate([v.reshape(-1) for _, v in items]),
+            )
+            os.replace(tmp, self.persist_path)
+            print(f"[QueryCache] Saved {len(items)} query embeddings")
+        except Exception as e:
+            print(f"[QueryCache] Could not save: {type(e).__name__}: {e}")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with np.load(self.persist_path) as data:
+                models, queries, embeddings = data["models"], data["queries"], data["embeddings"]
+                if "dims" in data:
+                    embeddings = np.split(embeddings, np.cumsum(data["dims"])[:-1])
+                for model_id, query, emb in zip(models, queries, embeddings):
+                    emb = emb.astype(np.float32)
+                    emb.setflags(write=False)
+                    self._entries[(str(model_id), str(query))] = emb
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            print(f"[QueryCache] Loaded {len(self._entries)} query embeddings")
+        except Exception as e:
+            print(f"[QueryCache] Ignoring unreadable cache file: {type(e).__name__}: {e}")
+
+
+@lru_cache()
+def get_query_cache() -> QueryEmbeddingCache:
+    settings = get_settings()
+    return QueryEmbeddingCache(
+        max_entries=settings.query_cache_size,
+        persist_path=os.path.join(settings.data_dir, "query_cache.npz") if settings.query_cache_persist else None,
+    )
@@ -0,0 +1,89 @@
+"""
+Server-side cache of ranked search result sets, for cursor pagination.
+The first page of a search computes and ranks the whole candidate set once;
+later pages are sliced from the cached ranking (just a metadata fetch for the
+page) instead of re-running the ANN query, text search and re-scoring.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from app.core.config import get_settings
+
+
+@dataclass
+class RankedRow:
+    """One ranked hit: enough to rebuild the result from fresh metadata."""
+    file_id: str
+    relevance_score: float
+    match_type: str
+    duplicate_count: int = 0
+    passage: Optional[str] = None
+
+
+@dataclass
+class ResultSet:
+    query: str
+    rows: list[RankedRow]
+    page_size: int
+    filters_applied: dict
+    touched_at: float = 0.0  # last put/get — the TTL slides while the user keeps paging
+
+
+class SearchResultCache:
+    """Thread-safe store of ResultSets keyed by an opaque id (TTL since last use, LRU-bounded)."""
+
+    def __init__(self, ttl_seconds: float = 300, max_sets: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_sets = max(1, max_sets)
+        self._sets: OrderedDict[str, ResultSet] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, result_set: ResultSet) -> str:
+        set_id = secrets.token_urlsafe(9)
+        result_set.touched_at = time.time()
+        with self._lock:
+            self._evict_expired()
+            self._sets[set_id] = result_set
+            while len(self._sets) > self.max_sets:
+                self._sets.popitem(last=False)
+        return set_id
+
+    def get(self, set_id: str) -> Optional[ResultSet]:
+        with self._lock:
+            self._evict_expired()
+            result_set = self._sets.get(set_id)
+            if result_set is not None:
+                result_set.touched_at = time.time()
+                self._sets.move_to_end(set_id)
+            return result_set
+
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        while self._sets:
+            oldest_id, oldest = next(iter(self._sets.items()))
+            if oldest.touched_at >= cutoff:
+                break
+            del self._sets[oldest_id]
+
+
+def make_cursor(set_id: str, offset: int) -> str:
+    return f"{set_id}.{offset}"
+
+
+def parse_cursor(cursor: str) -> tuple[str, int]:
+    """Split a cursor into (set id, offset). Raises ValueError if malformed."""
+    set_id, _, offset = cursor.rpartition(".")
+    if not set_id or not offset.isdigit():
+        raise ValueError(f"Malformed cursor: {cursor!r}")
+    return set_id, int(offset)
+
+
+@lru_cache()
+def get_result_cache() -> SearchResultCache:
+    return SearchResultCache(ttl_seconds=get_settings().search_page_ttl_seconds)
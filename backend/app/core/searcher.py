@@ -1,14 +1,23 @@
 """
 Search engine — converts natural language queries to embeddings
 and performs similarity search against the vector database.
-Also searches OCR text stored in metadata for exact text matches.
+Also searches OCR text stored in metadata for exact text matches, and
+document passages (sentence-transformer embeddings, pooled per file).
 Scores are merged intelligently: keyword hits get major boosts.
 """
 
 import re
+from dataclasses import dataclass
 from typing import Optional
+
+import numpy as np
+
 from app.ai.clip_embed import CLIPEmbedder
+from app.core.config import get_settings
 from app.db.vector_store import VectorStore
+from app.db.passage_store import PassageStore
+from app.core.query_cache import get_query_cache
+from app.core.result_cache import RankedRow, ResultSet, get_result_cache, make_cursor, parse_cursor
 
 
 def _keyword_score(query: str, text: str) -> float:
@@ -59,6 +68,251 @@ def _filename_score(query: str, filename: str) -> float:
     return _keyword_score(query, filename.replace("_", " ").replace("-", " "))
 
 
+# --- Columnar re-ranking ---
+# _keyword_score / _filename_score define the scoring rules; the functions below
+# apply the same rules to a whole candidate set at once: texts are lowercased
+# once per search, each query word becomes one boolean hit column, and scores
+# are combined with NumPy instead of per-candidate Python branches.
+
+_MATCH_TYPES = ("visual", "text", "visual+text", "passage")
+_VISUAL, _TEXT, _VISUAL_TEXT, _PASSAGE = 0, 1, 2, 3
+
+
+class _TextColumn:
+    """Lowercased texts of a candidate set, with batch substring / whole-word hit tests."""
+
+    def __init__(self, texts: list[str]):
+        self.texts = [t.lower() for t in texts]
+        self.size = len(self.texts)
+        self.nonempty = np.fromiter(map(bool, self.texts), dtype=bool, count=self.size)
+
+    def contains(self, needle: str) -> np.ndarray:
+        return np.fromiter((needle in t for t in self.texts), dtype=bool, count=self.size)
+
+    def contains_word(self, word: str, candidates: np.ndarray) -> np.ndarray:
+        """Whole-word hits, tested only where `candidates` (substring hits) is set."""
+        # Literal first with the \b checks after it: the regex engine can then use its
+        # fast literal scan, which a leading \b defeats (~6x faster than r"\bword\b")
+        escaped = re.escape(word)
+        search = re.compile(escaped + r"(?<!\w" + escaped + r")\b").search
+        hits = np.zeros(self.size, dtype=bool)
+        rows = np.flatnonzero(candidates)
+        hits[rows] = [search(self.texts[i]) is not None for i in rows.tolist()]
+        return hits
+
+
+def _keyword_scores(query: str, column: _TextColumn) -> np.ndarray:
+    """_keyword_score for every text in the column at once."""
+    scores = np.zeros(column.size)
+    if not query or not column.size:
+        return scores
+    query_lower = query.lower().strip()
+    phrase = column.contains(query_lower)
+
+    words = [w for w in re.split(r"\W+", query_lower) if len(w) >= 2]
+    if words:
+        # Hit matrices: one row per query word
+        unique = list(dict.fromkeys(words))
+        found = np.array([column.contains(w) for w in unique])
+        whole = np.array([column.contains_word(w, hits) for w, hits in zip(unique, found)])
+        weights = np.array([words.count(w) for w in unique])[:, None]
+        whole_hits = (whole * weights).sum(axis=0)
+        found_hits = (found * weights).sum(axis=0)
+        total = len(words)
+
+        partial = np.maximum(0.0, (whole_hits + (found_hits - whole_hits) * 0.6) / total * 0.7)
+        scores = np.where(whole_hits == total, 0.95, np.where(found_hits == total, 0.80, partial))
+
+    scores = np.where(phrase, 1.0, scores)
+    scores[~column.nonempty] = 0.0
+    return scores
+
+
+@dataclass
+class _Ranking:
+    """Scored candidates as columns; result dicts are built only for rows that are returned."""
+    ids: list[str]
+    metadatas: list[dict]
+    scores: np.ndarray       # relevance 0–100
+    match_types: np.ndarray  # index into _MATCH_TYPES
+    content_hashes: np.ndarray
+    passages: dict[str, str]  # file_id -> best-matching passage
+
+    def order(self, collapse_duplicates: bool = False, min_score: Optional[float] = None):
+        """Row indices best-first, plus the copies each row stands for (collapse_duplicates)."""
+        order = np.argsort(-self.scores, kind="stable")
+        dup_counts = np.zeros(len(order), dtype=np.int64)
+        if collapse_duplicates and len(order):
+            hashes = self.content_hashes[order]
+            keyed = np.flatnonzero(hashes != "")
+            _, first, counts = np.unique(hashes[keyed], return_index=True, return_counts=True)
+            keep = hashes == ""
+            keep[keyed[first]] = True
+            dup_counts[keyed[first]] = counts - 1
+            order, dup_counts = order[keep], dup_counts[keep]
+        if min_score is not None:
+            passing = self.scores[order] >= min_score
+            order, dup_counts = order[passing], dup_counts[passing]
+        return order, dup_counts
+
+
+def _rank_candidates(
+    query: str,
+    clip_ids: list[str],
+    clip_metadatas: list[dict],
+    clip_distances,
+    text_ids: list[str],
+    text_metadatas: list[dict],
+    passage_hits: Optional[list[dict]] = None,
+) -> _Ranking:
+    """
+    Merge and score CLIP, keyword and passage candidates:
+      - CLIP cosine distance → similarity, with very high matches boosted
+      - a keyword hit in OCR text is the strongest signal, filename hits next
+      - keyword-only candidates score 70–95 on a good match (best_kw > 0.5), their raw score otherwise
+      - a pooled passage similarity scores like a CLIP similarity and lifts
+        any candidate it beats (passage-only documents join the set)
+    """
+    passage_hits = passage_hits or []
+    n_clip = len(clip_ids)
+    seen = set(clip_ids)
+    text_rows = {fid: n_clip + i for i, fid in enumerate(fid for fid in text_ids if fid not in seen)}
+    seen.update(text_rows)
+    n_kw = n_clip + len(text_rows)
+    passage_rows = {
+        fid: n_kw + i for i, fid in enumerate(h["file_id"] for h in passage_hits if h["file_id"] not in seen)
+    }
+    ids = list(clip_ids) + list(text_rows) + list(passage_rows)
+    extra = {fid: meta for fid, meta in zip(text_ids, text_metadatas) if fid in text_rows}
+    extra.update((h["file_id"], h["metadata"]) for h in passage_hits if h["file_id"] in passage_rows)
+    metadatas = list(clip_metadatas) + [extra[fid] for fid in text_rows] + [extra[fid] for fid in passage_rows]
+
+    kw_ocr = _keyword_scores(query, _TextColumn([m.get("ocr_text", "") or "" for m in metadatas]))
+    kw_file = _keyword_scores(query, _TextColumn([
+        (m.get("filename", "") or "").replace("_", " ").replace("-", " ") for m in metadatas
+    ]))
+
+    # --- CLIP candidates ---
+    # Cosine distance (0–2) → similarity (0–1); boost very high CLIP matches
+    clip_sim = np.maximum(0.0, 1.0 - np.asarray(clip_distances, dtype=np.float64).reshape(-1) / 2.0)
+    clip_sim = np.where(clip_sim > 0.80, 0.80 + (clip_sim - 0.80) * 1.5, clip_sim)
+    ocr, fname = kw_ocr[:n_clip], kw_file[:n_clip]
+
+    strong = ocr > 0.5  # strong text match — override CLIP with text score, add bonus
+    weak = (ocr > 0) & ~strong
+    final = np.where(strong, np.maximum(clip_sim, ocr) + 0.20, np.where(weak, clip_sim + ocr * 0.15, clip_sim))
+    match = np.where(strong, np.where(clip_sim > 0.3, _VISUAL_TEXT, _TEXT), np.where(weak, _VISUAL_TEXT, _VISUAL))
+
+    file_hit = fname > 0.5
+    final = np.where(file_hit, np.maximum(final, fname + 0.10), final)
+    match = np.where(file_hit & (match == _VISUAL), _VISUAL_TEXT, match)
+
+    scores = np.empty(len(ids))
+    match_types = np.empty(len(ids), dtype=np.int8)
+    scores[:n_clip] = np.round(np.minimum(final * 100, 100), 1)
+    match_types[:n_clip] = match
+
+    best_kw = np.maximum(kw_ocr, kw_file)
+    text_relevance = 70.0 + best_kw * 25.0  # 70–95 range
+
+    # --- Keyword candidates ---
+    if text_ids:
+
+        # Also found by CLIP: a good keyword match lifts the visual score
+        text_set = set(text_ids)
+        both = np.array([i for i, fid in enumerate(clip_ids) if fid in text_set], dtype=np.int64)
+        if len(both):
+            both = both[best_kw[both] > 0.5]
+            scores[both] = np.minimum(100, np.maximum(scores[both], text_relevance[both]))
+            match_types[both] = np.where(match_types[both] == _VISUAL, _VISUAL_TEXT, match_types[both])
+
+        # Keyword-only: the 70–95 band is for good matches; weak ones keep their raw score
+        kw_hit = best_kw[n_clip:n_kw] > 0.5
+        scores[n_clip:n_kw] = np.round(np.where(kw_hit, text_relevance[n_clip:n_kw], best_kw[n_clip:n_kw] * 100), 1)
+        match_types[n_clip:n_kw] = _TEXT
+
+    # --- Passage candidates ---
+    if passage_hits:
+        # Passage-only documents start from their keyword score, if they have a good one
+        kw_hit = best_kw[n_kw:] > 0.5
+        scores[n_kw:] = np.where(kw_hit, np.round(text_relevance[n_kw:], 1), 0.0)
+        match_types[n_kw:] = np.where(kw_hit, _TEXT, _PASSAGE)
+
+        # Same cosine → 0–1 mapping as CLIP candidates
+        rows = {fid: i for i, fid in enumerate(ids)}
+        hit_rows = np.array([rows[h["file_id"]] for h in passage_hits], dtype=np.int64)
+        sims = np.array([h["similarity"] for h in passage_hits], dtype=np.float64)
+        passage_scores = np.round(np.clip((1.0 + sims) / 2.0, 0.0, 1.0) * 100, 1)
+        lifted = passage_scores > scores[hit_rows]
+        scores[hit_rows] = np.maximum(scores[hit_rows], passage_scores)
+        lifted_rows = hit_rows[lifted]
+        match_types[lifted_rows] = np.where(match_types[lifted_rows] == _VISUAL, _PASSAGE, match_types[lifted_rows])
+
+    content_hashes = np.array([m.get("content_hash") or "" for m in metadatas], dtype=str)
+    passages = {h["file_id"]: h["passage"] for h in passage_hits}
+    return _Ranking(ids, metadatas, scores, match_types, content_hashes, passages)
+
+
+def _passage_search(
+    query: str,
+    text_embedder,
+    passage_store: PassageStore,
+    vector_store: VectorStore,
+    file_type: Optional[str],
+    extension: Optional[str],
+    folder_ids: Optional[list[int]],
+) -> list[dict]:
+    """
+    Documents whose passages match the query, pooled per file (see PassageStore.search_files).
+    Filters are applied to the pooled files' metadata, since passages carry only their file id.
+    Returns dicts with file_id, metadata, similarity and passage.
+    """
+    settings = get_settings()
+    query_embedding = get_query_cache().get_or_compute(query, text_embedder.model_name, text_embedder.embed_text)
+    hits = passage_store.search_files(
+        query_embedding,
+        n_passages=settings.passage_search_limit,
+        pooling=settings.passage_pool,
+        pool_k=settings.passage_pool_k,
+    )
+    hits = [h for h in hits if h["similarity"] >= settings.passage_min_similarity]
+    metas = vector_store.get_files_batch([h["file_id"] for h in hits])
+    folder_set = set(folder_ids) if folder_ids else None
+
+    results = []
+    for h in hits:
+        meta = metas.get(h["file_id"])
+        if meta is None:
+            continue  # removed from the index since its passages were written
+        if file_type and meta.get("file_type") != file_type:
+            continue
+        if extension and meta.get("extension") != extension:
+            continue
+        if folder_set is not None and meta.get("folder_id") not in folder_set:
+            continue
+        results.append({**h, "metadata": meta})
+    return results
+
+
+def _build_result(file_id: str, metadata: dict, relevance_score: float, match_type: str) -> dict:
+    """Shape one hit as a SearchResult dict."""
+    return {
+        "file_id":        file_id,
+        "filepath":       metadata.get("filepath", ""),
+        "filename":       metadata.get("filename", "") or "",
+        "extension":      metadata.get("extension", ""),
+        "file_type":      metadata.get("file_type", ""),
+        "size_mb":        metadata.get("size_mb", 0),
+        "created":        metadata.get("created", ""),
+        "modified":       metadata.get("modified", ""),
+        "relevance_score": relevance_score,
+        "date_taken":     metadata.get("date_taken", ""),
+        "camera_model":   metadata.get("camera_model", ""),
+        "ocr_text":       metadata.get("ocr_text", "") or "",
+        "match_type":     match_type,
+    }
+
+
 def search_files(
     query: str,
     clip_embedder: CLIPEmbedder,
@@ -69,6 +323,10 @@ def search_files(
     folder_path: Optional[str] = None,
     min_score: Optional[float] = None,
     text_only: bool = False,
+    collapse_duplicates: bool = False,
+    page_size: Optional[int] = None,
+    text_embedder=None,
+    passage_store: Optional[PassageStore] = None,
 ) -> dict:
     """
     Search indexed files using natural language.
@@ -77,28 +335,36 @@ def search_files(
       2. Exact keyword search in OCR text (images + scanned docs)
       3. Native text keyword search (PDFs, DOCX, etc.)
       4. Filename keyword matching
+      5. Document passage search (whole document text, when text_embedder and
+         passage_store are given)
 
-    All three are merged, deduplicated, and scored intelligently.
+    All are merged, deduplicated, and scored intelligently.
     Keyword matches are always ranked higher than pure visual matches.
+    With collapse_duplicates, copies of the same content (same content_hash)
+    are folded into their best-scoring result.
+    With page_size, only the first page is returned; the rest of the ranking
+    is cached server-side and served by search_next_page via next_cursor.
     """
-    results_map = {}  # file_id -> result dict (for dedup)
-    query_lower  = query.lower().strip()
+    # Folder scope → folder ids (folder table range scan), so the filter is an id set
+    folder_ids = vector_store.folder_ids_under(folder_path) if folder_path else None
+    scope_is_empty = folder_ids is not None and not folder_ids
 
     # Build ChromaDB filters (shared between CLIP and text search)
     where = None
-    if file_type or extension or folder_path:
+    if file_type or extension or folder_ids:
         conditions = []
         if file_type:
             conditions.append({"file_type": {"$eq": file_type}})
         if extension:
             conditions.append({"extension": {"$eq": extension}})
-        if folder_path:
-            conditions.append({"folder_path": {"$contains": folder_path}})
+        if folder_ids:
+            conditions.append({"folder_id": {"$in": folder_ids}})
         where = conditions[0] if len(conditions) == 1 else {"$and": conditions}
 
     # --- 1. CLIP semantic search (skipped in text_only mode) ---
-    if not text_only:
-        query_embedding = clip_embedder.embed_text(query)
+    if not text_only and not scope_is_empty:
+        # Warm queries (same text, new filters/limits) skip CLIP entirely
+        query_embedding = get_query_cache().get_or_compute(query, clip_embedder.model_name, clip_embedder.embed_text)
 
         # Fetch more candidates than needed — we re-rank below
         # For "All results" mode (n_results=9999), fetch everything
@@ -111,116 +377,123 @@ def search_files(
     else:
         raw_results = {"ids": [], "metadatas": [], "distances": []}
 
-    for i, file_id in enumerate(raw_results["ids"]):
-        metadata  = raw_results["metadatas"][i]
-        distance  = raw_results["distances"][i]
-
-        # Cosine distance (0–2) → similarity (0–1)
-        clip_sim = max(0.0, 1.0 - (distance / 2.0))
-
-        # Boost very high CLIP matches
-        if clip_sim > 0.80:
-            clip_sim = 0.80 + (clip_sim - 0.80) * 1.5
-
-        ocr_text  = metadata.get("ocr_text", "") or ""
-        filename  = metadata.get("filename", "") or ""
-
-        # Keyword scores
-        kw_ocr  = _keyword_score(query, ocr_text)
-        kw_file = _filename_score(query, filename)
-
-        # Final score: CLIP base + keyword boosts
-        # Keyword hit in OCR text is the strongest signal
-        final_sim = clip_sim
-        match_type = "visual"
-
-        if kw_ocr > 0.5:
-            # Strong text match — override CLIP with text score, add bonus
-            final_sim  = max(clip_sim, kw_ocr) + 0.20
-            match_type = "visual+text" if clip_sim > 0.3 else "text"
-        elif kw_ocr > 0:
-            final_sim  = clip_sim + kw_ocr * 0.15
-            match_type = "visual+text"
-
-        if kw_file > 0.5:
-            final_sim  = max(final_sim, kw_file + 0.10)
-            match_type = "visual+text" if "text" not in match_type else match_type
-
-        results_map[file_id] = {
-            "file_id":        file_id,
-            "filepath":       metadata.get("filepath", ""),
-            "filename":       filename,
-            "extension":      metadata.get("extension", ""),
-            "file_type":      metadata.get("file_type", ""),
-            "size_mb":        metadata.get("size_mb", 0),
-            "created":        metadata.get("created", ""),
-            "modified":       metadata.get("modified", ""),
-            "relevance_score": round(min(final_sim * 100, 100), 1),
-            "date_taken":     metadata.get("date_taken", ""),
-            "camera_model":   metadata.get("camera_model", ""),
-            "ocr_text":       ocr_text,
-            "match_type":     match_type,
-        }
-
     # --- 2. Full text search in OCR/document metadata ---
     # This catches files that scored low on CLIP but have exact keyword matches
-    try:
-        text_results = vector_store.text_search(query, n_results=n_results)
-        for i, file_id in enumerate(text_results["ids"]):
-            metadata = text_results["metadatas"][i]
-            ocr_text = metadata.get("ocr_text", "") or ""
-            filename = metadata.get("filename", "") or ""
-
-            kw_score = _keyword_score(query, ocr_text)
-            kw_file  = _filename_score(query, filename)
-            best_kw  = max(kw_score, kw_file)
-
-            # Score for text-only matches: based on how well keywords match
-            text_relevance = 70.0 + best_kw * 25.0  # 70–95 range
-
-            if file_id in results_map:
-                existing = results_map[file_id]
-                if best_kw > 0.5:
-                    existing["relevance_score"] = min(100, max(
-                        existing["relevance_score"],
-                        text_relevance
-                    ))
-                    if existing["match_type"] == "visual":
-                        existing["match_type"] = "visual+text"
-            else:
-                results_map[file_id] = {
-                    "file_id":        file_id,
-                    "filepath":       metadata.get("filepath", ""),
-                    "filename":       filename,
-                    "extension":      metadata.get("extension", ""),
-                    "file_type":      metadata.get("file_type", ""),
-                    "size_mb":        metadata.get("size_mb", 0),
-                    "created":        metadata.get("created", ""),
-                    "modified":       metadata.get("modified", ""),
-                    "relevance_score": round(text_relevance, 1),
-                    "date_taken":     metadata.get("date_taken", ""),
-                    "camera_model":   metadata.get("camera_model", ""),
-                    "ocr_text":       ocr_text,
-                    "match_type":     "text",
-                }
-    except Exception:
-        pass  # Text search failure shouldn't break visual search
-
-    # Sort by relevance descending
-    results = sorted(results_map.values(), key=lambda x: x["relevance_score"], reverse=True)
-
-    # Apply minimum score filter
-    if min_score is not None:
-        results = [r for r in results if r["relevance_score"] >= min_score]
+    text_results = {"ids": [], "metadatas": []}
+    if not scope_is_empty:
+        try:
+            text_results = vector_store.text_search(query, n_results=n_results, folder_ids=folder_ids)
+        except Exception:
+            pass  # Text search failure shouldn't break visual search
+
+    # --- 3. Passage search over full document text ---
+    passage_hits = []
+    if (
+        text_embedder is not None and passage_store is not None and file_type != "image"
+        and not scope_is_empty and get_settings().passage_index
+    ):
+        try:
+            passage_hits = _passage_search(
+                query, text_embedder, passage_store, vector_store, file_type, extension, folder_ids,
+            )
+        except Exception as e:
+            print(f"[Search] Passage search failed: {type(e).__name__}: {e}")
+
+    ranking = _rank_candidates(
+        query,
+        raw_results["ids"], raw_results["metadatas"], raw_results["distances"],
+        text_results["ids"], text_results["metadatas"],
+        passage_hits,
+    )
+    order, dup_counts = ranking.order(collapse_duplicates, min_score)
+    total_results = len(order)
+
+    def rows_to_results(rows: np.ndarray, dups: np.ndarray) -> list[dict]:
+        results = []
+        for row, dup in zip(rows.tolist(), dups.tolist()):
+            result = _build_result(
+                ranking.ids[row], ranking.metadatas[row],
+                float(ranking.scores[row]), _MATCH_TYPES[ranking.match_types[row]],
+            )
+            if collapse_duplicates:
+                result["duplicate_count"] = dup
+            result["passage"] = ranking.passages.get(ranking.ids[row])
+            results.append(result)
+        return results
+
+    filters_applied = {
+        "file_type": file_type,
+        "extension": extension,
+        "folder_path": folder_path,
+        "min_score": min_score,
+        "collapse_duplicates": collapse_duplicates,
+    }
+
+    if not page_size:
+        return {
+            "query": query,
+            "total_results": total_results,
+            "results": rows_to_results(order[:n_results], dup_counts[:n_results]),
+            "filters_applied": filters_applied,
+        }
+
+    # Paged: cache the ranking server-side, return the first page + a cursor.
+    # total_results is what paging can reach (at most n_results).
+    order, dup_counts = order[:n_results], dup_counts[:n_results]
+    next_cursor = None
+    if len(order) > page_size:
+        set_id = get_result_cache().put(ResultSet(
+            query=query,
+            rows=[
+                RankedRow(
+                    ranking.ids[row], float(ranking.scores[row]), _MATCH_TYPES[ranking.match_types[row]], dup,
+                    ranking.passages.get(ranking.ids[row]),
+                )
+                for row, dup in zip(order.tolist(), dup_counts.tolist())
+            ],
+            page_size=page_size,
+            filters_applied=filters_applied,
+        ))
+        next_cursor = make_cursor(set_id, page_size)
 
     return {
         "query": query,
-        "total_results": len(results),
-        "results": results[:n_results],
-        "filters_applied": {
-            "file_type": file_type,
-            "extension": extension,
-            "folder_path": folder_path,
-            "min_score": min_score,
-        },
+        "total_results": len(order),
+        "results": rows_to_results(order[:page_size], dup_counts[:page_size]),
+        "filters_applied": filters_applied,
+        "next_cursor": next_cursor,
+    }
+
+
+def search_next_page(cursor: str, vector_store: VectorStore) -> Optional[dict]:
+    """
+    Serve the page a cursor points at from the cached ranking — no ANN query,
+    text search or re-scoring, just one metadata fetch for the page.
+    Returns None if the result set has expired (the client should search again).
+    Raises ValueError for a malformed cursor.
+    """
+    set_id, offset = parse_cursor(cursor)
+    result_set = get_result_cache().get(set_id)
+    if result_set is None:
+        return None
+
+    rows = result_set.rows[offset : offset + result_set.page_size]
+    metas = vector_store.get_files_batch([row.file_id for row in rows])
+    results = []
+    for row in rows:
+        metadata = metas.get(row.file_id)
+        if metadata is None:
+            continue  # removed from the index since the search ran
+        result = _build_result(row.file_id, metadata, row.relevance_score, row.match_type)
+        result["duplicate_count"] = row.duplicate_count
+        result["passage"] = row.passage
+        results.append(result)
+
+    end = offset + len(rows)
+    return {
+        "query": result_set.query,
+        "total_results": len(result_set.rows),
+        "results": results,
+        "filters_applied": result_set.filters_applied,
+        "next_cursor": make_cursor(set_id, end) if end < len(result_set.rows) else None,
     }
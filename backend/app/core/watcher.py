@@ -0,0 +1,186 @@
+"""
+Real-time folder watcher for continuous indexing.
+Listens for filesystem events (watchdog) on the user's indexed folders, debounces
+and coalesces create/modify/move/delete events, and hands small batches straight
+to the indexing pipeline — no full rescans. Freshness latency is a few seconds.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+from app.core.config import get_settings
+
+
+class _EventCollector:
+    """watchdog handler that folds events into a path -> action map."""
+
+    # Events that mean "(re)index this path"; watchdog also emits opened/closed_no_write
+    _CHANGE_EVENTS = {"created", "modified", "closed"}
+
+    def __init__(self, watcher: "FolderWatcher"):
+        self._watcher = watcher
+
+    def dispatch(self, event) -> None:
+        src = os.fsdecode(event.src_path)
+        if event.event_type in self._CHANGE_EVENTS:
+            # Directory "modified" just means its listing changed; the entries report themselves
+            if not (event.is_directory and event.event_type != "created"):
+                self._watcher._note(src, "changed")
+        elif event.event_type == "deleted":
+            self._watcher._note(src, "deleted")
+        elif event.event_type == "moved":
+            self._watcher._note(src, "deleted")
+            self._watcher._note(os.fsdecode(event.dest_path), "changed")
+
+
+class FolderWatcher:
+    """
+    Watches folders and keeps the index fresh.
+
+    Args:
+        index_changes: Callable(changed_paths, deleted_paths) that applies a batch
+                       (normally app.core.indexer.index_changes bound to the app's models).
+        debounce_seconds: Quiet period after the last event before a batch is flushed.
+        max_wait_seconds: Flush anyway once the oldest pending event is this old
+                          (a camera import never goes quiet).
+        max_batch: Flush immediately once this many paths are pending.
+    """
+
+    def __init__(
+        self,
+        index_changes,
+        debounce_seconds: float = 2.0,
+        max_wait_seconds: float = 15.0,
+        max_batch: int = 256,
+    ):
+        settings = get_settings()
+        self._index_changes = index_changes
+        self._debounce = debounce_seconds
+        self._max_wait = max_wait_seconds
+        self._max_batch = max_batch
+        self._supported_exts = set(settings.image_extensions + settings.document_extensions)
+        self._excluded = set(settings.excluded_folders)
+
+        self._observer = None
+        self._folders: list[str] = []
+        self._lock = threading.Lock()
+        self._pending: dict[str, str] = {}  # path -> "changed" | "deleted" (last event wins)
+        self._first_event_at: Optional[float] = None
+        self._last_event_at: float = 0.0
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._stats = {"events": 0, "batches": 0, "files_indexed": 0, "paths_removed": 0, "last_flush": None}
+
+    # ------------------------------------------------------------------ #
+    #  Lifecycle                                                           #
+    # ------------------------------------------------------------------ #
+
+    def start(self, folders: list[str]) -> None:
+        """Start watching the given folders (replaces any previous set)."""
+        self._stop.clear()
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name="folder-watcher", daemon=True)
+            self._flusher.start()
+        self.update_folders(folders)
+
+    def update_folders(self, folders: list[str]) -> None:
+        """Re-point the watcher at a new folder list (e.g. after /api/settings/save-folders)."""
+        from watchdog.observers import Observer
+
+        folders = [os.path.abspath(f) for f in folders if f and os.path.isdir(f)]
+        old = self._observer
+        observer = Observer()
+        handler = _EventCollector(self)
+        for folder in folders:
+            try:
+                observer.schedule(handler, folder, recursive=True)
+            except OSError as e:
+                print(f"[Watcher] Cannot watch {folder}: {e}")
+        observer.start()
+        self._observer = observer
+        self._folders = folders
+
+        if old is not None:
+            old.stop()
+            old.join(timeout=5)
+        print(f"[Watcher] Watching {len(folders)} folder(s) for changes")
+
+    def stop(self) -> None:
+        """Stop watching and flush whatever is still pending."""
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        if self._flusher is not None:
+            self._flusher.join(timeout=30)
+            self._flusher = None
+
+    def get_status(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {"folders": self._folders, "pending": pending, **self._stats}
+
+    # ------------------------------------------------------------------ #
+    #  Event handling                                                      #
+    # ------------------------------------------------------------------ #
+
+    def _is_relevant(self, path: str) -> bool:
+        parts = path.replace("\\", "/").split("/")
+        if any(p in self._excluded or (p.startswith(".") and p not in (".", "..")) for p in parts[:-1]):
+            return False
+        ext = os.path.splitext(parts[-1])[1].lower()
+        # Extension-less paths may be directories (deleted ones can't be checked anymore)
+        return ext in self._supported_exts or ext == "" or os.path.isdir(path)
+
+    def _note(self, path: str, action: str) -> None:
+        if not self._is_relevant(path):
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._pending[path] = action
+            self._last_event_at = now
+            if self._first_event_at is None:
+                self._first_event_at = now
+            self._stats["events"] += 1
+
+    def _take_batch(self, force: bool = False) -> Optional[dict[str, str]]:
+        """Pop the pending map if it is due for flushing."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                return None
+            due = (
+                force
+                or now - self._last_event_at >= self._debounce
+                or now - self._first_event_at >= self._max_wait
+                or len(self._pending) >= self._max_batch
+            )
+            if not due:
+                return None
+            batch, self._pending = self._pending, {}
+            self._first_event_at = None
+            return batch
+
+    def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            self._stop.wait(0.5)
+            batch = self._take_batch(force=self._stop.is_set())
+            if batch:
+                self._apply(batch)
+
+    def _apply(self, batch: dict[str, str]) -> None:
+        changed = [p for p, action in batch.items() if action == "changed"]
+        deleted = [p for p, action in batch.items() if action == "deleted"]
+        try:
+            progress = self._index_changes(changed, deleted)
+            self._stats["files_indexed"] += progress.processed
+            self._stats["paths_removed"] += len(deleted)
+            self._stats["batches"] += 1
+            self._stats["last_flush"] = time.time()
+            print(f"[Watcher] Applied {len(changed)} change(s), {len(deleted)} deletion(s) "
+                  f"→ indexed {progress.processed}, skipped {progress.skipped}")
+        except Exception as e:
+            print(f"[Watcher] ❌ ERROR applying changes: {type(e).__name__}: {e}")
@@ -0,0 +1,280 @@
+"""
+People index: online clustering of face embeddings (SQLite + in-memory centroids).
+Every stored face is assigned to a person (cluster) as it is written: it joins
+the person whose centroid is most similar if that similarity reaches the
+threshold, otherwise it starts a new person. Persons whose centroids drift
+within the threshold of each other are merged (online agglomerative), keeping
+the older id, so person ids are stable across runs.
+
+Face search is then a centroid lookup (one matrix-vector product over persons,
+not faces) plus a read of the matching persons' posting lists. FaceStore keeps
+the index in sync on every write/delete.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+class FaceClusterIndex:
+    """persons(id, face_count, vector sum) plus face → person postings."""
+
+    def __init__(self, db_path: str, threshold: float = 0.6):
+        self.db_path = db_path
+        self.threshold = threshold  # cosine similarity to join / merge a person
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS persons (
+                id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                face_count INTEGER NOT NULL,
+                vector_sum BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS face_postings (
+                face_id        TEXT PRIMARY KEY,
+                person_id      INTEGER NOT NULL,
+                source_file_id TEXT NOT NULL,
+                filepath       TEXT NOT NULL,
+                score          REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_person ON face_postings (person_id, score)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_source ON face_postings (source_file_id)")
+        self._conn.commit()
+        self._load_centroids()
+
+    def _load_centroids(self) -> None:
+        rows = self._conn.execute("SELECT id, face_count, vector_sum FROM persons ORDER BY id").fetchall()
+        self._person_ids = np.asarray([r[0] for r in rows], dtype=np.int64)
+        self._counts = np.asarray([r[1] for r in rows], dtype=np.int64)
+        self._sums = (
+            np.stack([np.frombuffer(r[2], dtype=np.float32) for r in rows]).copy()
+            if rows else np.zeros((0, 0), dtype=np.float32)
+        )
+        self._centroids = _normalize(self._sums)
+
+    def face_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM face_postings").fetchone()[0]
+
+    def person_count(self) -> int:
+        return len(self._person_ids)
+
+    def known_faces(self, face_ids: list[str]) -> set[str]:
+        """The subset of face_ids that already have a posting."""
+        if not face_ids:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT face_id FROM face_postings WHERE face_id IN ({','.join('?' * len(face_ids))})",
+                face_ids,
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    # --- Writes ---
+
+    def assign(self, face_ids: list[str], embeddings: np.ndarray, metadatas: list[dict]) -> list[int]:
+        """Assign new faces to persons (creating persons as needed). Returns each face's person id."""
+        if not face_ids:
+            return []
+        embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+        person_ids = []
+        touched = set()
+        with self._lock:
+            cur = self._conn.cursor()
+            for face_id, emb, meta in zip(face_ids, embeddings, metadatas):
+                row, score = self._nearest_person(emb)
+                if row is None or score < self.threshold:
+                    row = self._new_person(cur, emb)
+                    score = 1.0
+                else:
+                    self._sums[row] += emb
+                    self._counts[row] += 1
+                    self._centroids[row] = _normalize(self._sums[row])
+                touched.add(row)
+                person_id = int(self._person_ids[row])
+                cur.execute(
+                    "INSERT OR REPLACE INTO face_postings (face_id, person_id, source_file_id, filepath, score) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (face_id, person_id, meta.get("source_file_id", ""), meta.get("filepath", ""), float(score)),
+                )
+                person_ids.append(person_id)
+            merged = self._merge_close(cur, touched)
+            self._persist_rows(cur, touched)
+            self._conn.commit()
+        return [merged.get(pid, pid) for pid in person_ids]
+
+    def remove(self, face_ids: list[str], embeddings: np.ndarray) -> None:
+        """Drop faces (their embeddings are subtracted from their persons' centroids)."""
+        if not face_ids:
+            return
+        embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            cur = self._conn.cursor()
+            touched = set()
+            row_of = {int(pid): row for row, pid in enumerate(self._person_ids)}
+            for face_id, emb in zip(face_ids, embeddings):
+                posting = cur.execute("SELECT person_id FROM face_postings WHERE face_id = ?", (face_id,)).fetchone()
+                if posting is None or posting[0] not in row_of:
+                    continue
+                row = row_of[posting[0]]
+                self._sums[row] -= emb
+                self._counts[row] -= 1
+                touched.add(row)
+                cur.execute("DELETE FROM face_postings WHERE face_id = ?", (face_id,))
+            for row in touched:
+                if self._counts[row] > 0:
+                    self._centroids[row] = _normalize(self._sums[row])
+            self._persist_rows(cur, touched)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM face_postings")
+            self._conn.execute("DELETE FROM persons")
+            self._conn.commit()
+            self._load_centroids()
+
+    def _nearest_person(self, emb: np.ndarray) -> tuple[Optional[int], float]:
+        if len(self._person_ids) == 0:
+            return None, 0.0
+        sims = self._centroids @ emb
+        row = int(np.argmax(sims))
+        return row, float(sims[row])
+
+    def _new_person(self, cur: sqlite3.Cursor, emb: np.ndarray) -> int:
+        cur.execute("INSERT INTO persons (face_count, vector_sum) VALUES (1, ?)", (emb.tobytes(),))
+        self._person_ids = np.append(self._person_ids, cur.lastrowid)
+        self._counts = np.append(self._counts, 1)
+        sums = emb[None] if len(self._sums) == 0 else np.vstack([self._sums, emb[None]])
+        self._sums = sums.astype(np.float32)
+        self._centroids = _normalize(self._sums)
+        return len(self._person_ids) - 1
+
+    def _merge_close(self, cur: sqlite3.Cursor, touched: set[int]) -> dict[int, int]:
+        """Merge touched persons into any person within the threshold (into the older id)."""
+        merged: dict[int, int] = {}
+        dead: set[int] = set()
+        for row in sorted(touched):
+            if row in dead:
+                continue
+            sims = self._centroids @ self._centroids[row]
+            sims[row] = -1.0
+            if dead:
+                sims[list(dead)] = -1.0
+            for other in np.flatnonzero(sims >= self.threshold).tolist():
+                keep, drop = (row, other) if self._person_ids[row] < self._person_ids[other] else (other, row)
+                self._sums[keep] += self._sums[drop]
+                self._counts[keep] += self._counts[drop]
+                self._counts[drop] = 0
+                self._centroids[keep] = _normalize(self._sums[keep])
+                keep_id, drop_id = int(self._person_ids[keep]), int(self._person_ids[drop])
+                cur.execute("UPDATE face_postings SET person_id = ? WHERE person_id = ?", (keep_id, drop_id))
+                merged = {k: (keep_id if v == drop_id else v) for k, v in merged.items()}
+                merged[drop_id] = keep_id
+                dead.add(drop)
+                touched.add(keep)
+                if drop == row:
+                    break
+        touched.update(dead)
+        return merged
+
+    def _persist_rows(self, cur: sqlite3.Cursor, rows: set[int]) -> None:
+        """Write back changed persons; persons left without faces are deleted."""
+        if not rows:
+            return
+        for row in rows:
+            person_id = int(self._person_ids[row])
+            if self._counts[row] <= 0:
+                cur.execute("DELETE FROM persons WHERE id = ?", (person_id,))
+            else:
+                cur.execute(
+                    "UPDATE persons SET face_count = ?, vector_sum = ? WHERE id = ?",
+                    (int(self._counts[row]), self._sums[row].tobytes(), person_id),
+                )
+        keep = self._counts > 0
+        if not keep.all():
+            self._person_ids, self._counts, self._sums = self._person_ids[keep], self._counts[keep], self._sums[keep]
+            self._centroids = self._centroids[keep]
+
+    # --- Reads ---
+
+    def match_persons(
+        self, query_embedding: np.ndarray, threshold: Optional[float] = None
+    ) -> list[tuple[int, float]]:
+        """Persons whose centroid is within threshold (default: the clustering threshold) of the query, best first."""
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            if len(self._person_ids) == 0:
+                return []
+            sims = self._centroids @ _normalize(np.asarray(query_embedding, dtype=np.float32))
+            rows = np.flatnonzero(sims >= threshold)
+            rows = rows[np.argsort(-sims[rows])]
+            return [(int(self._person_ids[r]), float(sims[r])) for r in rows]
+
+    def postings(
+        self,
+        person_ids: list[int],
+        folder_path: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> list[tuple[str, str, int]]:
+        """
+        (face_id, source_file_id, person_id) — one face per file: the face of the
+        earliest-listed person (person_ids is best match first), the most typical
+        of theirs. Ordered by that person's rank, then typicality (score against
+        the person's own centroid, not the query).
+        """
+        if not person_ids:
+            return []
+        rank = "CASE person_id " + "WHEN ? THEN ? " * len(person_ids) + "END"
+        params: list = [v for i, pid in enumerate(person_ids) for v in (pid, i)]
+        where = f"person_id IN ({','.join('?' * len(person_ids))})"
+        params.extend(person_ids)
+        if folder_path:
+            where += " AND instr(lower(filepath), lower(?)) > 0"
+            params.append(folder_path)
+        sql = f"""
+            SELECT face_id, source_file_id, person_id FROM (
+                SELECT face_id, source_file_id, person_id, score, rank, ROW_NUMBER() OVER (
+                    PARTITION BY source_file_id ORDER BY rank, score DESC
+                ) AS nth
+                FROM (SELECT *, {rank} AS rank FROM face_postings WHERE {where})
+            )
+            WHERE nth = 1 ORDER BY rank, score DESC
+        """
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def list_persons(self) -> list[dict]:
+        """Persons with their face and photo counts, largest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT p.id, p.face_count, COUNT(DISTINCT f.source_file_id)
+                FROM persons p JOIN face_postings f ON f.person_id = p.id
+                GROUP BY p.id ORDER BY p.face_count DESC, p.id
+                """
+            ).fetchall()
+        return [{"person_id": pid, "face_count": faces, "file_count": files} for pid, faces, files in rows]
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    if x.size == 0:
+        return x.astype(np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return (x / np.maximum(norms, 1e-12)).astype(np.float32)
@@ -0,0 +1,128 @@
+"""
+Persistent file-state journal for incremental indexing.
+A compact SQLite table of (path, size, mtime_ns, inode, file_id) for every file
+that made it into the index. Incremental runs diff each scanner chunk against it,
+so an unchanged library costs one directory walk and no vector-DB reads.
+"""
+
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from app.core.config import get_settings
+
+
+class FileJournal:
+    """SQLite-backed record of the on-disk state of every indexed file."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Pipeline stages write from several threads; serialize on one connection
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path     TEXT PRIMARY KEY,
+                size     INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode    INTEGER NOT NULL,
+                file_id  TEXT NOT NULL,
+                seen_run INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+        self._conn.commit()
+
+    def begin_run(self) -> int:
+        """Start a scan pass. Files seen during it are stamped with the returned run id."""
+        with self._lock:
+            cur = self._conn.execute("INSERT INTO runs DEFAULT VALUES")
+            self._conn.commit()
+            return cur.lastrowid
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def diff_chunk(self, chunk: list, run_id: int) -> list:
+        """
+        Compare a chunk of ScannedFile entries with the journal.
+        Stamps every known path as seen in this run and returns the new or changed entries.
+        """
+        if not chunk:
+            return []
+        paths = [f.path for f in chunk]
+        known = {}
+        with self._lock:
+            # SQLite caps bound parameters per statement; 500 is safe everywhere
+            for i in range(0, len(paths), 500):
+                part = paths[i : i + 500]
+                marks = ",".join("?" * len(part))
+                for row in self._conn.execute(
+                    f"SELECT path, size, mtime_ns, inode FROM files WHERE path IN ({marks})", part
+                ):
+                    known[row[0]] = row[1:]
+                self._conn.execute(f"UPDATE files SET seen_run = ? WHERE path IN ({marks})", [run_id, *part])
+            self._conn.commit()
+
+        return [f for f in chunk if known.get(f.path) != (f.size, f.mtime_ns, f.inode)]
+
+    def record(self, entries: Iterable[tuple], run_id: int = 0) -> None:
+        """Upsert (ScannedFile, file_id) pairs after the files were successfully indexed."""
+        rows = [(f.path, f.size, f.mtime_ns, f.inode, file_id, run_id) for f, file_id in entries]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO files (path, size, mtime_ns, inode, file_id, seen_run)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size = excluded.size, mtime_ns = excluded.mtime_ns, inode = excluded.inode,
+                    file_id = excluded.file_id, seen_run = MAX(seen_run, excluded.seen_run)
+                """,
+                rows,
+            )
+            self._conn.commit()
+
+    def entries_under(self, root_path: str, unseen_in_run: Optional[int] = None) -> list[tuple[str, str]]:
+        """
+        (path, file_id) of journal entries at or below root_path.
+        With unseen_in_run, only entries not seen in that run — i.e. deleted since.
+        """
+        root = os.path.abspath(root_path)
+        prefix = root.rstrip("\\/") + os.sep
+        sql = "SELECT path, file_id FROM files WHERE (path = ? OR (path >= ? AND path < ?))"
+        # Range scan on the primary key instead of LIKE (paths may contain % or _)
+        params = [root, prefix, prefix + "\U0010ffff"]
+        if unseen_in_run is not None:
+            sql += " AND seen_run != ?"
+            params.append(unseen_in_run)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def remove(self, paths: list[str]) -> None:
+        if not paths:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Forget every file (must accompany clearing the vector index)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.commit()
+
+
+@lru_cache()
+def get_file_journal() -> FileJournal:
+    settings = get_settings()
+    return FileJournal(os.path.join(settings.data_dir, "file_journal.sqlite3"))
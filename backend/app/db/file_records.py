@@ -0,0 +1,200 @@
+"""
+File record table (SQLite) for the IVF-PQ backend.
+At millions of files, ChromaDB's float32 copy of every embedding and its HNSW
+graph are exactly what must leave RAM, so the ivfpq backend keeps file
+metadata here instead: one row per file with its row number in the on-disk
+vector matrix and its metadata as JSON. Lookups by file id, matrix row,
+content hash and file path are index seeks; other metadata filters are
+translated to json_extract() conditions.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+# Metadata keys with their own indexed column (content dedup, path lookups)
+_COLUMNS = ("content_hash", "filepath")
+_KEY_RE = re.compile(r"^\w+$")
+_OPS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+# Stay under SQLite's bound-parameter limit on older builds (999)
+_CHUNK = 900
+
+
+class FileRecordTable:
+    """files(file_id, row, content_hash, filepath, metadata) — row is the vector matrix row."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                file_id      TEXT PRIMARY KEY,
+                row          INTEGER NOT NULL,
+                content_hash TEXT,
+                filepath     TEXT,
+                metadata     TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_row ON files (row)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_filepath ON files (filepath)")
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def upsert(self, file_ids: list[str], rows: Iterable[int], metadatas: list[dict]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (file_id, row, content_hash, filepath, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (fid, int(row), (meta or {}).get("content_hash"), (meta or {}).get("filepath"), json.dumps(meta or {}))
+                    for fid, row, meta in zip(file_ids, rows, metadatas)
+                ],
+            )
+            self._conn.commit()
+
+    def update_metadata(self, file_ids: list[str], patches: list[dict]) -> None:
+        """Merge patch keys into each file's metadata."""
+        with self._lock:
+            current = self._select("SELECT file_id, metadata FROM files WHERE file_id IN ({})", file_ids)
+            metas = {fid: json.loads(meta) for fid, meta in current}
+            updates = []
+            for fid, patch in zip(file_ids, patches):
+                if fid in metas:
+                    metas[fid].update(patch)
+                    updates.append((json.dumps(metas[fid]), fid))
+            self._conn.executemany("UPDATE files SET metadata = ? WHERE file_id = ?", updates)
+            self._conn.commit()
+
+    def rows_of(self, file_ids: list[str]) -> dict[str, int]:
+        with self._lock:
+            return dict(self._select("SELECT file_id, row FROM files WHERE file_id IN ({})", file_ids))
+
+    def get(self, file_ids: list[str]) -> dict[str, dict]:
+        """file_id -> metadata for the ids that are stored."""
+        with self._lock:
+            rows = self._select("SELECT file_id, metadata FROM files WHERE file_id IN ({})", file_ids)
+        return {fid: json.loads(meta) for fid, meta in rows}
+
+    def ids_at(self, rows: list[int]) -> dict[int, str]:
+        """Matrix row -> file_id."""
+        with self._lock:
+            return {row: fid for row, fid in self._select("SELECT row, file_id FROM files WHERE row IN ({})", rows)}
+
+    def by_content_hashes(self, content_hashes: list[str]) -> list[tuple[str, int, dict]]:
+        with self._lock:
+            rows = self._select(
+                "SELECT file_id, row, metadata FROM files WHERE content_hash IN ({})", content_hashes
+            )
+        return [(fid, row, json.loads(meta)) for fid, row, meta in rows]
+
+    def by_filepath(self, filepath: str) -> Optional[tuple[str, dict]]:
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT file_id, metadata FROM files WHERE filepath = ? LIMIT 1", (filepath,)
+            ).fetchone()
+        return (found[0], json.loads(found[1])) if found else None
+
+    def remove(self, file_ids: list[str]) -> list[int]:
+        """Delete records; returns the matrix rows they occupied."""
+        with self._lock:
+            rows = [row for _, row in self._select("SELECT file_id, row FROM files WHERE file_id IN ({})", file_ids)]
+            for start in range(0, len(file_ids), _CHUNK):
+                chunk = list(file_ids[start : start + _CHUNK])
+                self._conn.execute(f"DELETE FROM files WHERE file_id IN ({','.join('?' * len(chunk))})", chunk)
+            self._conn.commit()
+        return rows
+
+    def renumber(self, keep: np.ndarray) -> None:
+        """After compaction: the record at row keep[i] moves to row i (keep ascending)."""
+        with self._lock:
+            # Rows only move down and in order, so no update lands on a row not yet moved
+            self._conn.executemany(
+                "UPDATE files SET row = ? WHERE row = ?",
+                [(new, old) for new, old in enumerate(keep.tolist()) if new != old],
+            )
+            self._conn.commit()
+
+    def iter_pages(self, page_size: int = 5000) -> Iterator[list[tuple[str, int, dict]]]:
+        """All records as (file_id, row, metadata) pages, in row order."""
+        last = -1
+        while True:
+            with self._lock:
+                page = self._conn.execute(
+                    "SELECT file_id, row, metadata FROM files WHERE row > ? ORDER BY row LIMIT ?",
+                    (last, page_size),
+                ).fetchall()
+            if not page:
+                return
+            last = page[-1][1]
+            yield [(fid, row, json.loads(meta)) for fid, row, meta in page]
+
+    def rows_where(self, where: dict) -> np.ndarray:
+        """Matrix rows of the records matching a ChromaDB-style where clause."""
+        sql, params = _where_sql(where)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT row FROM files WHERE {sql}", params).fetchall()
+        return np.fromiter((row for row, in rows), dtype=np.int64, count=len(rows))
+
+    def ids_where(self, where: dict) -> list[str]:
+        sql, params = _where_sql(where)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT file_id FROM files WHERE {sql}", params).fetchall()
+        return [fid for fid, in rows]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.commit()
+
+    def _select(self, sql: str, values) -> list[tuple]:
+        """Run an `IN ({})` query over values in chunks (caller holds the lock)."""
+        values = list(values)
+        out = []
+        for start in range(0, len(values), _CHUNK):
+            chunk = values[start : start + _CHUNK]
+            out.extend(self._conn.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall())
+        return out
+
+
+def _where_sql(where: dict) -> tuple[str, list]:
+    """Translate a ChromaDB where clause ($and/$or, $eq/$ne/$gt…/$in/$nin) to SQL."""
+    parts, params = [], []
+    for key, cond in where.items():
+        if key in ("$and", "$or"):
+            subs = [_where_sql(c) for c in cond]
+            if subs:
+                joiner = " AND " if key == "$and" else " OR "
+                parts.append("(" + joiner.join(sql for sql, _ in subs) + ")")
+                params.extend(p for _, sub_params in subs for p in sub_params)
+            continue
+        if not _KEY_RE.match(key):
+            raise ValueError(f"Unsupported metadata key: {key!r}")
+        column = key if key in _COLUMNS else f"json_extract(metadata, '$.{key}')"
+        op, value = next(iter(cond.items())) if isinstance(cond, dict) else ("$eq", cond)
+        if op in _OPS:
+            parts.append(f"{column} {_OPS[op]} ?")
+            params.append(value)
+        elif op in ("$in", "$nin"):
+            values = list(value)
+            if not values:
+                parts.append("0" if op == "$in" else "1")
+                continue
+            parts.append(f"{column} {'IN' if op == '$in' else 'NOT IN'} ({','.join('?' * len(values))})")
+            params.extend(values)
+        else:
+            raise ValueError(f"Unsupported where operator: {op}")
+    return (" AND ".join(parts) or "1"), params
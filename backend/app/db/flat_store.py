@@ -0,0 +1,381 @@
+"""
+Flat vector backend: exact brute-force search over a memory-mapped matrix.
+For libraries up to a few hundred thousand files, one BLAS matmul over a
+contiguous float32/float16 array is faster than HNSW and exact, and needs no
+ChromaDB query round trip — only the top-k metadata is fetched.
+
+ChromaDB stays the durable store (metadata, embeddings, text/folder indexes);
+the matrix under persist_dir/flat/ is derived from it and rebuilt whenever the
+two disagree, so switching settings.vector_backend back and forth is safe.
+The row table is saved at most every save_interval seconds and on close();
+a marker file flags unsaved changes, so a crash triggers a rebuild.
+Filters on file_type / extension / folder_id are applied as boolean masks.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from app.db.vector_store import VectorStore
+
+# Metadata columns kept in memory for mask filtering; other where-keys fall back to ChromaDB
+_CODED_COLUMNS = ("file_type", "extension")  # strings, stored as vocabulary codes
+_FILTER_COLUMNS = _CODED_COLUMNS + ("folder_id",)
+
+
+class FlatVectorStore(VectorStore):
+    """VectorStore whose search() runs on an mmap'd embedding matrix instead of HNSW."""
+
+    FLAT_DIR = "flat"  # under persist_dir
+
+    def __init__(
+        self,
+        persist_dir: str,
+        embedding_dim: int = None,
+        dtype: str = "float32",
+        block_rows: int = 65536,
+        save_interval: float = 30.0,
+    ):
+        super().__init__(persist_dir, embedding_dim)
+        self._dtype = np.dtype(dtype)
+        self._block_rows = block_rows
+        self._save_interval = save_interval
+        self._last_save = time.monotonic()
+        self._flat_dir = os.path.join(persist_dir, self.FLAT_DIR)
+        os.makedirs(self._flat_dir, exist_ok=True)
+        self._flat_lock = threading.RLock()
+        self._reset_flat()
+
+        if not self._load_flat() or int(self._live[: self._size].sum()) != self.count():
+            self._rebuild_flat()
+
+    # --- Paths / state ---
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self._flat_dir, "vectors.npy")
+
+    @property
+    def _rows_path(self) -> str:
+        return os.path.join(self._flat_dir, "rows.npz")
+
+    @property
+    def _dirty_path(self) -> str:
+        return os.path.join(self._flat_dir, "unsaved")
+
+    def _reset_flat(self) -> None:
+        self._vectors = None  # open_memmap (capacity, dim), rows [0, _size) in use
+        self._size = 0
+        self._ids: list[str] = []
+        self._row_of: dict[str, int] = {}
+        self._live = np.zeros(0, dtype=bool)  # False = deleted (tombstone until compaction)
+        # Narrow dtypes: these arrays are the per-file RAM cost (a handful of types/extensions)
+        self._columns = {
+            "file_type": np.zeros(0, dtype=np.int16),
+            "extension": np.zeros(0, dtype=np.int16),
+            "folder_id": np.zeros(0, dtype=np.int32),
+        }
+        self._vocab: dict[str, dict[str, int]] = {col: {} for col in _CODED_COLUMNS}
+
+    def _load_flat(self) -> bool:
+        if not (os.path.exists(self._vectors_path) and os.path.exists(self._rows_path)):
+            return False
+        if os.path.exists(self._dirty_path):
+            print("[FlatStore] Flat index has unsaved changes from an unclean shutdown — rebuilding")
+            return False
+        try:
+            with np.load(self._rows_path) as rows:
+                live = rows["live"]
+                columns = {col: rows[col].astype(arr.dtype) for col, arr in self._columns.items()}
+                vocab = {col: {str(v): i for i, v in enumerate(rows[f"{col}_vocab"])} for col in _CODED_COLUMNS}
+                if not self._load_ids(rows, live):
+                    return False
+            vectors = open_memmap(self._vectors_path, mode="r+")
+            if vectors.dtype != self._dtype or len(live) > len(vectors):
+                return False
+        except Exception as e:
+            print(f"[FlatStore] Ignoring unreadable flat index: {type(e).__name__}: {e}")
+            return False
+
+        capacity = len(vectors)
+        self._vectors = vectors
+        self._size = len(live)
+        self._live = _grown(live, capacity)
+        self._columns = {col: _grown(arr, capacity) for col, arr in columns.items()}
+        self._vocab = vocab
+        print(f"[FlatStore] Loaded {int(live.sum())} vectors ({self._dtype}, {vectors.shape[1]}-dim)")
+        return True
+
+    def _load_ids(self, rows, live: np.ndarray) -> bool:
+        """Restore the row → file id mapping saved by _saved_ids (False if it doesn't fit)."""
+        ids = rows["ids"].astype(str).tolist()
+        if len(ids) != len(live):
+            return False
+        self._ids = ids
+        self._row_of = {fid: i for i, fid in enumerate(ids) if live[i]}
+        return True
+
+    def _saved_ids(self) -> dict:
+        """Arrays that _save_flat stores for _load_ids."""
+        try:
+            ids = np.array(self._ids, dtype="S")  # file ids are hex digests: 1 byte/char, not 4
+        except UnicodeEncodeError:
+            ids = np.array(self._ids, dtype=str)
+        return {"ids": ids}
+
+    def _mark_dirty(self) -> None:
+        """Note unsaved changes (on disk, so an unclean shutdown is detected) and save if due."""
+        if not os.path.exists(self._dirty_path):
+            open(self._dirty_path, "w").close()
+        if time.monotonic() - self._last_save >= self._save_interval:
+            self._save_flat()
+
+    def _save_flat(self) -> None:
+        """Persist the row table (vectors are written through the memmap)."""
+        n = self._size
+        if self._vectors is not None:
+            self._vectors.flush()
+        tmp = self._rows_path + ".tmp.npz"
+        np.savez(
+            tmp,
+            **self._saved_ids(),
+            live=self._live[:n],
+            **{col: arr[:n] for col, arr in self._columns.items()},
+            **{f"{col}_vocab": np.array(list(self._vocab[col]), dtype=str) for col in _CODED_COLUMNS},
+        )
+        os.replace(tmp, self._rows_path)
+        if os.path.exists(self._dirty_path):
+            os.remove(self._dirty_path)
+        self._last_save = time.monotonic()
+
+    def _rebuild_flat(self, page_size: int = 5000) -> None:
+        """(Re)build the matrix from ChromaDB — first use of the backend, or after the two diverged."""
+        print("[FlatStore] Building flat vector matrix from ChromaDB...")
+        with self._flat_lock:
+            self._vectors = None
+            for path in (self._vectors_path, self._rows_path, self._dirty_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._reset_flat()
+            offset = 0
+            while True:
+                page = self._collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                self._write_rows(page["ids"], np.asarray(page["embeddings"], dtype=np.float32), page["metadatas"])
+                offset += len(page["ids"])
+            self._save_flat()
+        print(f"[FlatStore] Flat vector matrix ready ({offset} vectors)")
+
+    # --- Row storage ---
+
+    def _ensure_capacity(self, rows: int, dim: int) -> None:
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        if rows > capacity:
+            self._reallocate(np.arange(self._size), max(rows, capacity * 2, 1024), dim)
+
+    def _compact(self) -> None:
+        """Drop tombstoned rows once they make up a large share of the matrix."""
+        keep = np.flatnonzero(self._live[: self._size])
+        self._reallocate(keep, max(len(keep) * 2, 1024), self._vectors.shape[1])
+        self._size = len(keep)
+        self._renumber(keep)
+
+    def _renumber(self, keep: np.ndarray) -> None:
+        """Row keep[i] is now row i."""
+        self._ids = [self._ids[i] for i in keep.tolist()]
+        self._row_of = {fid: i for i, fid in enumerate(self._ids)}
+
+    def _reallocate(self, keep: np.ndarray, capacity: int, dim: int) -> None:
+        """Copy rows `keep` (in order) into a fresh memmap of `capacity` rows (row arrays follow)."""
+        tmp = self._vectors_path + ".tmp"
+        new = open_memmap(tmp, mode="w+", dtype=self._dtype, shape=(capacity, dim))
+        for start in range(0, len(keep), self._block_rows):
+            chunk = keep[start : start + self._block_rows]
+            new[start : start + len(chunk)] = self._vectors[chunk]
+        new.flush()
+        del new
+        self._vectors = None  # release the old mapping before replacing the file
+        os.replace(tmp, self._vectors_path)
+        self._vectors = open_memmap(self._vectors_path, mode="r+")
+
+        self._live = _grown(self._live[keep], capacity)
+        self._columns = {col: _grown(arr[keep], capacity) for col, arr in self._columns.items()}
+
+    def _write_rows(self, file_ids: list[str], embeddings: np.ndarray, metadatas: list[dict]) -> np.ndarray:
+        """Write vectors and filter columns; returns the rows they went to."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(file_ids), -1)
+        # Unit rows: cosine similarity is then a plain dot product
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        dim = embeddings.shape[1]
+        if self._vectors is not None and self._vectors.shape[1] != dim:
+            if self._live[: self._size].any():
+                raise ValueError(f"Embedding dim {dim} does not match the flat index ({self._vectors.shape[1]})")
+            self._vectors = None  # empty index left over from another model: start over
+            self._reset_flat()
+
+        rows = self._assign_rows(file_ids)
+        size = max(self._size, int(rows.max()) + 1) if len(rows) else self._size
+        self._ensure_capacity(size, dim)  # copies the current rows [0, _size) if it grows
+        self._size = size
+        self._vectors[rows] = embeddings.astype(self._dtype)
+        self._set_columns(rows, metadatas)
+        return rows
+
+    def _set_columns(self, rows: np.ndarray, metadatas: list[dict]) -> None:
+        """Mark rows live and fill their filter columns."""
+        self._live[rows] = True
+        for col in _CODED_COLUMNS:
+            vocab = self._vocab[col]
+            self._columns[col][rows] = [vocab.setdefault((m or {}).get(col) or "", len(vocab)) for m in metadatas]
+        self._columns["folder_id"][rows] = [(m or {}).get("folder_id", -1) for m in metadatas]
+
+    def _assign_rows(self, file_ids: list[str]) -> np.ndarray:
+        """Existing rows for known ids, new rows past the end for the rest."""
+        rows = []
+        for fid in file_ids:
+            row = self._row_of.get(fid)
+            if row is None:
+                row = self._row_of[fid] = len(self._ids)
+                self._ids.append(fid)
+            rows.append(row)
+        return np.asarray(rows, dtype=np.int64)
+
+    def _ids_at(self, rows: np.ndarray) -> list[str]:
+        return [self._ids[i] for i in rows.tolist()]
+
+    # --- VectorStore API ---
+
+    def add_files_batch(self, file_ids: list[str], embeddings: np.ndarray, metadatas: list[dict]) -> None:
+        super().add_files_batch(file_ids, embeddings, metadatas)  # also assigns metadata["folder_id"]
+        with self._flat_lock:
+            self._write_rows(file_ids, embeddings, metadatas)
+            self._mark_dirty()
+
+    def delete_files(self, file_ids: list[str]) -> None:
+        super().delete_files(file_ids)
+        with self._flat_lock:
+            for fid in file_ids:
+                row = self._row_of.pop(fid, None)
+                if row is not None:
+                    self._live[row] = False
+            dead = self._size - len(self._row_of)
+            if dead > max(1024, self._size // 4):
+                self._compact()
+            self._mark_dirty()
+
+    def clear(self) -> None:
+        super().clear()
+        with self._flat_lock:
+            self._vectors = None
+            for path in (self._vectors_path, self._rows_path, self._dirty_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._reset_flat()
+
+    def close(self) -> None:
+        with self._flat_lock:
+            if os.path.exists(self._dirty_path):
+                self._save_flat()
+
+    def get_stats(self) -> dict:
+        stats = super().get_stats()
+        stats["vector_backend"] = "flat"
+        stats["flat_dtype"] = str(self._dtype)
+        return stats
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        n_results: int = 20,
+        where: Optional[dict] = None,
+    ) -> dict:
+        """Exact top-k by cosine distance; same result shape as VectorStore.search."""
+        with self._flat_lock:
+            n = self._size
+            mask = self._where_mask(where, n)
+            if mask is None:
+                return super().search(query_embedding, n_results, where)  # filter on a column we don't keep
+            valid = self._live[:n] & mask
+            k = min(n_results, int(valid.sum()))
+            if k <= 0:
+                return {"ids": [], "distances": [], "metadatas": []}
+
+            q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+            q = q / max(float(np.linalg.norm(q)), 1e-12)
+            rows, sims = self._top_k(q, valid, k)
+            ids = self._ids_at(rows)
+
+        metas = self.get_files_batch(ids)
+        hits = [(fid, 1.0 - sim) for fid, sim in zip(ids, sims.tolist()) if fid in metas]
+        return {
+            "ids": [fid for fid, _ in hits],
+            "distances": [dist for _, dist in hits],
+            "metadatas": [metas[fid] for fid, _ in hits],
+        }
+
+    def _top_k(self, q: np.ndarray, valid: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Exact top-k among `valid` rows: (row indices, cosine similarities), best first."""
+        n = len(valid)
+        if valid.sum() < n // 4:
+            # Selective filter: score just the matching rows
+            rows = np.flatnonzero(valid)
+            sims = self._exact_sims(rows, q)
+        else:
+            rows = np.arange(n)
+            sims = np.empty(n, dtype=np.float32)
+            for start in range(0, n, self._block_rows):
+                end = min(n, start + self._block_rows)
+                sims[start:end] = self._vectors[start:end].astype(np.float32, copy=False) @ q
+            sims[~valid] = -np.inf
+        return _best(rows, sims, k)
+
+    def _exact_sims(self, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        return self._vectors[rows].astype(np.float32, copy=False) @ q
+
+    def _where_mask(self, where: Optional[dict], n: int) -> Optional[np.ndarray]:
+        """Boolean row mask for a ChromaDB-style where clause; None if it uses other keys/operators."""
+        if not where:
+            return np.ones(n, dtype=bool)
+        masks = []
+        for key, cond in where.items():
+            if key in ("$and", "$or"):
+                parts = [self._where_mask(c, n) for c in cond]
+                if any(p is None for p in parts):
+                    return None
+                combine = np.logical_and if key == "$and" else np.logical_or
+                masks.append(combine.reduce(parts) if parts else np.ones(n, dtype=bool))
+                continue
+            if key not in _FILTER_COLUMNS:
+                return None
+            op, value = next(iter(cond.items())) if isinstance(cond, dict) else ("$eq", cond)
+            column = self._columns[key][:n]
+            encode = (lambda v: self._vocab[key].get(v, -1)) if key in _CODED_COLUMNS else (lambda v: v)
+            if op in ("$eq", "$ne"):
+                mask = column == encode(value)
+                masks.append(mask if op == "$eq" else ~mask)
+            elif op in ("$in", "$nin"):
+                mask = np.isin(column, [encode(v) for v in value])
+                masks.append(mask if op == "$in" else ~mask)
+            else:
+                return None
+        return np.logical_and.reduce(masks)
+
+
+def _best(rows: np.ndarray, scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """The k highest-scoring (rows, scores), best first."""
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return rows[top], scores[top]
+
+
+def _grown(arr: np.ndarray, capacity: int) -> np.ndarray:
+    """Copy of arr padded with zeros to `capacity` entries."""
+    out = np.zeros(capacity, dtype=arr.dtype)
+    out[: len(arr)] = arr
+    return out
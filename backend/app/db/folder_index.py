@@ -0,0 +1,115 @@
+"""
+Folder dimension table (SQLite), maintained at index time.
+Every indexed file gets a folder_id (also stored in its vector metadata), so
+folder-scoped searches filter on {"folder_id": {"$in": [...]}} instead of
+scanning paths, and the folder listing reads one row per folder instead of
+every file's metadata. Subtree lookups are range scans on the path index.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Iterable
+
+
+class FolderIndex:
+    """folders(id, path, file_count) plus the file_id → folder_id mapping."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS folders (
+                id         INTEGER PRIMARY KEY,
+                path       TEXT UNIQUE NOT NULL,
+                file_count INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS folder_files (file_id TEXT PRIMARY KEY, folder_id INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        # path → id for every folder ever seen (O(folders), small)
+        self._ids: dict[str, int] = dict(self._conn.execute("SELECT path, id FROM folders"))
+
+    def file_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM folder_files").fetchone()[0]
+
+    def assign(self, entries: Iterable[tuple[str, str]]) -> list[int]:
+        """Record (file_id, folder path) pairs; returns each file's folder_id."""
+        entries = list(entries)
+        if not entries:
+            return []
+        folder_ids = []
+        with self._lock:
+            cur = self._conn.cursor()
+            for file_id, path in entries:
+                folder_id = self._ids.get(path)
+                if folder_id is None:
+                    cur.execute("INSERT INTO folders (path) VALUES (?)", (path,))
+                    folder_id = self._ids[path] = cur.lastrowid
+                row = cur.execute("SELECT folder_id FROM folder_files WHERE file_id = ?", (file_id,)).fetchone()
+                if row is None or row[0] != folder_id:
+                    if row is not None:
+                        cur.execute("UPDATE folders SET file_count = file_count - 1 WHERE id = ?", row)
+                    cur.execute("INSERT OR REPLACE INTO folder_files (file_id, folder_id) VALUES (?, ?)",
+                                (file_id, folder_id))
+                    cur.execute("UPDATE folders SET file_count = file_count + 1 WHERE id = ?", (folder_id,))
+                folder_ids.append(folder_id)
+            self._conn.commit()
+        return folder_ids
+
+    def remove(self, file_ids: Iterable[str]) -> None:
+        file_ids = list(file_ids)
+        if not file_ids:
+            return
+        with self._lock:
+            cur = self._conn.cursor()
+            for file_id in file_ids:
+                row = cur.execute("SELECT folder_id FROM folder_files WHERE file_id = ?", (file_id,)).fetchone()
+                if row:
+                    cur.execute("UPDATE folders SET file_count = file_count - 1 WHERE id = ?", row)
+                    cur.execute("DELETE FROM folder_files WHERE file_id = ?", (file_id,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM folder_files")
+            self._conn.execute("DELETE FROM folders")
+            self._conn.commit()
+            self._ids.clear()
+
+    def list_folders(self) -> list[str]:
+        """Folders that currently contain indexed files, sorted."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM folders WHERE file_count > 0 ORDER BY path").fetchall()
+        return [path for path, in rows]
+
+    def folder_ids_under(self, folder_path: str) -> list[int]:
+        """
+        Ids of the folder and all its subfolders. If the path isn't an indexed
+        folder prefix, falls back to a case-insensitive substring match on
+        folder paths (still O(folders), never O(files)).
+        """
+        sep = "\\" if "\\" in folder_path else "/"
+        root = folder_path.rstrip("/\\")  # "/" or "C:\\" → "" / "C:": the range still covers the drive
+        # Paths in ["root<sep>", "root<sep+1>") are exactly the ones inside root
+        lo, hi = root + sep, root + chr(ord(sep) + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM folders WHERE file_count > 0 AND (path = ? OR (path >= ? AND path < ?))",
+                (root, lo, hi),
+            ).fetchall()
+            if not rows:
+                rows = self._conn.execute(
+                    "SELECT id FROM folders WHERE file_count > 0 AND instr(lower(path), lower(?)) > 0",
+                    (folder_path,),
+                ).fetchall()
+        return [folder_id for folder_id, in rows]
@@ -0,0 +1,590 @@
+"""
+IVF-PQ vector backend for very large libraries (millions of files).
+Built on the flat backend: exact vectors live only in the memory-mapped matrix
+on disk (float16 by default) and are only read to re-rank a short list. File
+metadata lives in a SQLite record table (FileRecordTable), not ChromaDB, so
+there is no second float32 copy and no HNSW graph. What has to live in RAM per
+vector is its PQ code (pq_subquantizers bytes), its coarse list id and the
+filter columns — tens of bytes instead of 2–4 KB of float32 plus graph links.
+
+  - coarse quantizer: k-means centroids (IVF lists); a query probes the nprobe nearest
+  - product quantizer: each residual (vector − centroid) split into M sub-vectors,
+    each encoded as one byte (256 codewords per sub-space)
+  - search: asymmetric distance (query · centroid + per-sub-space lookup tables)
+    over the probed lists, then exact re-rank of the best rerank × k
+
+Codebooks are trained on a random sample once enough vectors exist (in the
+background) and saved under persist_dir/ivfpq/; recall@50 against exact
+search is measured after training and reported in get_stats().
+Until then, and for very selective filters, searches run exactly.
+
+The first start with this backend moves any files in the ChromaDB collection
+(from the chroma/flat backends) into the record table and matrix, then drops
+the collection. Switching back to chroma/flat afterwards needs a re-index.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from app.db.file_records import FileRecordTable
+from app.db.flat_store import FlatVectorStore, _best
+from app.db.vector_store import _text_docs
+
+
+class IVFPQVectorStore(FlatVectorStore):
+    """FlatVectorStore that answers large unfiltered searches from PQ codes + an exact re-rank."""
+
+    FLAT_DIR = "ivfpq"  # matrix, row table, codebooks, codes and file records
+
+    def __init__(
+        self,
+        persist_dir: str,
+        embedding_dim: int = None,
+        dtype: str = "float16",
+        nlist: int = 0,
+        subquantizers: int = 64,
+        nprobe: int = 16,
+        rerank: int = 4,
+        train_sample: int = 100_000,
+        min_train_vectors: int = 20_000,
+    ):
+        self._pq_dir = os.path.join(persist_dir, self.FLAT_DIR)
+        os.makedirs(self._pq_dir, exist_ok=True)
+        # Needed before the base classes start up: count() and metadata paging read it
+        self._records = FileRecordTable(os.path.join(self._pq_dir, "files.sqlite3"))
+        self._nlist = nlist  # 0 = auto from the library size
+        self._subquantizers = subquantizers
+        self._nprobe = nprobe
+        self._rerank = rerank
+        self._train_sample = train_sample
+        self._min_train_vectors = min_train_vectors
+        self._training = False
+        self._generation = 0  # bumped whenever row numbers change (compaction/rebuild)
+        self._codes = None    # open_memmap (capacity, M) uint8, in step with the vector matrix
+        self._pq_ready = False
+        # Loaded before the flat index so a rebuild can encode rows as it goes
+        self._coarse, self._pq, self._recall = self._load_codebooks()
+
+        super().__init__(persist_dir, embedding_dim, dtype=dtype)
+        if self._collection.count() > 0:
+            self._import_chroma()
+        if (
+            embedding_dim is not None and self._vectors is not None
+            and self._vectors.shape[1] != embedding_dim and self.count() > 0
+        ):
+            print(f"[IVFPQ] ⚠️  Embedding dimension mismatch! Stored: {self._vectors.shape[1]}-dim, "
+                  f"current model: {embedding_dim}-dim. Clearing the index — please run Full Re-Index.")
+            self.clear()
+        self._maybe_train()
+
+    # --- Paths / persistence ---
+
+    @property
+    def _codebooks_path(self) -> str:
+        return os.path.join(self._pq_dir, "codebooks.npz")
+
+    @property
+    def _codes_path(self) -> str:
+        return os.path.join(self._pq_dir, "codes.npy")
+
+    def _load_codebooks(self):
+        if not os.path.exists(self._codebooks_path):
+            return None, None, None
+        try:
+            with np.load(self._codebooks_path) as data:
+                recall = {k[len("recall_"):]: float(data[k]) for k in data.files if k.startswith("recall_")}
+                return data["coarse"], data["pq"], recall or None
+        except Exception as e:
+            print(f"[IVFPQ] Ignoring unreadable codebooks: {type(e).__name__}: {e}")
+            return None, None, None
+
+    def _save_codebooks(self) -> None:
+        tmp = self._codebooks_path + ".tmp.npz"
+        recall = {f"recall_{k}": v for k, v in (self._recall or {}).items()}
+        np.savez(tmp, coarse=self._coarse, pq=self._pq, **recall)
+        os.replace(tmp, self._codebooks_path)
+
+    def _drop_codebooks(self) -> None:
+        self._coarse = self._pq = self._recall = None
+        self._codes = None
+        self._pq_ready = False
+        for path in (self._codebooks_path, self._codes_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # --- Flat-store hooks: keep codes and list ids in step with the rows ---
+
+    def _reset_flat(self) -> None:
+        super()._reset_flat()
+        self._columns["pq_list"] = np.zeros(0, dtype=np.int32)
+        self._codes = None
+        self._pq_ready = False
+        self._generation += 1
+
+    def _load_flat(self) -> bool:
+        if not super()._load_flat():
+            return False
+        if self._pq is not None and os.path.exists(self._codes_path):
+            codes = open_memmap(self._codes_path, mode="r+")
+            if codes.shape == (len(self._vectors), len(self._pq)):
+                self._codes = codes
+                self._pq_ready = True
+        return True
+
+    def _load_ids(self, rows, live: np.ndarray) -> bool:
+        return True  # row ↔ file id lives in the record table
+
+    def _saved_ids(self) -> dict:
+        return {}
+
+    def _save_flat(self) -> None:
+        if self._codes is not None:
+            self._codes.flush()
+        super()._save_flat()
+
+    def _assign_rows(self, file_ids: list[str]) -> np.ndarray:
+        known = self._records.rows_of(file_ids)
+        rows, next_row = [], self._size
+        for fid in file_ids:
+            row = known.get(fid)
+            if row is None:
+                row = known[fid] = next_row
+                next_row += 1
+            rows.append(row)
+        return np.asarray(rows, dtype=np.int64)
+
+    def _ids_at(self, rows: np.ndarray) -> list[str]:
+        found = self._records.ids_at(rows.tolist())
+        return [found.get(row, "") for row in rows.tolist()]
+
+    def _renumber(self, keep: np.ndarray) -> None:
+        self._records.renumber(keep)
+
+    def _where_mask(self, where: Optional[dict], n: int) -> Optional[np.ndarray]:
+        mask = super()._where_mask(where, n)
+        if mask is None:  # a key without an in-memory column: the record table answers it
+            mask = np.zeros(n, dtype=bool)
+            rows = self._records.rows_where(where)
+            mask[rows[rows < n]] = True
+        return mask
+
+    def _compact(self) -> None:
+        super()._compact()
+        self._generation += 1
+
+    def _rebuild_flat(self, page_size: int = 5000) -> None:
+        """
+        Recover the row table after an unclean shutdown (or a missing one). Vectors
+        were written through the memmap and rows/metadata are committed in the record
+        table, so only the in-memory columns and PQ list ids are rebuilt.
+        """
+        print("[IVFPQ] Rebuilding row table from the file records...")
+        with self._flat_lock:
+            vectors = None
+            if os.path.exists(self._vectors_path):
+                try:
+                    vectors = open_memmap(self._vectors_path, mode="r+")
+                except Exception as e:
+                    print(f"[IVFPQ] Unreadable vector matrix: {type(e).__name__}: {e}")
+            for path in (self._rows_path, self._dirty_path, self._codes_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._reset_flat()
+            if vectors is None or vectors.dtype != self._dtype:
+                if self._records.count():
+                    print("[IVFPQ] Vector matrix missing — dropping file records; please run Full Re-Index")
+                    self._records.clear()
+                    self._text_index.clear()
+                    self._folder_index.clear()
+                self._save_flat()
+                return
+
+            capacity = len(vectors)
+            self._vectors = vectors
+            self._live = np.zeros(capacity, dtype=bool)
+            self._columns = {col: np.zeros(capacity, dtype=arr.dtype) for col, arr in self._columns.items()}
+            lost = []
+            for page in self._records.iter_pages(page_size):
+                rows = np.asarray([row for _, row, _ in page], dtype=np.int64)
+                ok = rows < capacity
+                lost.extend(fid for (fid, _, _), good in zip(page, ok) if not good)
+                if ok.any():
+                    self._set_columns(rows[ok], [meta for (_, _, meta), good in zip(page, ok) if good])
+                    self._size = max(self._size, int(rows[ok].max()) + 1)
+            if lost:
+                print(f"[IVFPQ] {len(lost)} records point past the vector matrix — removing them")
+                self.delete_files(lost)
+
+            if self._pq is not None and self._coarse.shape[1] == vectors.shape[1]:
+                self._ensure_codes()
+                live = np.flatnonzero(self._live[: self._size])
+                self._encode_rows(live)
+                self._pq_ready = True
+            self._save_flat()
+        print(f"[IVFPQ] Row table ready ({int(self._live[: self._size].sum())} vectors)")
+
+    def _import_chroma(self, page_size: int = 5000) -> None:
+        """
+        One-time move of the files in the ChromaDB collection (written by the
+        chroma/flat backends) into the record table and matrix. The collection
+        is dropped afterwards, so its vectors and HNSW graph stop costing memory.
+        """
+        total = self._collection.count()
+        print(f"[IVFPQ] Moving {total} files from ChromaDB into the IVF-PQ store (one-time)...")
+        offset = 0
+        while True:
+            page = self._collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            self.add_files_batch(page["ids"], np.asarray(page["embeddings"], dtype=np.float32), page["metadatas"])
+            offset += len(page["ids"])
+        with self._flat_lock:
+            if self._pq is not None and self._codes is not None:
+                self._pq_ready = True  # every row was encoded with the saved codebooks as it was written
+            self._save_flat()
+        self._client.delete_collection(self.COLLECTION_NAME)
+        self._collection = self._client.get_or_create_collection(
+            name=self.COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"},
+        )
+        print(f"[IVFPQ] Moved {offset} files; the ChromaDB file collection is now empty")
+
+    def _reallocate(self, keep: np.ndarray, capacity: int, dim: int) -> None:
+        if self._codes is not None:
+            tmp = self._codes_path + ".tmp"
+            new = open_memmap(tmp, mode="w+", dtype=np.uint8, shape=(capacity, self._codes.shape[1]))
+            for start in range(0, len(keep), self._block_rows):
+                chunk = keep[start : start + self._block_rows]
+                new[start : start + len(chunk)] = self._codes[chunk]
+            new.flush()
+            del new
+            self._codes = None
+            os.replace(tmp, self._codes_path)
+            self._codes = open_memmap(self._codes_path, mode="r+")
+        super()._reallocate(keep, capacity, dim)
+
+    def _write_rows(self, file_ids: list[str], embeddings: np.ndarray, metadatas: list[dict]) -> np.ndarray:
+        rows = super()._write_rows(file_ids, embeddings, metadatas)
+        if self._pq is None:
+            return rows
+        if self._coarse.shape[1] != self._vectors.shape[1]:
+            print("[IVFPQ] Embedding dim changed — discarding codebooks (they will be retrained)")
+            self._drop_codebooks()
+            return rows
+        self._ensure_codes()
+        self._encode_rows(rows)
+        return rows
+
+    def _ensure_codes(self) -> None:
+        if self._codes is None:
+            self._codes = open_memmap(
+                self._codes_path, mode="w+", dtype=np.uint8, shape=(len(self._vectors), len(self._pq))
+            )
+
+    def _encode_rows(self, rows: np.ndarray) -> None:
+        for start in range(0, len(rows), self._block_rows):
+            chunk = rows[start : start + self._block_rows]
+            lists, codes = _encode(self._vectors[chunk].astype(np.float32), self._coarse, self._pq)
+            self._columns["pq_list"][chunk] = lists
+            self._codes[chunk] = codes
+
+    # --- VectorStore API (records in SQLite, vectors only in the matrix) ---
+
+    def add_files_batch(self, file_ids: list[str], embeddings: np.ndarray, metadatas: list[dict]) -> None:
+        self._assign_folders(file_ids, metadatas)
+        with self._flat_lock:
+            # Vectors first: a record is only committed once its row holds the vector
+            rows = self._write_rows(file_ids, embeddings, metadatas)
+            self._records.upsert(file_ids, rows.tolist(), metadatas)
+            self._mark_dirty()
+        self._text_index.upsert(_text_docs(file_ids, metadatas))
+        self._maybe_train()
+
+    def delete_files(self, file_ids: list[str]) -> None:
+        if not file_ids:
+            return
+        with self._flat_lock:
+            rows = self._records.remove(list(file_ids))
+            self._live[rows] = False
+            dead = self._size - int(self._live[: self._size].sum())
+            if dead > max(1024, self._size // 4):
+                self._compact()
+            self._mark_dirty()
+        self._text_index.remove(file_ids)
+        self._folder_index.remove(file_ids)
+
+    def count(self) -> int:
+        return self._records.count()
+
+    def has_file(self, file_id: str) -> bool:
+        return bool(self._records.rows_of([file_id]))
+
+    def get_file(self, file_id: str) -> Optional[dict]:
+        return self._records.get([file_id]).get(file_id)
+
+    def get_files_batch(self, file_ids: list[str]) -> dict[str, dict]:
+        return self._records.get(file_ids) if file_ids else {}
+
+    def get_by_content_hashes(self, content_hashes: list[str]) -> dict[str, dict]:
+        if not content_hashes:
+            return {}
+        found = {}
+        records = self._records.by_content_hashes(content_hashes)
+        with self._flat_lock:
+            for fid, row, meta in records:
+                h = meta.get("content_hash")
+                if h not in found and row < self._size and self._live[row]:
+                    found[h] = {
+                        "file_id": fid,
+                        "embedding": np.asarray(self._vectors[row], dtype=np.float32),
+                        "metadata": meta,
+                    }
+        return found
+
+    def get_all_indexed_files(self) -> dict:
+        return {
+            meta["filepath"]: {
+                "file_hash": meta.get("file_hash", ""),
+                "last_modified": meta.get("last_modified", 0),
+                "last_indexed": meta.get("last_indexed", 0),
+                "size_bytes": meta.get("size_bytes", 0),
+            }
+            for page in self._records.iter_pages()
+            for _, _, meta in page
+            if "filepath" in meta
+        }
+
+    def remove_files_by_path(self, file_paths: list[str]) -> int:
+        if not file_paths:
+            return 0
+        ids = self._records.ids_where({"filepath": {"$in": list(file_paths)}})
+        if ids:
+            self.delete_files(ids)
+            print(f"[VectorStore] Removed {len(ids)} files from index")
+        return len(ids)
+
+    def get_file_metadata(self, file_path: str) -> dict | None:
+        found = self._records.by_filepath(file_path)
+        return found[1] if found else None
+
+    def _iter_metadata_pages(self, page_size: int = 5000):
+        for page in self._records.iter_pages(page_size):
+            yield [fid for fid, _, _ in page], [meta for _, _, meta in page]
+
+    def _update_metadatas(self, file_ids: list[str], patches: list[dict]) -> None:
+        self._records.update_metadata(file_ids, patches)
+
+    def clear(self) -> None:
+        with self._flat_lock:
+            super().clear()
+            self._records.clear()
+            self._drop_codebooks()
+
+    def get_stats(self) -> dict:
+        stats = super().get_stats()
+        stats["vector_backend"] = "ivfpq"
+        with self._flat_lock:
+            # Resident per-row arrays: live flag + filter columns + coarse list id, plus the PQ code
+            # (the exact vectors and file records stay on disk)
+            row_bytes = self._live.itemsize + sum(arr.itemsize for arr in self._columns.values())
+            code_bytes = 0 if self._codes is None else self._codes.shape[1]
+            dim = 0 if self._vectors is None else self._vectors.shape[1]
+        stats["ivfpq"] = {
+            "trained": self._pq_ready,
+            "training": self._training,
+            "nlist": None if self._coarse is None else len(self._coarse),
+            "subquantizers": None if self._pq is None else len(self._pq),
+            "bytes_per_vector": row_bytes + code_bytes,
+            "disk_bytes_per_vector": dim * self._dtype.itemsize,
+            "nprobe": self._nprobe,
+            "recall": self._recall,
+        }
+        return stats
+
+    def _top_k(self, q: np.ndarray, valid: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        shortlist = max(k * self._rerank, 100)
+        if not self._pq_ready or valid.sum() <= shortlist * 8:
+            return super()._top_k(q, valid, k)  # untrained or very selective filter: exact is cheap enough
+
+        n = len(valid)
+        lists = self._columns["pq_list"][:n]
+        coarse_ip = self._coarse @ q
+        coarse_d2 = (self._coarse * self._coarse).sum(axis=1) - 2 * coarse_ip
+        nprobe = min(self._nprobe, len(self._coarse))
+        probe = np.argpartition(coarse_d2, nprobe - 1)[:nprobe]
+        candidates = np.flatnonzero(valid & np.isin(lists, probe))
+        if len(candidates) < k:
+            return super()._top_k(q, valid, k)
+
+        # Asymmetric distance: q·(centroid + residual) with per-sub-space lookup tables
+        m, ksub, dsub = self._pq.shape
+        lut = np.einsum("mkd,md->mk", self._pq, q.reshape(m, dsub))
+        approx = np.empty(len(candidates), dtype=np.float32)
+        for start in range(0, len(candidates), self._block_rows):
+            rows = candidates[start : start + self._block_rows]
+            approx[start : start + len(rows)] = (
+                coarse_ip[lists[rows]] + lut[np.arange(m), self._codes[rows]].sum(axis=1)
+            )
+        short_rows, _ = _best(candidates, approx, shortlist)
+        return _best(short_rows, self._exact_sims(short_rows, q), k)
+
+    # --- Training ---
+
+    def _maybe_train(self) -> None:
+        """Start background training once the library is large enough and untrained."""
+        if self._pq_ready or self._training:
+            return
+        if self.count() < self._min_train_vectors:
+            return
+        self._training = True
+        threading.Thread(target=self.train, name="ivfpq-train", daemon=True).start()
+
+    def train(self) -> None:
+        """Train codebooks on a sample, encode every row, then measure recall."""
+        self._training = True
+        try:
+            start_time = time.time()
+            with self._flat_lock:
+                live = np.flatnonzero(self._live[: self._size])
+                if len(live) < 256:
+                    return
+                rng = np.random.default_rng(0)
+                sample_size = min(max(self._train_sample, 256), len(live))
+                sample = np.sort(rng.choice(live, sample_size, replace=False))
+                x = self._vectors[sample].astype(np.float32)
+                n_live = len(live)
+
+            dim = x.shape[1]
+            nlist = self._nlist or int(min(4 * np.sqrt(n_live), len(x) // 39))
+            nlist = max(1, min(nlist, len(x)))
+            m = _subquantizers(dim, self._subquantizers)
+            print(f"[IVFPQ] Training on {len(x)} of {n_live} vectors: {nlist} lists, {m} sub-quantizers...")
+            coarse = _kmeans(x, nlist)
+            residuals = x - coarse[_nearest(x, coarse)]
+            dsub = dim // m
+            pq = np.stack([_kmeans(residuals[:, j * dsub : (j + 1) * dsub], 256, seed=j) for j in range(m)])
+
+            # Install codebooks, then encode existing rows block by block (searches
+            # stay exact meanwhile; rows written from now on are encoded on write)
+            with self._flat_lock:
+                self._coarse, self._pq = coarse, pq
+                self._codes = None
+                if os.path.exists(self._codes_path):
+                    os.remove(self._codes_path)
+                self._ensure_codes()
+                generation, end = self._generation, self._size
+            pos = 0
+            while pos < end:
+                with self._flat_lock:
+                    if self._generation != generation:  # rows were renumbered: start over
+                        generation, end, pos = self._generation, self._size, 0
+                        continue
+                    self._encode_rows(np.arange(pos, min(end, pos + self._block_rows)))
+                pos += self._block_rows
+            with self._flat_lock:
+                self._pq_ready = True
+                self._save_codebooks()
+                self._mark_dirty()
+            print(f"[IVFPQ] Trained and encoded in {time.time() - start_time:.0f}s "
+                  f"({m + 4} bytes/vector in RAM)")
+
+            self._recall = self.measure_recall()
+            with self._flat_lock:
+                self._save_codebooks()
+            print(f"[IVFPQ] recall@{self._recall['k']:.0f} vs exact search: {self._recall['recall']:.3f}")
+        finally:
+            self._training = False
+
+    def measure_recall(self, n_queries: int = 20, k: int = 50) -> Optional[dict]:
+        """
+        recall@k of IVF-PQ vs exact search, for queries sampled from the index
+        (one blocked pass over the matrix computes all the exact answers).
+        """
+        with self._flat_lock:
+            n = self._size
+            valid = self._live[:n].copy()
+            live = np.flatnonzero(valid)
+            if not self._pq_ready or len(live) <= k:
+                return None
+            rng = np.random.default_rng(1)
+            queries = self._vectors[rng.choice(live, min(n_queries, len(live)), replace=False)].astype(np.float32)
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            generation = self._generation
+
+        # Running exact top-k per query, merged block by block
+        best_sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), k), dtype=np.int64)
+        for start in range(0, n, self._block_rows):
+            with self._flat_lock:
+                if self._generation != generation:
+                    return self._recall
+                block = self._vectors[start : min(n, start + self._block_rows)].astype(np.float32)
+            sims = queries @ block.T
+            sims[:, ~valid[start : start + len(block)]] = -np.inf
+            all_sims = np.concatenate([best_sims, sims], axis=1)
+            all_rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + len(block)), sims.shape)], axis=1)
+            top = np.argpartition(-all_sims, k - 1, axis=1)[:, :k]
+            best_sims = np.take_along_axis(all_sims, top, axis=1)
+            best_rows = np.take_along_axis(all_rows, top, axis=1)
+
+        hits = 0
+        for q, truth_rows in zip(queries, best_rows):
+            truth = set(truth_rows.tolist())
+            with self._flat_lock:
+                if self._generation != generation:
+                    return self._recall
+                rows, _ = self._top_k(q, valid, k)
+            hits += len(truth & set(rows.tolist()))
+        return {"recall": hits / (k * len(queries)), "k": float(k), "queries": float(len(queries))}
+
+
+# --- Quantizer math ---
+
+def _subquantizers(dim: int, wanted: int) -> int:
+    """Largest M <= wanted that divides dim."""
+    for m in range(min(wanted, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray, block: int = 16384) -> np.ndarray:
+    """Index of the nearest (L2) centroid for each row of x."""
+    c_sq = (centroids * centroids).sum(axis=1)
+    out = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), block):
+        out[start : start + block] = np.argmin(c_sq - 2 * x[start : start + block] @ centroids.T, axis=1)
+    return out
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 16, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iters):
+        assign = _nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        centroids[filled] = np.add.reduceat(x[order], starts[filled]) / counts[filled, None]
+        if not filled.all():
+            centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()))]
+    return centroids
+
+
+def _encode(x: np.ndarray, coarse: np.ndarray, pq: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(coarse list id, PQ code of the residual) for each row of x."""
+    lists = _nearest(x, coarse)
+    residuals = x - coarse[lists]
+    m, _, dsub = pq.shape
+    codes = np.empty((len(x), m), dtype=np.uint8)
+    for j in range(m):
+        codes[:, j] = _nearest(residuals[:, j * dsub : (j + 1) * dsub], pq[j])
+    return lists.astype(np.int32), codes
@@ -0,0 +1,132 @@
+"""
+Passage collection for document retrieval.
+Each indexed document's text is chunked into overlapping passages, embedded
+with TextEmbedder (all-mpnet-base-v2, 768-dim) and stored here, one record per
+passage with its source file. A query is matched against passages, and the
+hits are pooled per file (max, or the mean of the best k), so content deep
+inside a long document can be found, not just its first few hundred characters.
+"""
+
+import os
+
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+import numpy as np
+
+
+class PassageStore:
+    """ChromaDB collection of document passages (text + embedding + source_file_id)."""
+
+    COLLECTION_NAME = "findmypic_passages"
+
+    def __init__(self, persist_dir: str):
+        self.persist_dir = persist_dir
+        os.makedirs(persist_dir, exist_ok=True)
+
+        self._client = chromadb.PersistentClient(
+            path=persist_dir,
+            settings=ChromaSettings(anonymized_telemetry=False),
+        )
+        self._collection = self._client.get_or_create_collection(
+            name=self.COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"},
+        )
+        print(f"[PassageStore] Collection ready. Current count: {self._collection.count()}")
+
+    def replace_passages(
+        self,
+        file_ids: list[str],
+        passage_ids: list[str],
+        embeddings: np.ndarray,
+        metadatas: list[dict],
+        texts: list[str],
+    ) -> None:
+        """
+        Make the given passages the only ones stored for file_ids (a re-indexed
+        document may now have fewer passages than before).
+        """
+        self.delete_passages_for_files(file_ids)
+        if passage_ids:
+            self._collection.upsert(
+                ids=passage_ids,
+                embeddings=np.asarray(embeddings, dtype=np.float32),
+                metadatas=metadatas,
+                documents=texts,
+            )
+
+    def delete_passages_for_files(self, file_ids: list[str]) -> None:
+        if file_ids:
+            self._collection.delete(where={"source_file_id": {"$in": list(file_ids)}})
+
+    def get_passages_for_files(self, file_ids: list[str]) -> dict[str, tuple[list[str], np.ndarray]]:
+        """Stored passages per file as (texts, embeddings) in document order (for content dedup)."""
+        if not file_ids:
+            return {}
+        found = self._collection.get(
+            where={"source_file_id": {"$in": list(file_ids)}},
+            include=["metadatas", "embeddings", "documents"],
+        )
+        rows: dict[str, list] = {}
+        for meta, emb, text in zip(found["metadatas"], found["embeddings"], found["documents"]):
+            rows.setdefault(meta["source_file_id"], []).append((meta["passage_index"], text, emb))
+        result = {}
+        for fid, items in rows.items():
+            items.sort(key=lambda r: r[0])
+            result[fid] = ([t for _, t, _ in items], np.asarray([e for _, _, e in items], dtype=np.float32))
+        return result
+
+    def search_files(
+        self,
+        query_embedding: np.ndarray,
+        n_passages: int = 200,
+        pooling: str = "max",
+        pool_k: int = 3,
+    ) -> list[dict]:
+        """
+        Files whose passages match the query, best first. Passage similarities
+        are pooled per file: "max" (best passage) or "topk" (mean of the best
+        pool_k, which favours documents that discuss the topic throughout).
+        Returns dicts with file_id, similarity (cosine) and passage (best text).
+        """
+        count = self._collection.count()
+        if count == 0:
+            return []
+        found = self._collection.query(
+            query_embeddings=[np.asarray(query_embedding, dtype=np.float32).tolist()],
+            n_results=min(n_passages, count),
+            include=["metadatas", "distances", "documents"],
+        )
+        metadatas = found["metadatas"][0] if found["metadatas"] else []
+        distances = found["distances"][0] if found["distances"] else []
+        documents = found["documents"][0] if found["documents"] else []
+
+        # Hits come back best-first, so each file's first hit is its best passage
+        by_file: dict[str, dict] = {}
+        for meta, distance, text in zip(metadatas, distances, documents):
+            hit = by_file.setdefault(meta["source_file_id"], {"sims": [], "passage": text})
+            hit["sims"].append(1.0 - distance)
+
+        results = []
+        for file_id, hit in by_file.items():
+            sims = hit["sims"]
+            similarity = sims[0] if pooling == "max" else float(np.mean(sims[: max(1, pool_k)]))
+            results.append({"file_id": file_id, "similarity": similarity, "passage": hit["passage"]})
+        results.sort(key=lambda r: r["similarity"], reverse=True)
+        return results
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def clear(self) -> None:
+        """Delete all passages."""
+        self._client.delete_collection(self.COLLECTION_NAME)
+        self._collection = self._client.get_or_create_collection(
+            name=self.COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"},
+        )
+        print("[PassageStore] Cleared.")
+
+    def get_stats(self) -> dict:
+        return {
+            "total_passages": self._collection.count(),
+        }
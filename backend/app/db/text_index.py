@@ -0,0 +1,140 @@
+"""
+Full-text index over filenames and OCR/document text (SQLite FTS5).
+Replaces the linear metadata scan in VectorStore.text_search: queries hit an
+inverted index and come back BM25-ranked in milliseconds, with phrase ("...")
+and prefix (term*) support. VectorStore keeps it in sync on every write/delete.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+_QUOTED_RE = re.compile(r'"([^"]*)"')
+
+
+def build_match_query(query: str, match_all: bool = True) -> Optional[str]:
+    """
+    Translate user text into an FTS5 MATCH expression.
+      "exact phrase"   → phrase match
+      term*            → prefix match
+      plain words      → all must match (match_all) or any; the last word is
+                         treated as a prefix so results update as the user types
+    Returns None if the query has no searchable terms.
+    """
+    parts = []
+    for phrase in _QUOTED_RE.findall(query):
+        terms = _TERM_RE.findall(phrase)
+        if terms:
+            parts.append('"' + " ".join(terms) + '"')
+
+    rest = _QUOTED_RE.sub(" ", query)
+    words = [(m.group(0), rest[m.end():m.end() + 1] == "*") for m in _TERM_RE.finditer(rest)]
+    for i, (word, star) in enumerate(words):
+        is_last = i == len(words) - 1 and not rest[-1:].isspace()
+        # Single characters as prefixes match half the corpus — keep them exact
+        prefix = star or (is_last and len(word) >= 2)
+        parts.append(f'"{word}"' + ("*" if prefix else ""))
+
+    if not parts:
+        return None
+    return (" AND " if match_all else " OR ").join(parts)
+
+
+class TextIndex:
+    """SQLite FTS5 index of (filename, text) per file_id."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # file_id ↔ FTS rowid (FTS5 can only look rows up by rowid cheaply)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS text_docs (id INTEGER PRIMARY KEY, file_id TEXT UNIQUE NOT NULL)"
+        )
+        self._conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS text_fts USING fts5(
+                filename, body,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+            """
+        )
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM text_docs").fetchone()[0]
+
+    def upsert(self, docs: Iterable[tuple[str, str, str]]) -> None:
+        """Index (file_id, filename, text) rows, replacing earlier versions."""
+        docs = list(docs)
+        if not docs:
+            return
+        with self._lock:
+            cur = self._conn.cursor()
+            for file_id, filename, text in docs:
+                cur.execute("INSERT INTO text_docs (file_id) VALUES (?) ON CONFLICT(file_id) DO NOTHING", (file_id,))
+                rowid = cur.execute("SELECT id FROM text_docs WHERE file_id = ?", (file_id,)).fetchone()[0]
+                cur.execute("DELETE FROM text_fts WHERE rowid = ?", (rowid,))
+                cur.execute(
+                    "INSERT INTO text_fts (rowid, filename, body) VALUES (?, ?, ?)",
+                    (rowid, _searchable_filename(filename), text or ""),
+                )
+            self._conn.commit()
+
+    def remove(self, file_ids: Iterable[str]) -> None:
+        file_ids = list(file_ids)
+        if not file_ids:
+            return
+        with self._lock:
+            cur = self._conn.cursor()
+            for file_id in file_ids:
+                row = cur.execute("SELECT id FROM text_docs WHERE file_id = ?", (file_id,)).fetchone()
+                if row:
+                    cur.execute("DELETE FROM text_fts WHERE rowid = ?", row)
+                    cur.execute("DELETE FROM text_docs WHERE id = ?", row)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM text_fts")
+            self._conn.execute("DELETE FROM text_docs")
+            self._conn.commit()
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[str, float]]:
+        """
+        BM25-ranked (file_id, score) pairs, best first (higher score = better).
+        Every term must match: a file sharing one word (often a stop-word) with
+        the query is not a keyword hit.
+        """
+        expr = build_match_query(query)
+        if expr is None:
+            return []
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    """
+                    SELECT d.file_id, bm25(text_fts, 2.0, 1.0) AS rank
+                    FROM text_fts JOIN text_docs d ON d.id = text_fts.rowid
+                    WHERE text_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                    """,
+                    (expr, limit),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        # SQLite's bm25() is negative (lower = better); flip for callers
+        return [(file_id, -rank) for file_id, rank in rows]
+
+
+def _searchable_filename(filename: str) -> str:
+    """Split snake_case / kebab-case / dotted names into words."""
+    return re.sub(r"[_\-.]+", " ", filename or "")
@@ -10,6 +10,11 @@ import chromadb
 from chromadb.config import Settings as ChromaSettings
 import numpy as np
 
+from app.core.config import get_settings
+from app.db.face_clusters import FaceClusterIndex
+from app.db.folder_index import FolderIndex
+from app.db.text_index import TextIndex
+
 
 class VectorStore:
     """Wrapper around ChromaDB for storing and querying file embeddings."""
@@ -38,6 +43,57 @@ class VectorStore:
         if count > 0 and embedding_dim is not None:
             self._check_and_fix_dimension_mismatch(embedding_dim)
 
+        # Inverted index for keyword search, kept in sync with the collection
+        self._text_index = TextIndex(os.path.join(persist_dir, "text_index.sqlite3"))
+        # Folder dimension table: folder_id on every record, for scoped search
+        self._folder_index = FolderIndex(os.path.join(persist_dir, "folder_index.sqlite3"))
+        count = self.count()
+        if count == 0:
+            self._text_index.clear()  # collection was reset (e.g., dimension mismatch)
+            self._folder_index.clear()
+        else:
+            if self._text_index.count() == 0:
+                self._rebuild_text_index()
+            if self._folder_index.file_count() == 0:
+                self._backfill_folder_ids()
+
+    def _rebuild_text_index(self, page_size: int = 5000) -> None:
+        """One-time backfill of the text index from existing metadata."""
+        print("[VectorStore] Building full-text index from existing metadata (one-time)...")
+        total = 0
+        for ids, metadatas in self._iter_metadata_pages(page_size):
+            self._text_index.upsert(_text_docs(ids, metadatas))
+            total += len(ids)
+        print(f"[VectorStore] Full-text index ready ({total} files)")
+
+    def _backfill_folder_ids(self, page_size: int = 5000) -> None:
+        """One-time assignment of folder ids to records indexed before the folder table existed."""
+        print("[VectorStore] Building folder index from existing metadata (one-time)...")
+        for ids, metadatas in self._iter_metadata_pages(page_size):
+            folder_ids = self._folder_index.assign(_folder_entries(ids, metadatas))
+            self._update_metadatas(ids, [{"folder_id": fid} for fid in folder_ids])
+        print(f"[VectorStore] Folder index ready ({len(self._folder_index.list_folders())} folders)")
+
+    def _iter_metadata_pages(self, page_size: int = 5000):
+        """(ids, metadatas) of every stored file, a page at a time."""
+        offset = 0
+        while True:
+            page = self._collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page["ids"], page["metadatas"]
+            offset += len(page["ids"])
+
+    def _update_metadatas(self, file_ids: list[str], patches: list[dict]) -> None:
+        """Merge patch keys into stored metadata."""
+        self._collection.update(ids=file_ids, metadatas=patches)
+
+    def _assign_folders(self, file_ids: list[str], metadatas: list[dict]) -> None:
+        """Set metadata["folder_id"] for records about to be written."""
+        folder_ids = self._folder_index.assign(_folder_entries(file_ids, metadatas))
+        for meta, folder_id in zip(metadatas, folder_ids):
+            meta["folder_id"] = folder_id
+
     def _check_and_fix_dimension_mismatch(self, expected_dim: int) -> None:
         """
         Check if stored embeddings match the current model's dimension.
@@ -71,11 +127,7 @@ class VectorStore:
         metadata: dict,
     ) -> None:
         """Add a single file's embedding and metadata."""
-        self._collection.upsert(
-            ids=[file_id],
-            embeddings=[embedding.tolist()],
-            metadatas=[metadata],
-        )
+        self.add_files_batch([file_id], np.asarray(embedding, dtype=np.float32)[None], [metadata])
 
     def add_files_batch(
         self,
@@ -83,12 +135,14 @@ class VectorStore:
         embeddings: np.ndarray,
         metadatas: list[dict],
     ) -> None:
-        """Add a batch of file embeddings and metadata."""
+        """Add a batch of file embeddings and metadata (float32 array, no list conversion)."""
+        self._assign_folders(file_ids, metadatas)
         self._collection.upsert(
             ids=file_ids,
-            embeddings=embeddings.tolist(),
+            embeddings=np.asarray(embeddings, dtype=np.float32),
             metadatas=metadatas,
         )
+        self._text_index.upsert(_text_docs(file_ids, metadatas))
 
     def search(
         self,
@@ -122,7 +176,14 @@ class VectorStore:
 
     def delete_file(self, file_id: str) -> None:
         """Remove a file from the index."""
-        self._collection.delete(ids=[file_id])
+        self.delete_files([file_id])
+
+    def delete_files(self, file_ids: list[str]) -> None:
+        """Remove many files from the index in one call."""
+        if file_ids:
+            self._collection.delete(ids=list(file_ids))
+            self._text_index.remove(file_ids)
+            self._folder_index.remove(file_ids)
 
     def has_file(self, file_id: str) -> bool:
         """Check if a file is already indexed."""
@@ -136,6 +197,41 @@ class VectorStore:
             return result["metadatas"][0]
         return None
 
+    def get_files_batch(self, file_ids: list[str]) -> dict[str, dict]:
+        """
+        Get metadata for many files in one query.
+        Returns a dict mapping file_id -> metadata for the ids that are indexed.
+        """
+        if not file_ids:
+            return {}
+        result = self._collection.get(ids=list(file_ids), include=["metadatas"])
+        return {
+            fid: meta
+            for fid, meta in zip(result["ids"], result["metadatas"])
+            if meta is not None
+        }
+
+    def get_by_content_hashes(self, content_hashes: list[str]) -> dict[str, dict]:
+        """
+        Find already-indexed files with the given content hashes.
+        Returns content_hash -> {"file_id", "embedding", "metadata"} (one file per hash).
+        """
+        if not content_hashes:
+            return {}
+        result = self._collection.get(
+            where={"content_hash": {"$in": list(content_hashes)}},
+            include=["embeddings", "metadatas"],
+        )
+        found = {}
+        for fid, emb, meta in zip(result["ids"], result["embeddings"], result["metadatas"]):
+            if meta and meta.get("content_hash") not in found:
+                found[meta["content_hash"]] = {
+                    "file_id": fid,
+                    "embedding": np.asarray(emb, dtype=np.float32),
+                    "metadata": meta,
+                }
+        return found
+
     def count(self) -> int:
         """Total number of indexed files."""
         return self._collection.count()
@@ -147,13 +243,19 @@ class VectorStore:
             name=self.COLLECTION_NAME,
             metadata={"hnsw:space": "cosine"},
         )
+        self._text_index.clear()
+        self._folder_index.clear()
         print("[VectorStore] Index cleared.")
 
+    def close(self) -> None:
+        """Persist any derived state before shutdown (ChromaDB itself persists on write)."""
+
     def get_stats(self) -> dict:
         """Get index statistics."""
         return {
-            "total_files": self._collection.count(),
+            "total_files": self.count(),
             "persist_dir": self.persist_dir,
+            "vector_backend": "chroma",
         }
     
     def get_all_indexed_files(self) -> dict:
@@ -203,7 +305,7 @@ class VectorStore:
             
             # Delete the documents
             if ids_to_delete:
-                self._collection.delete(ids=ids_to_delete)
+                self.delete_files(ids_to_delete)
                 print(f"[VectorStore] Removed {len(ids_to_delete)} files from index")
                 return len(ids_to_delete)
             
@@ -228,44 +330,85 @@ class VectorStore:
             print(f"[VectorStore] Error getting file metadata: {e}")
             return None
 
-    def text_search(self, query_text: str, n_results: int = 20) -> dict:
+    def list_folders(self) -> list[str]:
+        """Distinct folders containing indexed files (reads the folder table, not file metadata)."""
+        return self._folder_index.list_folders()
+
+    def folder_ids_under(self, folder_path: str) -> list[int]:
+        """folder_ids of a folder and its subfolders, for {"folder_id": {"$in": ...}} filters."""
+        return self._folder_index.folder_ids_under(folder_path)
+
+    def text_search(self, query_text: str, n_results: int = 20, folder_ids: Optional[list[int]] = None) -> dict:
         """
-        Search file metadata for OCR text matches.
-        Returns files whose 'ocr_text' metadata contains the query string.
+        Keyword search over filenames and OCR/document text.
+        Uses the FTS5 index (phrase, prefix, BM25 ranking); returns the top
+        n_results as {'ids', 'metadatas', 'scores'}, best first.
+        With folder_ids, only files in those folders are returned.
         """
-        try:
-            results = self._collection.get(
-                where={"ocr_text": {"$ne": ""}},
-                include=["metadatas"],
-            )
-        except Exception:
-            return {"ids": [], "metadatas": []}
-
-        if not results["ids"]:
-            return {"ids": [], "metadatas": []}
-
-        # Filter by text match (case-insensitive)
-        query_lower = query_text.lower()
-        matched_ids = []
-        matched_metas = []
-        for i, meta in enumerate(results["metadatas"]):
-            ocr_text = meta.get("ocr_text", "").lower()
-            if query_lower in ocr_text:
-                matched_ids.append(results["ids"][i])
-                matched_metas.append(meta)
-
+        # Scoped: over-fetch, since some hits will fall outside the folders
+        hits = self._text_index.search(query_text, limit=n_results * 4 if folder_ids else n_results)
+        if not hits:
+            return {"ids": [], "metadatas": [], "scores": []}
+
+        metas = self.get_files_batch([fid for fid, _ in hits])
+        if folder_ids:
+            in_scope = set(folder_ids)
+            metas = {fid: meta for fid, meta in metas.items() if meta.get("folder_id") in in_scope}
+        hits = [(fid, score) for fid, score in hits if metas.get(fid) is not None][:n_results]
         return {
-            "ids": matched_ids[:n_results],
-            "metadatas": matched_metas[:n_results],
+            "ids": [fid for fid, _ in hits],
+            "metadatas": [metas[fid] for fid, _ in hits],
+            "scores": [score for _, score in hits],
         }
 
 
+def _folder_entries(file_ids: list[str], metadatas: list[dict]):
+    """(file_id, folder path) rows for the folder index."""
+    for fid, meta in zip(file_ids, metadatas):
+        meta = meta or {}
+        yield fid, meta.get("folder_path") or os.path.dirname(meta.get("filepath", ""))
+
+
+def _text_docs(file_ids: list[str], metadatas: list[dict]):
+    """(file_id, filename, text) rows for the text index."""
+    for fid, meta in zip(file_ids, metadatas):
+        meta = meta or {}
+        yield fid, meta.get("filename", ""), meta.get("ocr_text", "") or ""
+
+
+def create_vector_store(persist_dir: str, embedding_dim: int = None) -> VectorStore:
+    """
+    Build the file vector store for the configured backend (settings.vector_backend:
+    "chroma" — default, HNSW — "flat", exact mmap search, or "ivfpq", compressed IVF-PQ).
+    """
+    settings = get_settings()
+    if settings.vector_backend == "flat":
+        from app.db.flat_store import FlatVectorStore
+        return FlatVectorStore(persist_dir, embedding_dim, dtype=settings.flat_vector_dtype)
+    if settings.vector_backend == "ivfpq":
+        from app.db.ivfpq_store import IVFPQVectorStore
+        return IVFPQVectorStore(
+            persist_dir,
+            embedding_dim,
+            dtype=settings.flat_vector_dtype,
+            nlist=settings.pq_nlist,
+            subquantizers=settings.pq_subquantizers,
+            nprobe=settings.pq_nprobe,
+            train_sample=settings.pq_train_sample,
+            min_train_vectors=settings.pq_min_train_vectors,
+        )
+    return VectorStore(persist_dir, embedding_dim)
+
+
 class FaceStore:
-    """Separate ChromaDB collection for face embeddings (512-dim, one per detected face)."""
+    """
+    Separate ChromaDB collection for face embeddings (512-dim, one per detected face),
+    plus the people index (FaceClusterIndex) that groups them into persons.
+    """
 
     COLLECTION_NAME = "findmypic_faces"
 
-    def __init__(self, persist_dir: str):
+    def __init__(self, persist_dir: str, cluster_threshold: float = 0.6):
         self.persist_dir = persist_dir
         os.makedirs(persist_dir, exist_ok=True)
 
@@ -279,6 +422,30 @@ class FaceStore:
         )
         print(f"[FaceStore] Collection ready. Current count: {self._collection.count()}")
 
+        self._clusters = FaceClusterIndex(os.path.join(persist_dir, "face_clusters.sqlite3"), cluster_threshold)
+        if self._clusters.face_count() != self._collection.count():
+            self._rebuild_clusters()
+
+    def _rebuild_clusters(self, page_size: int = 5000) -> None:
+        """Re-cluster every stored face (first run, or after the index fell out of sync)."""
+        print("[FaceStore] Building people index from stored faces...")
+        self._clusters.clear()
+        offset = 0
+        while True:
+            page = self._collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            self._clusters.assign(page["ids"], page["embeddings"], page["metadatas"])
+            offset += len(page["ids"])
+        print(f"[FaceStore] People index ready ({self._clusters.person_count()} people)")
+
+    def _forget_faces(self, face_ids: list[str]) -> None:
+        """Take faces that are about to be replaced or deleted out of the people index."""
+        known = self._clusters.known_faces(face_ids)
+        if known:
+            old = self._collection.get(ids=list(known), include=["embeddings"])
+            self._clusters.remove(old["ids"], old["embeddings"])
+
     def add_face(
         self,
         face_id: str,
@@ -286,11 +453,7 @@ class FaceStore:
         metadata: dict,
     ) -> None:
         """Add a single face embedding with metadata linking to source file."""
-        self._collection.upsert(
-            ids=[face_id],
-            embeddings=[embedding.tolist()],
-            metadatas=[metadata],
-        )
+        self.add_faces_batch([face_id], np.asarray(embedding, dtype=np.float32)[None], [metadata])
 
     def add_faces_batch(
         self,
@@ -301,11 +464,13 @@ class FaceStore:
         """Add a batch of face embeddings."""
         if len(face_ids) == 0:
             return
+        self._forget_faces(face_ids)
         self._collection.upsert(
             ids=face_ids,
-            embeddings=embeddings.tolist() if isinstance(embeddings, np.ndarray) else embeddings,
+            embeddings=np.asarray(embeddings, dtype=np.float32),
             metadatas=metadatas,
         )
+        self._clusters.assign(face_ids, embeddings, metadatas)
 
     def search_face(
         self,
@@ -331,6 +496,77 @@ class FaceStore:
             "metadatas": results["metadatas"][0] if results["metadatas"] else [],
         }
 
+    def get_faces_for_files(self, file_ids: list[str]) -> dict[str, list[dict]]:
+        """
+        Stored faces of the given source files, as source_file_id -> list of
+        {"embedding", "box", "confidence"} (the shape FaceEmbedder returns).
+        """
+        if not file_ids:
+            return {}
+        result = self._collection.get(
+            where={"source_file_id": {"$in": list(file_ids)}},
+            include=["embeddings", "metadatas"],
+        )
+        faces: dict[str, list[tuple[int, dict]]] = {}
+        for fid, emb, meta in zip(result["ids"], result["embeddings"], result["metadatas"]):
+            idx = int(fid.rsplit("_face", 1)[-1])  # keep the original detection order
+            faces.setdefault(meta["source_file_id"], []).append((idx, {
+                "embedding": np.asarray(emb, dtype=np.float32),
+                "box": [meta["box_x1"], meta["box_y1"], meta["box_x2"], meta["box_y2"]],
+                "confidence": meta.get("confidence", 0.0),
+            }))
+        return {src: [f for _, f in sorted(lst, key=lambda t: t[0])] for src, lst in faces.items()}
+
+    def delete_faces_for_files(self, file_ids: list[str]) -> None:
+        """Remove every face detected in the given source files."""
+        if file_ids:
+            where = {"source_file_id": {"$in": list(file_ids)}}
+            old = self._collection.get(where=where, include=["embeddings"])
+            self._clusters.remove(old["ids"], old["embeddings"])
+            self._collection.delete(where=where)
+
+    def find_person(
+        self,
+        query_embedding: np.ndarray,
+        n_results: int = 50,
+        folder_path: Optional[str] = None,
+        min_similarity: Optional[float] = None,
+    ) -> list[dict]:
+        """
+        Photos of the person(s) the query face belongs to: match the query against
+        person centroids (cosine >= min_similarity, default the clustering
+        threshold), then read their posting lists (best face per photo), closest
+        person first. Returns up to n_results dicts with face_id, person_id,
+        similarity (cosine between the query and that face) and the face's
+        metadata, most similar first.
+        """
+        persons = self._clusters.match_persons(query_embedding, min_similarity)
+        postings = self._clusters.postings([pid for pid, _ in persons], folder_path, limit=n_results)
+        if not postings:
+            return []
+        found = self._collection.get(ids=[face_id for face_id, _, _ in postings], include=["embeddings", "metadatas"])
+        by_id = dict(zip(found["ids"], zip(found["embeddings"], found["metadatas"])))
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+
+        results = []
+        for face_id, _, person_id in postings:
+            if face_id not in by_id:
+                continue
+            emb, metadata = by_id[face_id]
+            emb = np.asarray(emb, dtype=np.float32)
+            results.append({
+                "face_id": face_id,
+                "person_id": person_id,
+                "similarity": float(emb @ q) / max(float(np.linalg.norm(emb)), 1e-12),
+                "metadata": metadata,
+            })
+        results.sort(key=lambda r: r["similarity"], reverse=True)
+        return results
+
+    def list_persons(self) -> list[dict]:
+        return self._clusters.list_persons()
+
     def count(self) -> int:
         return self._collection.count()
 
@@ -341,10 +577,12 @@ class FaceStore:
             name=self.COLLECTION_NAME,
             metadata={"hnsw:space": "cosine"},
         )
+        self._clusters.clear()
         print("[FaceStore] Cleared.")
 
     def get_stats(self) -> dict:
         return {
             "total_faces": self._collection.count(),
+            "total_people": self._clusters.person_count(),
         }
 
@@ -0,0 +1,209 @@
+"""
+Write-behind buffer for vector DB writes.
+Pipeline stages hand finished files and faces to the buffer, which upserts them
+into ChromaDB in large batches (by record count or age) as float32 arrays.
+Document passages (passage retrieval) are buffered the same way.
+Every upsert is a SQLite transaction plus an HNSW update, so fewer, bigger
+writes are much cheaper than one per file or per pipeline batch.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.db.vector_store import VectorStore, FaceStore
+from app.db.file_journal import FileJournal
+from app.db.passage_store import PassageStore
+
+
+class WriteBehindBuffer:
+    """
+    Buffers file, face and passage records and flushes them when max_records are pending
+    or the oldest record is max_delay_seconds old. Call close() to flush the rest
+    (the indexer does this when a run finishes, is cancelled, or the app shuts down).
+
+    Files are journaled only after their vectors are written, so a crash never
+    marks a file as indexed when it isn't.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        face_store: Optional[FaceStore] = None,
+        passage_store: Optional[PassageStore] = None,
+        journal: Optional[FileJournal] = None,
+        run_id: int = 0,
+        max_records: int = 1024,
+        max_delay_seconds: float = 5.0,
+        on_error: Optional[Callable[[int, str], None]] = None,
+    ):
+        self._vector_store = vector_store
+        self._face_store = face_store
+        self._passage_store = passage_store
+        self._journal = journal
+        self._run_id = run_id
+        self._max_records = max(1, max_records)
+        self._max_delay = max_delay_seconds
+        self._on_error = on_error
+
+        self._lock = threading.Lock()
+        self._reset()
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._flush_loop, name="write-behind", daemon=True)
+        self._timer.start()
+
+    def _reset(self) -> None:
+        self._ids: list[str] = []
+        self._embeddings: list[np.ndarray] = []
+        self._metadatas: list[dict] = []
+        self._journal_entries: list[tuple] = []
+        self._face_ids: list[str] = []
+        self._face_embeddings: list[np.ndarray] = []
+        self._face_metadatas: list[dict] = []
+        # file_id -> (passage texts, embeddings); a later add for the same file replaces it
+        self._passages: dict[str, tuple[list[str], np.ndarray]] = {}
+        self._n_passages = 0
+        self._oldest: Optional[float] = None
+
+    # --- Producer side ---
+
+    def add_files(
+        self,
+        file_ids: list[str],
+        embeddings: np.ndarray,
+        metadatas: list[dict],
+        journal_entries: Optional[list[tuple]] = None,
+    ) -> None:
+        """Queue file records. journal_entries are (ScannedFile, file_id) pairs to record once written."""
+        with self._lock:
+            self._ids.extend(file_ids)
+            self._embeddings.extend(np.asarray(embeddings, dtype=np.float32))
+            self._metadatas.extend(metadatas)
+            self._journal_entries.extend(journal_entries or [])
+            self._touch()
+        self._flush_if_full()
+
+    def add_faces(self, face_ids: list[str], embeddings: np.ndarray, metadatas: list[dict]) -> None:
+        with self._lock:
+            self._face_ids.extend(face_ids)
+            self._face_embeddings.extend(np.asarray(embeddings, dtype=np.float32))
+            self._face_metadatas.extend(metadatas)
+            self._touch()
+        self._flush_if_full()
+
+    def add_passages(self, file_ids: list[str], passages: list[tuple[list[str], Optional[np.ndarray]]]) -> None:
+        """
+        Queue each file's document passages (texts, embeddings). They replace
+        whatever the passage store holds for the file — an empty list clears it.
+        """
+        with self._lock:
+            for fid, (texts, embs) in zip(file_ids, passages):
+                old = self._passages.get(fid)
+                self._n_passages += len(texts) - (len(old[0]) if old else 0)
+                self._passages[fid] = (
+                    list(texts),
+                    np.asarray(embs, dtype=np.float32) if texts else np.empty((0, 0), dtype=np.float32),
+                )
+            self._touch()
+        self._flush_if_full()
+
+    def pending_by_content_hash(self, content_hashes) -> dict[str, dict]:
+        """
+        Buffered files with the given content hashes (not yet visible in the store).
+        Same shape as VectorStore.get_by_content_hashes, plus "faces" and
+        "passages" ((texts, embeddings), or None if none are queued).
+        """
+        wanted = set(content_hashes)
+        found = {}
+        with self._lock:
+            for fid, emb, meta in zip(self._ids, self._embeddings, self._metadatas):
+                h = meta.get("content_hash")
+                if h in wanted and h not in found:
+                    found[h] = {
+                        "file_id": fid, "embedding": emb, "metadata": meta, "faces": [],
+                        "passages": self._passages.get(fid),
+                    }
+            by_source = {v["file_id"]: v for v in found.values()}
+            for fid, emb, meta in zip(self._face_ids, self._face_embeddings, self._face_metadatas):
+                src = by_source.get(meta["source_file_id"])
+                if src is not None:
+                    src["faces"].append({
+                        "embedding": emb,
+                        "box": [meta["box_x1"], meta["box_y1"], meta["box_x2"], meta["box_y2"]],
+                        "confidence": meta.get("confidence", 0.0),
+                    })
+        return found
+
+    # --- Flushing ---
+
+    def _touch(self) -> None:
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+
+    def _pending(self) -> int:
+        return len(self._ids) + len(self._face_ids) + self._n_passages + len(self._passages)
+
+    def _flush_if_full(self) -> None:
+        if self._pending() >= self._max_records:
+            self.flush()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(min(1.0, self._max_delay)):
+            oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= self._max_delay:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write everything pending now (one upsert per collection)."""
+        with self._lock:
+            if self._pending() == 0:
+                return
+            ids, embs, metas, entries = self._ids, self._embeddings, self._metadatas, self._journal_entries
+            face_ids, face_embs, face_metas = self._face_ids, self._face_embeddings, self._face_metadatas
+            passages = self._passages
+            self._reset()
+
+            if ids:
+                try:
+                    self._vector_store.add_files_batch(ids, np.stack(embs), metas)
+                    if self._journal:
+                        self._journal.record(entries, self._run_id)
+                except Exception as e:
+                    self._report(len(ids), f"Store error: {str(e)}")
+
+            if face_ids and self._face_store:
+                try:
+                    self._face_store.add_faces_batch(face_ids, np.stack(face_embs), face_metas)
+                except Exception as e:
+                    self._report(0, f"Face store error: {str(e)}")
+
+            if passages and self._passage_store:
+                try:
+                    self._write_passages(passages)
+                except Exception as e:
+                    self._report(0, f"Passage store error: {str(e)}")
+
+    def _write_passages(self, passages: dict[str, tuple[list[str], np.ndarray]]) -> None:
+        ids, embs, metas, texts = [], [], [], []
+        for fid, (file_texts, file_embs) in passages.items():
+            for idx, (text, emb) in enumerate(zip(file_texts, file_embs)):
+                ids.append(f"{fid}_p{idx}")
+                embs.append(emb)
+                metas.append({"source_file_id": fid, "passage_index": idx})
+                texts.append(text)
+        self._passage_store.replace_passages(
+            list(passages), ids, np.stack(embs) if embs else np.empty((0, 0), dtype=np.float32), metas, texts,
+        )
+
+    def _report(self, n_files: int, message: str) -> None:
+        print(f"[WriteBuffer] ❌ {message}")
+        if self._on_error:
+            self._on_error(n_files, message)
+
+    def close(self) -> None:
+        """Stop the timer and flush whatever is left."""
+        self._closed.set()
+        self._timer.join(timeout=5)
+        self.flush()
@@ -5,6 +5,7 @@ Starts the API server on http://localhost:8000
 
 import os
 import sys
+import asyncio
 import mimetypes
 from contextlib import asynccontextmanager
 from urllib.parse import unquote
@@ -21,11 +22,15 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.api import search, index, settings
 from app.core.config import get_settings
 from app.core.first_run import get_or_create_config
-from app.db.vector_store import VectorStore, FaceStore
-from app.ai.clip_embed import CLIPEmbedder
+from app.db.vector_store import create_vector_store, FaceStore
+from app.db.passage_store import PassageStore
+from app.ai.clip_embed import create_clip_embedder
 from app.ai.text_embed import TextEmbedder
 from app.ai.face_embed import FaceEmbedder
 from app.ai.ocr_engine import OCREngine
+from app.core.indexer import index_changes, shutdown_indexing
+from app.core.watcher import FolderWatcher
+from app.core.query_cache import get_query_cache
 
 
 @asynccontextmanager
@@ -44,21 +49,31 @@ async def lifespan(application: FastAPI):
 
     # Initialize shared resources
     print("[FindMyFile] Loading CLIP model...")
-    clip_embedder = CLIPEmbedder()
-    clip_embedder.load_model()  # Load now so we know the embedding dim
+    clip_embedder = create_clip_embedder()
+    # Load now so we know the embedding dim; query-only processes skip the vision tower
+    if cfg.search_only:
+        clip_embedder.load_text_model()
+    else:
+        clip_embedder.load_model()
     application.state.clip_embedder = clip_embedder
 
     print("[FindMyFile] Initializing vector store...")
     # Pass embedding dim so VectorStore can detect & fix dimension mismatches on startup
-    application.state.vector_store = VectorStore(
+    application.state.vector_store = create_vector_store(
         persist_dir=cfg.chroma_dir,
         embedding_dim=clip_embedder.embedding_dim,
     )
 
     print("[FindMyFile] Initializing face store...")
-    application.state.face_store = FaceStore(persist_dir=cfg.chroma_dir)
+    application.state.face_store = FaceStore(
+        persist_dir=cfg.chroma_dir, cluster_threshold=cfg.face_cluster_threshold
+    )
+
+    print("[FindMyFile] Initializing passage store...")
+    application.state.passage_store = PassageStore(persist_dir=cfg.chroma_dir)
 
     print("[FindMyFile] Loading text embedder...")
+    # Lazy-loads on the first document passage or text query
     application.state.text_embedder = TextEmbedder()
 
     print("[FindMyFile] Loading face embedder...")
@@ -69,12 +84,41 @@ async def lifespan(application: FastAPI):
     # Don't pre-load EasyOCR — it's slow and lazy-loads fine on first use
     application.state.ocr_engine = ocr_engine
 
+    # Keep saved folders fresh without rescans
+    application.state.folder_watcher = None
+    if cfg.watch_folders and not cfg.search_only:
+        state = application.state
+        watcher = FolderWatcher(
+            lambda changed, deleted: index_changes(
+                changed, deleted,
+                clip_embedder=state.clip_embedder,
+                vector_store=state.vector_store,
+                face_embedder=state.face_embedder,
+                face_store=state.face_store,
+                ocr_engine=state.ocr_engine,
+                text_embedder=state.text_embedder,
+                passage_store=state.passage_store,
+            ),
+            debounce_seconds=cfg.watch_debounce_seconds,
+        )
+        try:
+            watcher.start(user_config.get("indexed_folders", []))
+            application.state.folder_watcher = watcher
+        except ImportError:
+            print("[FindMyFile] watchdog not installed — real-time indexing disabled")
+
     print(f"[FindMyFile] Ready! API at http://localhost:{cfg.port}")
     print(f"[FindMyFile] CLIP model: {clip_embedder.model_name} ({clip_embedder.embedding_dim}-dim)")
     yield
 
     # Shutdown
     print("[FindMyFile] Shutting down...")
+    if application.state.folder_watcher is not None:
+        application.state.folder_watcher.stop()
+    # Let a running index job flush its write-behind buffer
+    await asyncio.to_thread(shutdown_indexing)
+    application.state.vector_store.close()
+    get_query_cache().save()
 
 
 app = FastAPI(
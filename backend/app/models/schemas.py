@@ -16,6 +16,12 @@ class SearchRequest(BaseModel):
     folder_path: Optional[str] = Field(None, description="Filter: search only in specific folder")
     min_score: Optional[float] = Field(None, description="Minimum relevance score (0-100)", ge=0, le=100)
     text_only: bool = Field(False, description="If true, skip CLIP visual search and only match on OCR/document text")
+    collapse_duplicates: bool = Field(False, description="If true, show identical files (same content) once")
+    page_size: Optional[int] = Field(None, description="Return the first page of this size plus a next_cursor", ge=1, le=1000)
+
+
+class SearchPageRequest(BaseModel):
+    cursor: str = Field(..., description="next_cursor from a previous search response")
 
 
 class SearchResult(BaseModel):
@@ -32,6 +38,8 @@ class SearchResult(BaseModel):
     camera_model: Optional[str] = None
     ocr_text: Optional[str] = None
     match_type: Optional[str] = None
+    duplicate_count: int = 0  # other copies folded into this result (collapse_duplicates)
+    passage: Optional[str] = None  # best-matching document passage (passage search)
 
 
 class SearchResponse(BaseModel):
@@ -39,6 +47,7 @@ class SearchResponse(BaseModel):
     total_results: int
     results: list[SearchResult]
     filters_applied: Optional[dict] = None
+    next_cursor: Optional[str] = None  # more pages cached server-side (POST /api/search/page)
 
 
 # --- Indexing ---
@@ -58,9 +67,12 @@ class IndexProgressResponse(BaseModel):
     eta_seconds: float
     elapsed_seconds: float
     current_file: str
+    is_scanning: bool = False
     error_count: int
     faces_found: int = 0
     ocr_extracted: int = 0
+    deduplicated: int = 0
+    stages: dict[str, dict] = Field(default_factory=dict, description="Per-stage throughput of the indexing pipeline")
 
 
 # --- Settings ---
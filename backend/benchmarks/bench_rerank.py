@@ -0,0 +1,136 @@
+"""
+Micro-benchmark: hybrid re-ranking in searcher.
+
+Compares the original per-candidate loop (keyword regexes + a result dict per
+candidate, then a sort) with the columnar re-ranker, on synthetic candidate
+sets. Also checks that both produce the same top results.
+
+Run from backend/:
+    python -m benchmarks.bench_rerank [--sizes 1000 10000 100000] [--top-k 50]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.core.searcher import _build_result, _filename_score, _keyword_score, _rank_candidates
+
+_VOCAB = (
+    "invoice receipt beach sunset family passport contract report meeting notes "
+    "holiday birthday scan tax form summary draft final budget travel ticket "
+    "menu letter photo screenshot whiteboard slide chart table total amount"
+).split()
+
+QUERIES = ["invoice total", "beach sunset", "passport", "tax form 2023"]
+
+
+def make_candidates(n: int, seed: int = 0):
+    """Synthetic CLIP hits (ids, metadatas, distances) plus keyword hits overlapping them."""
+    rng = random.Random(seed)
+    ids, metadatas = [], []
+    for i in range(n):
+        words = rng.choices(_VOCAB, k=rng.randint(0, 60))
+        ocr = " ".join(words) if rng.random() < 0.6 else ""
+        name = "_".join(rng.choices(_VOCAB, k=rng.randint(1, 3))) + f"_{i}.jpg"
+        ids.append(f"file_{i}")
+        metadatas.append({
+            "filepath": f"/photos/{name}",
+            "filename": name,
+            "extension": ".jpg",
+            "file_type": "image",
+            "ocr_text": ocr,
+            "content_hash": f"h{rng.randrange(n)}",
+        })
+    distances = np.random.default_rng(seed).uniform(0.4, 1.6, n).tolist()
+
+    # Keyword hits: half already among the CLIP hits, half new
+    text_ids, text_metas = [], []
+    for i in rng.sample(range(n), min(n, 200) // 2):
+        text_ids.append(ids[i])
+        text_metas.append(metadatas[i])
+    for i in range(min(n, 200) // 2):
+        text_ids.append(f"text_{i}")
+        text_metas.append({"filename": f"scan_{i}.pdf", "ocr_text": "invoice total amount due", "content_hash": ""})
+    return ids, metadatas, distances, text_ids, text_metas
+
+
+def legacy_rank(query, ids, metadatas, distances, text_ids, text_metas, top_k):
+    """The per-candidate loop search_files used before columnar re-ranking."""
+    results_map = {}
+    for file_id, metadata, distance in zip(ids, metadatas, distances):
+        clip_sim = max(0.0, 1.0 - (distance / 2.0))
+        if clip_sim > 0.80:
+            clip_sim = 0.80 + (clip_sim - 0.80) * 1.5
+        kw_ocr = _keyword_score(query, metadata.get("ocr_text", "") or "")
+        kw_file = _filename_score(query, metadata.get("filename", "") or "")
+        final_sim, match_type = clip_sim, "visual"
+        if kw_ocr > 0.5:
+            final_sim = max(clip_sim, kw_ocr) + 0.20
+            match_type = "visual+text" if clip_sim > 0.3 else "text"
+        elif kw_ocr > 0:
+            final_sim = clip_sim + kw_ocr * 0.15
+            match_type = "visual+text"
+        if kw_file > 0.5:
+            final_sim = max(final_sim, kw_file + 0.10)
+            match_type = "visual+text" if "text" not in match_type else match_type
+        results_map[file_id] = _build_result(file_id, metadata, round(min(final_sim * 100, 100), 1), match_type)
+
+    for file_id, metadata in zip(text_ids, text_metas):
+        best_kw = max(
+            _keyword_score(query, metadata.get("ocr_text", "") or ""),
+            _filename_score(query, metadata.get("filename", "") or ""),
+        )
+        text_relevance = 70.0 + best_kw * 25.0
+        if file_id in results_map:
+            existing = results_map[file_id]
+            if best_kw > 0.5:
+                existing["relevance_score"] = min(100, max(existing["relevance_score"], text_relevance))
+                if existing["match_type"] == "visual":
+                    existing["match_type"] = "visual+text"
+        else:
+            results_map[file_id] = _build_result(file_id, metadata, round(text_relevance, 1), "text")
+
+    return sorted(results_map.values(), key=lambda x: x["relevance_score"], reverse=True)[:top_k]
+
+
+def columnar_rank(query, ids, metadatas, distances, text_ids, text_metas, top_k):
+    ranking = _rank_candidates(query, ids, metadatas, distances, text_ids, text_metas)
+    order, _ = ranking.order()
+    return [
+        _build_result(ranking.ids[row], ranking.metadatas[row], float(ranking.scores[row]), "")
+        | {"match_type": ("visual", "text", "visual+text")[ranking.match_types[row]]}
+        for row in order[:top_k].tolist()
+    ]
+
+
+def _best_of(fn, repeats: int) -> tuple[float, list]:
+    best, out = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10}  {'query':<14} {'loop ms':>9} {'columnar ms':>12} {'speedup':>8}  top-{args.top_k} match")
+    for n in args.sizes:
+        data = make_candidates(n)
+        for query in QUERIES:
+            t_old, old = _best_of(lambda: legacy_rank(query, *data, args.top_k), args.repeats)
+            t_new, new = _best_of(lambda: columnar_rank(query, *data, args.top_k), args.repeats)
+            same = [(r["relevance_score"], r["match_type"]) for r in old] == \
+                   [(r["relevance_score"], r["match_type"]) for r in new]
+            print(f"{n:>10}  {query:<14} {t_old * 1000:>9.1f} {t_new * 1000:>12.1f} {t_old / t_new:>7.1f}x  {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import numpy as np
+
+from app.db.face_clusters import FaceClusterIndex, _normalize
+
+
+def test_remove_moves_centroid(tmp_path):
+    index = FaceClusterIndex(str(tmp_path / "faces.sqlite3"), threshold=0.5)
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=64)
+    faces = np.stack([base + 0.3 * rng.normal(size=64) for _ in range(3)]).astype(np.float32)
+    metas = [{"source_file_id": f"file{i}", "filepath": f"/p/{i}.jpg"} for i in range(3)]
+    person_ids = index.assign(["a", "b", "c"], faces, metas)
+    assert len(set(person_ids)) == 1
+
+    index.remove(["a", "b"], faces[:2])
+
+    assert np.allclose(index._centroids[0], _normalize(faces[2]), atol=1e-5)
+    person, score = index.match_persons(faces[2])[0]
+    assert person == person_ids[0] and score > 0.999
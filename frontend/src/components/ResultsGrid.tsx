@@ -1,6 +1,6 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import type { SearchResult } from "../services/api";
-import { getThumbnailUrl, getFileUrl } from "../services/api";
+import { getThumbnailUrl, getFileUrl, SEARCH_PAGE_SIZE } from "../services/api";
 import "./ResultsGrid.css";
 
 /** Highlights all occurrences of query words inside text */
@@ -25,24 +25,35 @@ function HighlightedText({ text, query }: { text: string; query: string }) {
     );
 }
 
-const PAGE_SIZE = 50;
+const PAGE_SIZE = SEARCH_PAGE_SIZE;
 
 interface ResultsGridProps {
     results: SearchResult[];
+    /** Full result count when only the first pages are loaded (defaults to results.length) */
+    totalResults?: number;
     query: string;
     onFileClick: (result: SearchResult) => void;
+    /** Fetch the next server-side page; called when the current page isn't loaded yet */
+    onLoadMore?: () => Promise<void>;
 }
 
-export default function ResultsGrid({ results, query, onFileClick }: ResultsGridProps) {
+export default function ResultsGrid({ results, totalResults, query, onFileClick, onLoadMore }: ResultsGridProps) {
     const [viewMode, setViewMode] = useState<"grid" | "list">("grid");
     const [page, setPage] = useState(1);
 
-    const totalPages = Math.max(1, Math.ceil(results.length / PAGE_SIZE));
+    const total = Math.max(totalResults ?? 0, results.length);
+    const totalPages = Math.max(1, Math.ceil(total / PAGE_SIZE));
     const safePage = Math.min(page, totalPages);
     const pageStart = (safePage - 1) * PAGE_SIZE;
     const pageEnd = pageStart + PAGE_SIZE;
     const pageResults = results.slice(pageStart, pageEnd);
 
+    // Pages are fetched lazily: load until the visible page is covered
+    const needsMore = !!onLoadMore && results.length < Math.min(pageEnd, total);
+    useEffect(() => {
+        if (needsMore) onLoadMore?.();
+    }, [needsMore, onLoadMore]);
+
     if (results.length === 0) {
         return (
             <div className="no-results animate-in">
@@ -57,7 +68,7 @@ export default function ResultsGrid({ results, query, onFileClick }: ResultsGrid
         <div className="results-container animate-in">
             <div className="results-header">
                 <div className="results-info">
-                    <span className="results-count">{results.length} results</span>
+                    <span className="results-count">{total} results</span>
                     <span className="results-query">for "{query}"</span>
                     {totalPages > 1 && (
                         <span className="results-page-info">
@@ -135,11 +146,17 @@ export default function ResultsGrid({ results, query, onFileClick }: ResultsGrid
                                 <span className="badge badge-accent">{result.relevance_score}%</span>
                                 {result.match_type === "text" && <span className="badge badge-text" title="Found via text in image">📝 Text Match</span>}
                                 {result.match_type === "visual+text" && <span className="badge badge-text" title="Matched visually + text in image">🔍📝 Visual+Text</span>}
+                                {result.match_type === "passage" && <span className="badge badge-text" title="Matched a passage in the document">📄 Passage</span>}
                                 {result.match_type === "face" && <span className="badge badge-face" title="Face match">👤 Face</span>}
                                 {result.size_mb > 0 && <span className="result-size">{result.size_mb} MB</span>}
                                 {result.date_taken && <span className="result-date">{result.date_taken}</span>}
                             </div>
-                            {result.ocr_text && (
+                            {result.passage ? (
+                                <p className="result-ocr" title={result.passage}>
+                                    📄 <HighlightedText text={result.passage.slice(0, 120)} query={query} />
+                                    {result.passage.length > 120 ? "…" : ""}
+                                </p>
+                            ) : result.ocr_text && (
                                 <p className="result-ocr" title={result.ocr_text}>
                                     📝 <HighlightedText text={result.ocr_text.slice(0, 120)} query={query} />
                                     {result.ocr_text.length > 120 ? "…" : ""}
@@ -195,7 +212,7 @@ export default function ResultsGrid({ results, query, onFileClick }: ResultsGrid
                     >»</button>
 
                     <span className="pag-info">
-                        {pageStart + 1}–{Math.min(pageEnd, results.length)} of {results.length}
+                        {pageStart + 1}–{Math.min(pageEnd, total)} of {total}
                     </span>
                 </div>
             )}
@@ -1,5 +1,5 @@
 ﻿import { useState, useCallback, useRef, useEffect } from "react";
-import { searchWithFilters, type SearchResponse } from "../services/api";
+import { searchWithFilters, SEARCH_PAGE_SIZE, type SearchResponse } from "../services/api";
 import SearchFilters, { type FilterState } from "./SearchFilters";
 import "./SearchBar.css";
 
@@ -56,6 +56,7 @@ export default function SearchBar({ onResults, onLoading, totalIndexed }: Search
                     folderPath: filters.folderPath || undefined,
                     minScore: filters.minScore > 0 ? filters.minScore : undefined,
                     textOnly: textOnly,
+                    pageSize: SEARCH_PAGE_SIZE,
                 });
                 onResults(results);
 
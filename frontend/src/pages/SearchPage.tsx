@@ -3,7 +3,7 @@ import SearchBar from "../components/SearchBar";
 import FaceSearch from "../components/FaceSearch";
 import ResultsGrid from "../components/ResultsGrid";
 import FilePreview from "../components/FilePreview";
-import { type SearchResponse, type SearchResult } from "../services/api";
+import { fetchSearchPage, type SearchResponse, type SearchResult } from "../services/api";
 import "./SearchPage.css";
 
 type SearchMode = "text" | "face";
@@ -21,6 +21,24 @@ export default function SearchPage({ totalIndexed }: SearchPageProps) {
         setSearchResults(results);
     }, []);
 
+    // Append the next server-side page of the current search
+    const handleLoadMore = useCallback(async () => {
+        const cursor = searchResults?.next_cursor;
+        if (!cursor) return;
+        try {
+            const page = await fetchSearchPage(cursor);
+            setSearchResults(prev =>
+                prev && prev.next_cursor === cursor
+                    ? { ...prev, results: [...prev.results, ...page.results], next_cursor: page.next_cursor }
+                    : prev
+            );
+        } catch (err) {
+            console.error("Loading more results failed:", err);
+            // Expired result set: stop paging rather than retrying forever
+            setSearchResults(prev => (prev && prev.next_cursor === cursor ? { ...prev, next_cursor: null } : prev));
+        }
+    }, [searchResults]);
+
     const handleLoading = useCallback((_loading: boolean) => {
         // Loading state handled by SearchBar internally
     }, []);
@@ -79,7 +97,9 @@ export default function SearchPage({ totalIndexed }: SearchPageProps) {
             {searchResults && (
                 <ResultsGrid
                     results={searchResults.results}
+                    totalResults={searchResults.next_cursor ? searchResults.total_results : searchResults.results.length}
                     query={searchResults.query}
+                    onLoadMore={searchResults.next_cursor ? handleLoadMore : undefined}
                     onFileClick={setSelectedFile}
                 />
             )}
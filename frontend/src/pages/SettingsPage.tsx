@@ -53,7 +53,7 @@ export default function SettingsPage() {
         setIsScanning(true);
         setError("");
         try {
-            const result = await scanFiles(folders);
+            const result = await scanFiles(folders, (partial) => setScanResult(partial.total_files));
             setScanResult(result.total_files);
         } catch (err: any) {
             setError(err.message || "Failed to scan folders.");
@@ -21,6 +21,8 @@ export interface SearchResult {
   camera_model?: string;
   ocr_text?: string;
   match_type?: string;
+  duplicate_count?: number;
+  passage?: string;
   face_box?: { x1: number; y1: number; x2: number; y2: number };
   confidence?: number;
 }
@@ -29,6 +31,7 @@ export interface SearchResponse {
   query: string;
   total_results: number;
   results: SearchResult[];
+  next_cursor?: string | null;  // more results cached server-side — see fetchSearchPage
 }
 
 export interface IndexProgress {
@@ -42,9 +45,19 @@ export interface IndexProgress {
   eta_seconds: number;
   elapsed_seconds: number;
   current_file: string;
+  is_scanning?: boolean;
   error_count: number;
   faces_found: number;
   ocr_extracted: number;
+  deduplicated?: number;
+  stages?: Record<string, StageStats>;
+}
+
+export interface StageStats {
+  items: number;
+  batches: number;
+  busy_seconds: number;
+  items_per_second: number;
 }
 
 export interface SystemInfo {
@@ -109,6 +122,9 @@ async function apiFetch<T>(
   return res.json();
 }
 
+/** Results per page — searches fetch one page up front, the grid loads more as it pages */
+export const SEARCH_PAGE_SIZE = 50;
+
 export interface SearchFilters {
   query: string;
   nResults?: number;
@@ -117,6 +133,7 @@ export interface SearchFilters {
   folderPath?: string;
   minScore?: number;
   textOnly?: boolean;
+  pageSize?: number;
 }
 
 /** Search indexed files with natural language */
@@ -127,7 +144,9 @@ export async function searchFiles(
   extension?: string,
   folderPath?: string,
   minScore?: number,
-  textOnly?: boolean
+  textOnly?: boolean,
+  collapseDuplicates?: boolean,
+  pageSize?: number
 ): Promise<SearchResponse> {
   return apiFetch<SearchResponse>("/search/", {
     method: "POST",
@@ -139,10 +158,20 @@ export async function searchFiles(
       folder_path: folderPath || null,
       min_score: minScore || null,
       text_only: textOnly || false,
+      collapse_duplicates: collapseDuplicates || false,
+      page_size: pageSize || null,
     }),
   });
 }
 
+/** Fetch the next page of a paged search (410 once the server-side result set expires) */
+export async function fetchSearchPage(cursor: string): Promise<SearchResponse> {
+  return apiFetch<SearchResponse>("/search/page", {
+    method: "POST",
+    body: JSON.stringify({ cursor }),
+  });
+}
+
 /** Search with full filter object */
 export async function searchWithFilters(filters: SearchFilters): Promise<SearchResponse> {
   return searchFiles(
@@ -152,7 +181,9 @@ export async function searchWithFilters(filters: SearchFilters): Promise<SearchR
     filters.extension,
     filters.folderPath,
     filters.minScore,
-    filters.textOnly
+    filters.textOnly,
+    undefined,
+    filters.pageSize
   );
 }
 
@@ -182,12 +213,42 @@ export async function cancelIndexing(): Promise<{ status: string }> {
   return apiFetch("/index/cancel", { method: "POST" });
 }
 
-/** Dry-run scan to count files before indexing */
-export async function scanFiles(paths: string[]): Promise<ScanResult> {
-  return apiFetch<ScanResult>("/index/scan", {
+/**
+ * Dry-run scan to count files before indexing.
+ * The backend streams NDJSON progress lines; `onProgress` sees the running count.
+ */
+export async function scanFiles(
+  paths: string[],
+  onProgress?: (partial: ScanResult) => void
+): Promise<ScanResult> {
+  const res = await fetch(`${API_BASE}/index/scan`, {
     method: "POST",
+    headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ paths }),
   });
+  if (!res.ok || !res.body) {
+    const error = await res.text();
+    throw new Error(`API Error ${res.status}: ${error}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  let last: ScanResult = { total_files: 0, breakdown: {} };
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop() ?? "";
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const msg = JSON.parse(line);
+      last = { total_files: msg.total_files, breakdown: msg.breakdown };
+      if (!msg.done) onProgress?.(last);
+    }
+  }
+  return last;
 }
 
 /** Get system info (GPU, RAM, tier recommendation) */